@@ -0,0 +1,4 @@
+"""
+命令行工具
+不依赖Qt，可在服务器或定时任务中运行
+"""
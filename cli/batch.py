@@ -0,0 +1,277 @@
+"""
+命令行批量分析
+建立目录索引，并发分析PDF并写入 *_analysis.txt，最后生成汇总报告，进度输出到标准输出
+
+用法：
+    python -m cli <目录> [--service grok] [--provider official] [--model grok-2]
+                         [--concurrency 20] [--resume] [--no-summary]
+"""
+import argparse
+import importlib
+import logging
+import os
+import sys
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+from utils.logger import Logger
+from utils.config_manager import ConfigManager
+from utils.prompt_manager import PromptManager
+from utils.file_index_manager import create_file_index_manager
+from utils.pdf_text_cache import PdfTextCache
+from utils.job_journal import JobJournal
+from utils.content_hash import link_duplicates, expand_duplicate_results
+from core.result_writer import read_analysis_result, save_analysis_result
+from core.summary_builder import SummaryBuilder
+
+# 服务名 -> (模块, 类名)，按需导入
+SERVICE_CLASSES = {
+    "openai": ("services.openai_service", "OpenAIService"),
+    "grok": ("services.grok_service", "GrokService"),
+    "deepseek": ("services.deepseek_service", "DeepseekService"),
+}
+
+# 超过该大小（MB）的文件不分析，与GUI一致
+DEFAULT_MAX_SIZE_MB = 30
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="python -m cli",
+        description="批量分析目录中的PDF论文并生成汇总报告"
+    )
+    parser.add_argument("directory", help="包含PDF文件的目录（包括子目录）")
+    parser.add_argument("--service", choices=sorted(SERVICE_CLASSES),
+                        help="AI服务，默认使用配置default_service")
+    parser.add_argument("--provider", help="服务提供商，默认使用服务的default_provider")
+    parser.add_argument("--model", help="模型，默认使用服务的default_model")
+    parser.add_argument("--instruction-file", help="分析指令文件，默认使用提示词配置中的analysis")
+    parser.add_argument("--summary-instruction-file", help="汇总指令文件，默认使用提示词配置中的summary")
+    parser.add_argument("--concurrency", type=int,
+                        help="同时在途的最大请求数，默认使用配置analysis.max_in_flight_requests")
+    parser.add_argument("--max-files", type=int, help="同时处理的最大文件数")
+    parser.add_argument("--chunk-concurrency", type=int,
+                        help="单个文件同时发送的最大分块请求数，默认使用配置analysis.chunk_concurrency")
+    parser.add_argument("--max-size-mb", type=float, default=DEFAULT_MAX_SIZE_MB,
+                        help=f"跳过大于该大小的文件，默认{DEFAULT_MAX_SIZE_MB}")
+    parser.add_argument("--resume", action="store_true",
+                        help="已有比PDF更新的 *_analysis.txt 时直接使用，不再分析")
+    parser.add_argument("--no-journal", action="store_true",
+                        help="不使用任务日志（默认从日志中恢复已完成的文件和文本块）")
+    parser.add_argument("--no-failover", action="store_true",
+                        help="只使用所选服务，不按配置routing.failover切换到备用服务")
+    parser.add_argument("--no-summary", action="store_true", help="只分析，不生成汇总报告")
+    parser.add_argument("--summary-output", help="汇总报告路径，默认为目录下的summary_report_<时间>.md")
+    parser.add_argument("--log-level", default="WARNING", help="日志级别，默认WARNING")
+    return parser.parse_args(argv)
+
+
+def create_ai_service(service_name: str, config_manager: ConfigManager,
+                      provider: Optional[str] = None, model: Optional[str] = None):
+    """创建AI服务实例"""
+    module_name, class_name = SERVICE_CLASSES[service_name]
+    service_class = getattr(importlib.import_module(module_name), class_name)
+    service = service_class(config_manager=config_manager, provider_name=provider)
+    if model:
+        service.default_model = model
+        service.model = model
+    return service
+
+
+def create_routed_service(service_name: str, config_manager: ConfigManager, provider: Optional[str],
+                          model: Optional[str], failover: bool = True):
+    """创建所选服务，开启负载均衡时加入该服务其他已启用的提供商，
+    并按配置routing.failover创建备用服务组成路由，无法初始化的备用服务跳过"""
+    from services.load_balancer import create_load_balancer
+    from services.service_router import create_service_router
+    primary = create_load_balancer(create_ai_service(service_name, config_manager, provider, model))
+    if not failover:
+        return primary
+    services = [primary]
+    for name in config_manager.get_config().get("routing", {}).get("failover", []):
+        if name == service_name or name not in SERVICE_CLASSES:
+            continue
+        try:
+            services.append(create_ai_service(name, config_manager))
+        except Exception as e:
+            Logger.create_logger('cli').warning(f"备用服务 {name} 初始化失败，已跳过: {str(e)}")
+    return create_service_router(primary, services)
+
+
+def _read_instruction(path: Optional[str], prompt_manager: PromptManager, prompt_type: str) -> str:
+    if path:
+        with open(path, 'r', encoding='utf-8') as f:
+            return f.read().strip()
+    return (prompt_manager.get_prompt(prompt_type) or "").strip()
+
+
+class ProgressPrinter:
+    """把分析进度输出到标准输出"""
+
+    def __init__(self, total: int, stream=None):
+        self.total = total
+        self.done = 0
+        self.failed = 0
+        self.started = time.monotonic()
+        self.stream = stream or sys.stdout
+
+    def _print(self, mark: str, message: str):
+        elapsed = time.monotonic() - self.started
+        print(f"[{self.done}/{self.total}] {mark} {message} ({elapsed:.1f}s)", file=self.stream, flush=True)
+
+    def completed(self, name: str):
+        self.done += 1
+        self._print("完成", name)
+
+    def failed_file(self, name: str, error: str):
+        self.done += 1
+        self.failed += 1
+        self._print("失败", f"{name}: {error}")
+
+
+def run(args: argparse.Namespace) -> int:
+    """执行批量分析
+
+    Returns:
+        int: 退出码，全部成功为0，有文件分析失败为1，参数或配置错误为2，按Ctrl-C取消为130
+    """
+    config_manager = ConfigManager()
+    config = config_manager.get_config()
+    level = getattr(logging, str(args.log_level).upper(), logging.WARNING)
+    Logger.set_defaults('lang_tools_cli.log', level)
+    logger = Logger.create_logger('cli')
+
+    directory = os.path.abspath(args.directory)
+    if not os.path.isdir(directory):
+        print(f"目录不存在: {directory}", file=sys.stderr)
+        return 2
+
+    service_name = args.service or config.get("default_service", "openai")
+    if service_name not in SERVICE_CLASSES:
+        print(f"不支持的AI服务: {service_name}", file=sys.stderr)
+        return 2
+
+    prompt_manager = PromptManager()
+    instruction = _read_instruction(args.instruction_file, prompt_manager, 'analysis')
+    if not instruction:
+        print("分析指令为空", file=sys.stderr)
+        return 2
+
+    # 建立索引
+    file_index_manager = create_file_index_manager(logger)
+    try:
+        file_index = file_index_manager.generate_index(directory)
+        files = file_index["files"]
+        print(f"索引完成: {directory}，共 {len(files)} 个PDF文件", flush=True)
+
+        # 过滤超大文件，内容重复的文件只分析规范文件
+        candidates = []
+        for key in sorted(files, key=lambda k: int(files[k]["index"])):
+            file_path = os.path.normpath(os.path.join(directory, key))
+            size = files[key].get("size")
+            if size is None and os.path.exists(file_path):
+                size = os.path.getsize(file_path)
+            if size is not None and size / (1024 * 1024) > args.max_size_mb:
+                print(f"跳过大于{args.max_size_mb:g}MB的文件: {key}", flush=True)
+                continue
+            candidates.append(file_path)
+        candidates, duplicate_links = link_duplicates(directory, files, candidates)
+        duplicate_count = sum(len(paths) for paths in duplicate_links.values())
+        if duplicate_count:
+            print(f"跳过 {duplicate_count} 个内容重复的文件", flush=True)
+
+        # 断点续跑：已有最新分析结果的文件直接使用
+        results: Dict[str, str] = {}
+        to_analyze = []
+        for file_path in candidates:
+            content = read_analysis_result(file_path) if args.resume else None
+            if content is not None:
+                results[file_path] = content
+            else:
+                to_analyze.append(file_path)
+        if results:
+            print(f"使用已有分析结果: {len(results)} 个文件", flush=True)
+
+        ai_service = create_routed_service(service_name, config_manager, args.provider, args.model,
+                                           failover=not args.no_failover)
+        analysis_config = config.get("analysis", {})
+        text_cache = PdfTextCache(directory, logger) if analysis_config.get("cache_pdf_text", True) else None
+        use_journal = analysis_config.get("journal", True) and not args.no_journal
+        journal = JobJournal(directory, logger) if use_journal else None
+
+        def index_key(file_path: str) -> str:
+            return os.path.relpath(file_path, directory).replace(os.sep, '/')
+
+        progress = ProgressPrinter(len(to_analyze))
+
+        def on_completed(file_path: str, record: Dict):
+            results[file_path] = record["content"]
+            file_index_manager.update_analysis_status(directory, index_key(file_path))
+            # 内容相同的文件共用该结果，写入各自的结果文件并更新分析状态
+            for linked_path in duplicate_links.get(file_path, []):
+                try:
+                    save_analysis_result(linked_path, record["content"])
+                    file_index_manager.update_analysis_status(directory, index_key(linked_path))
+                except Exception as e:
+                    logger.error(f"保存重复文件的分析结果失败 {linked_path}: {str(e)}")
+            progress.completed(index_key(file_path))
+
+        def on_error(file_path: str, message: str):
+            progress.failed_file(index_key(file_path), message)
+
+        if to_analyze:
+            # PDF解析库较重，需要分析时再导入，--help等不受影响
+            from core.async_engine import AsyncAnalysisEngine
+            print(f"开始分析 {len(to_analyze)} 个PDF文件（服务: {service_name}）", flush=True)
+            engine = AsyncAnalysisEngine(
+                ai_service,
+                instruction,
+                max_in_flight=args.concurrency or analysis_config.get("max_in_flight_requests"),
+                max_files=args.max_files,
+                chunk_concurrency=args.chunk_concurrency or analysis_config.get("chunk_concurrency"),
+                text_cache=text_cache,
+                extraction_workers=analysis_config.get("extraction_workers"),
+                journal=journal,
+                on_completed=on_completed,
+                on_error=on_error
+            )
+            try:
+                engine.run(to_analyze)
+            except KeyboardInterrupt:
+                # asyncio.run已取消所有任务，在途请求随之中止；已完成的块保存在任务日志中
+                print(f"分析已取消: 完成 {progress.done - progress.failed} 个文件", file=sys.stderr, flush=True)
+                return 130
+            print(f"分析完成: 成功 {progress.done - progress.failed} 个，失败 {progress.failed} 个，"
+                  f"耗时 {time.monotonic() - progress.started:.1f}s", flush=True)
+
+        # 生成汇总报告，内容相同的文件各占一个条目
+        results = expand_duplicate_results(results, duplicate_links)
+        if not args.no_summary and results:
+            summary_instruction = _read_instruction(args.summary_instruction_file, prompt_manager, 'summary')
+            items = [
+                {
+                    "file_path": file_path,
+                    "filename": os.path.basename(file_path),
+                    "global_index": files[index_key(file_path)]["index"],
+                    "analysis_result": content
+                }
+                for file_path, content in results.items()
+            ]
+            builder = SummaryBuilder(ai_service, summary_instruction,
+                                     on_status=lambda message: print(message, flush=True))
+            report = builder.build_report(items)
+
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            output_path = args.summary_output or os.path.join(directory, f"summary_report_{timestamp}.md")
+            with open(output_path, 'w', encoding='utf-8') as f:
+                f.write(report)
+            file_index_manager.update_summary_status(directory, [index_key(path) for path in results], timestamp)
+            print(f"汇总报告已保存到: {output_path}", flush=True)
+
+        return 1 if progress.failed else 0
+    finally:
+        file_index_manager.close()
+
+
+def main(argv: Optional[List[str]] = None):
+    sys.exit(run(parse_args(argv)))
@@ -0,0 +1,4 @@
+"""
+分析核心
+不依赖Qt的论文分析逻辑，供GUI线程、命令行和异步引擎复用
+"""
@@ -0,0 +1,346 @@
+"""
+分析流水线
+读取PDF、分块、并发发送分块请求、生成最终分析并保存结果，不依赖Qt，
+事件通过回调通知调用方，供AnalysisThread、命令行和测试复用
+"""
+import itertools
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional
+from utils.logger import Logger
+from utils.config_manager import ConfigManager
+from core.text_chunker import TextChunk
+from core.chunk_stream import ChunkStream
+from core.cancellation import CancellationToken, cancel_scope
+from core.request_loop import run_request
+from core.tokenizer import chunking_for_service
+from core.analysis_prompts import (build_chunk_messages, build_final_analysis_messages, extract_response_content,
+                                   stream_response_content, analysis_job_key, analysis_job_keys)
+from services.routing_context import answering_service, current_answered, set_answered
+from core.result_writer import save_analysis_result, build_result_record
+
+
+def resolve_source_path(file_path: str) -> str:
+    """检查PDF文件是否可读取，macOS生成的._前缀文件替换为原始文件
+
+    Raises:
+        FileNotFoundError: 文件不存在
+        PermissionError: 文件不可读取
+    """
+    base_name = os.path.basename(file_path)
+    if base_name.startswith('._'):
+        clean_path = os.path.join(os.path.dirname(file_path), base_name[2:])
+        if not os.path.exists(clean_path):
+            raise FileNotFoundError(f"找不到原始文件: {clean_path}")
+        file_path = clean_path
+
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(f"文件不存在: {file_path}")
+    if not os.access(file_path, os.R_OK):
+        raise PermissionError(f"无法读取文件: {file_path}")
+    return file_path
+
+
+def wait_future(future: Future, cancel_token: CancellationToken):
+    """等待请求完成，期间取消时立即抛出AnalysisCancelled，不等待请求线程结束"""
+    done = threading.Event()
+    future.add_done_callback(lambda _: done.set())
+    cancel_token.add_callback(done.set)
+    try:
+        done.wait()
+    finally:
+        cancel_token.remove_callback(done.set)
+    cancel_token.raise_if_cancelled()
+    return future.result()
+
+
+class AnalysisPipeline:
+    """单个PDF文件的分析流水线
+
+    各文本块的提示词互不依赖，在线程池中并发发送（map阶段），
+    多个块的结果再由一次请求合并为最终分析（reduce阶段）。
+    事件通过回调通知调用方：
+    - on_status(message): 状态更新
+    - on_chunk_completed(file_path, chunk_number, total_chunks): 一个文本块分析完成，
+      total_chunks在边读取边分块时为None
+    - on_timeout(file_path): 分析超时
+    - on_partial_text(file_path, text): 最终分析的增量文本，流式请求每收到一段回复调用一次；
+      只有一个文本块时流式返回该块的分析，多个块时流式返回合并请求的结果
+    设置了任务日志时，已完成的文件直接返回记录的结果，已分析的文本块不再重复请求；
+    记录的任务键和模型来自实际返回结果的服务。
+    cancel()后在文本块之间抛出AnalysisCancelled并中止在途请求，不保存结果
+    """
+
+    # 每个chunk的默认最大token数（模型配置了context_window时按上下文窗口计算）
+    MAX_CHUNK_TOKENS = 10000  # 预留一些空间给指令和响应
+    # 超时设置（秒）
+    TIMEOUT_SECONDS = 300  # 5分钟超时
+    # 重试次数
+    MAX_RETRIES = 3
+    # 单个文件同时发送的最大分块请求数
+    CHUNK_CONCURRENCY = 4
+    # 等待并发名额时检查取消的间隔（秒）
+    CANCEL_POLL_SECONDS = 0.2
+
+    def __init__(self, ai_service, instruction: str, chunk_concurrency: int = None, text_cache=None,
+                 journal=None, cancel_token: CancellationToken = None,
+                 on_status: Optional[Callable[[str], None]] = None,
+                 on_chunk_completed: Optional[Callable[[str, int, Optional[int]], None]] = None,
+                 on_timeout: Optional[Callable[[str], None]] = None,
+                 on_partial_text: Optional[Callable[[str, str], None]] = None):
+        """初始化分析流水线
+
+        Args:
+            ai_service: 使用的AI服务实例
+            instruction: 分析指令
+            chunk_concurrency: 单个文件同时发送的最大分块请求数，为None时读取配置analysis.chunk_concurrency
+            text_cache: PDF文本缓存，为None时每次都重新解析PDF
+            journal: 任务日志（JobJournal），为None时不记录也不续跑
+            cancel_token: 取消令牌，为None时创建新的令牌
+            on_status: 状态更新回调
+            on_chunk_completed: 文本块分析完成回调
+            on_timeout: 分析超时回调
+            on_partial_text: 最终分析的增量文本回调，为None或配置analysis.stream为false时不使用流式请求
+        """
+        self.ai_service = ai_service
+        self.instruction = instruction
+        analysis_config = ConfigManager().get_config().get("analysis", {})
+        if chunk_concurrency is None:
+            chunk_concurrency = analysis_config.get("chunk_concurrency", self.CHUNK_CONCURRENCY)
+        self.chunk_concurrency = max(1, int(chunk_concurrency))
+        self.text_cache = text_cache
+        self.journal = journal
+        self.cancel_token = cancel_token or CancellationToken()
+        # 读取任务日志时依次查找的任务键，经过路由时包括各备用服务的任务键
+        self.job_keys = analysis_job_keys(ai_service, instruction)
+        self.job_key = self.job_keys[0]
+        # 最近一次请求实际返回结果的服务，经过路由或负载均衡时可能不是ai_service本身
+        self.answered_by = None
+        self.on_status = on_status
+        self.on_chunk_completed = on_chunk_completed
+        self.on_timeout = on_timeout
+        self.on_partial_text = on_partial_text if analysis_config.get("stream", True) else None
+        self.logger = Logger.create_logger('analysis_pipeline')
+        # 根据当前模型选择token计数器和分块大小
+        self.token_counter, self.max_chunk_tokens = chunking_for_service(ai_service, self.MAX_CHUNK_TOKENS)
+        self.start_time = None
+        self.retry_count = 0
+        self.is_timeout = False
+
+    def _emit_status(self, message: str):
+        if self.on_status:
+            self.on_status(message)
+
+    def cancel(self):
+        """取消分析，可在任意线程中调用"""
+        self.cancel_token.cancel()
+
+    def _request(self, messages, stream_for: Optional[str] = None) -> str:
+        """发送请求并返回文本内容
+
+        stream_for为文件路径且设置了on_partial_text时使用流式请求，边接收边回调，取消时关闭响应流；
+        否则服务支持send_message_async时在请求事件循环中发送，取消时取消请求任务。
+        重试和限流的等待在取消后立即结束。实际返回结果的服务保存在answered_by中
+        """
+        with cancel_scope(self.cancel_token):
+            if stream_for is not None and self.on_partial_text is not None:
+                content = stream_response_content(self.ai_service, messages,
+                                                  lambda delta: self.on_partial_text(stream_for, delta),
+                                                  self.cancel_token)
+            elif hasattr(self.ai_service, "send_message_async"):
+                content = extract_response_content(self._request_async(messages))
+            else:
+                content = extract_response_content(self.ai_service.send_message(messages))
+        self.answered_by = answering_service(self.ai_service)
+        return content
+
+    def _request_async(self, messages):
+        """在请求事件循环中发送请求并等待响应，取消时中止在途的HTTP请求"""
+        async def send():
+            response = await self.ai_service.send_message_async(messages)
+            # 路由记录的返回服务在请求任务的上下文中，随响应带回当前线程
+            return response, current_answered()
+
+        self.cancel_token.raise_if_cancelled()
+        response, answered = run_request(send(), self.cancel_token)
+        set_answered(answered)
+        return response
+
+    def _journal_key(self, service) -> tuple:
+        """任务日志中记录的(任务键, 模型)，按实际返回结果的服务计算"""
+        service = service if service is not None else self.ai_service
+        return analysis_job_key(service, self.instruction), getattr(service, "default_model", None)
+
+    def _send(self, messages, stream_for: Optional[str] = None) -> str:
+        """在单独的线程中发送请求并等待，取消时立即返回，请求随后中止"""
+        executor = ThreadPoolExecutor(max_workers=1)
+        future = executor.submit(self._request, messages, stream_for)
+        executor.shutdown(wait=False)
+        return wait_future(future, self.cancel_token)
+
+    def check_timeout(self) -> bool:
+        """检查是否超时"""
+        if not self.start_time:
+            return False
+        return time.time() - self.start_time > self.TIMEOUT_SECONDS
+
+    def handle_timeout(self, file_path: str) -> bool:
+        """处理超时情况，还有重试机会时重置计时并返回True"""
+        self.is_timeout = True
+        self.logger.warning(f"文件分析超时: {file_path}")
+        if self.on_timeout:
+            self.on_timeout(file_path)
+
+        if self.retry_count < self.MAX_RETRIES:
+            self.retry_count += 1
+            self.logger.info(f"尝试第 {self.retry_count} 次重试分析: {file_path}")
+            self.start_time = time.time()  # 重置开始时间
+            return True
+        self.logger.error(f"文件分析重试次数已达上限: {file_path}")
+        return False
+
+    def analyze_chunk(self, file_path: str, chunk_number: int, chunk: TextChunk,
+                      total_chunks: Optional[int]) -> str:
+        """分析单个文本块，供并发的map阶段调用"""
+        self.cancel_token.raise_if_cancelled()
+        if self.check_timeout() and not self.handle_timeout(file_path):
+            raise TimeoutError(f"分析超时且重试失败: {file_path}")
+
+        content = None
+        if self.journal is not None:
+            content = self.journal.get_chunk(file_path, self.job_keys, chunk_number, chunk.text)
+        if content is None:
+            # 只有一个文本块时它的分析就是最终分析，流式返回
+            stream_for = file_path if total_chunks == 1 else None
+            content = self._request(build_chunk_messages(self.instruction, chunk.text), stream_for)
+            # 取消后返回的结果仍然记录，下次从这里继续；各块并发请求，在本线程中获取返回结果的服务
+            if self.journal is not None:
+                job, model = self._journal_key(answering_service(self.ai_service))
+                self.journal.record_chunk(file_path, job, chunk_number, chunk.text, content, model)
+        self.cancel_token.raise_if_cancelled()
+
+        progress = f"{chunk_number}/{total_chunks}" if total_chunks else str(chunk_number)
+        self._emit_status(f"Analyzed chunk {progress} (pages {chunk.page_range}) of {os.path.basename(file_path)}")
+        if self.on_chunk_completed:
+            self.on_chunk_completed(file_path, chunk_number, total_chunks)
+        return content
+
+    def map_chunks(self, file_path: str, text_chunks: Iterable[TextChunk],
+                   total_chunks: Optional[int] = None) -> List[str]:
+        """并发分析各文本块，结果按块顺序返回
+
+        text_chunks可以是边读取PDF边产出的生成器，每个块产出后立即提交；
+        已提交但未完成的块不超过并发数的2倍，读取速度快于请求时暂停读取，限制内存占用。
+        总块数未知且设置了on_partial_text时，读到第二个块（或读完）后才提交第一个块，只有一个块时流式返回
+        """
+        slots = threading.BoundedSemaphore(self.chunk_concurrency * 2)
+        executor = ThreadPoolExecutor(max_workers=self.chunk_concurrency)
+        # 等待提取进程产出文本块时取消，关闭流使迭代立即结束
+        stream = text_chunks if isinstance(text_chunks, ChunkStream) else None
+        if stream is not None:
+            self.cancel_token.add_callback(stream.close)
+        try:
+            chunks = iter(text_chunks)
+            if total_chunks is None and self.on_partial_text is not None:
+                head = list(itertools.islice(chunks, 2))
+                if len(head) == 1:
+                    total_chunks = 1
+                chunks = itertools.chain(head, chunks)
+            futures = []
+            for i, chunk in enumerate(chunks, 1):
+                while not slots.acquire(timeout=self.CANCEL_POLL_SECONDS):
+                    self.cancel_token.raise_if_cancelled()
+                self.cancel_token.raise_if_cancelled()
+                future = executor.submit(self.analyze_chunk, file_path, i, chunk, total_chunks)
+                future.add_done_callback(lambda _: slots.release())
+                futures.append(future)
+            return [wait_future(future, self.cancel_token) for future in futures]
+        finally:
+            # 取消时丢弃排队的块，在途请求由取消令牌中止，不等待请求线程结束
+            cancelled = self.cancel_token.is_cancelled
+            executor.shutdown(wait=not cancelled, cancel_futures=cancelled)
+            if stream is not None:
+                self.cancel_token.remove_callback(stream.close)
+            # 关闭边读取边分块的生成器或文本块流，及时释放打开的PDF文档
+            close = getattr(text_chunks, "close", None)
+            if close is not None:
+                close()
+
+    def generate_final_analysis(self, analysis_results: List[str], file_path: str = None) -> str:
+        """合并各文本块的分析结果，只有一个块时直接使用
+
+        Args:
+            analysis_results: 各文本块的分析结果
+            file_path: 设置了on_partial_text时流式返回的文件路径
+        """
+        if not analysis_results:
+            raise ValueError("没有可用的分析结果")
+        if len(analysis_results) == 1:
+            return analysis_results[0]
+        return self._send(build_final_analysis_messages(analysis_results), file_path)
+
+    def _analyze_chunks(self, file_path: str, filename: str, pdf_chunks: Optional[Iterable[TextChunk]]) -> str:
+        """分析各文本块并生成最终分析"""
+        if isinstance(pdf_chunks, list):
+            text_chunks, total_chunks = pdf_chunks, len(pdf_chunks)
+        elif pdf_chunks is not None:
+            # 提取进程边读取边产出的文本块流，总块数未知
+            text_chunks, total_chunks = pdf_chunks, None
+        else:
+            # PDF解析库较重，需要边读取边分块时再导入，使用预先分好的文本块时不依赖它
+            from core.pdf_reader import iter_pdf_chunks
+            text_chunks = iter_pdf_chunks(file_path, self.max_chunk_tokens, self.token_counter, self.text_cache)
+            total_chunks = None
+
+        self._emit_status(f"Analyzing chunks of {filename} (concurrency: {self.chunk_concurrency})")
+        analysis_results = self.map_chunks(file_path, text_chunks, total_chunks)
+
+        self._emit_status(f"Generating final summary for {filename}")
+        return self.generate_final_analysis(analysis_results, file_path)
+
+    def analyze_file(self, file_path: str, pdf_chunks: Iterable[TextChunk] = None) -> Dict:
+        """分析单个PDF文件并保存结果
+
+        Args:
+            file_path: PDF文件路径
+            pdf_chunks: 预先分好的文本块列表或提取进程产出的ChunkStream，
+                为None时在当前线程中边读取PDF边分块
+
+        Returns:
+            Dict: build_result_record构建的分析结果
+        """
+        self.start_time = time.time()
+        self.retry_count = 0
+        self.is_timeout = False
+        self.answered_by = None
+        filename = os.path.basename(file_path)
+
+        final_analysis = None
+        if self.journal is not None:
+            final_analysis = self.journal.get_file(file_path, self.job_keys)
+        if final_analysis is not None:
+            self._emit_status(f"Resumed finished analysis of {filename}")
+        else:
+            final_analysis = self._analyze_chunks(file_path, filename, pdf_chunks)
+            self.cancel_token.raise_if_cancelled()
+            if self.journal is not None:
+                # 最终分析由最后一次请求（只有一个块时即该块的请求）生成
+                job, model = self._journal_key(self.answered_by)
+                self.journal.record_file(file_path, job, final_analysis, model)
+
+        result_filename = None
+        try:
+            result_filename = save_analysis_result(file_path, final_analysis)
+            self.logger.info(f"分析结果已保存到文件: {result_filename}")
+        except Exception as e:
+            self.logger.error(f"保存分析结果到文件时发生错误: {str(e)}")
+
+        return build_result_record(
+            file_path,
+            final_analysis,
+            result_filename,
+            retry_count=self.retry_count,
+            is_timeout=self.is_timeout
+        )
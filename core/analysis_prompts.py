@@ -0,0 +1,117 @@
+"""
+论文分析提示词
+构建分块分析和最终汇总所用的消息，并从不同服务的响应中提取文本
+"""
+from typing import Any, Callable, List
+from services.message_types import Message
+from services.routing_context import candidate_services
+from utils.job_journal import job_key
+
+# 分块分析的系统提示词
+CHUNK_SYSTEM_PROMPT = "你是一个专业的学术论文分析助手，专注于判断论文实现的类型（official/unofficial）。"
+
+# 最终汇总的系统提示词
+FINAL_SYSTEM_PROMPT = "你是一个专业的论文分析助手，专注于判断论文实现的类型（official/unofficial）。请基于所有分析结果，给出最终的判断和完整的分析报告。"
+
+
+def build_chunk_messages(instruction: str, chunk: str) -> List[Message]:
+    """构建单个文本块的分析消息"""
+    return [
+        Message(role="system", content=CHUNK_SYSTEM_PROMPT),
+        Message(role="user", content=f"{instruction}\n\n{chunk}")
+    ]
+
+
+def build_final_analysis_messages(analysis_results: List[str]) -> List[Message]:
+    """构建多个分块结果的汇总消息"""
+    part_results = ''.join(
+        f'第{i + 1}部分分析：\n{result}\n\n' for i, result in enumerate(analysis_results)
+    )
+    summary_instruction = f"""这是对前面{len(analysis_results)}个部分分析的汇总。请生成一个完整的分析报告，格式如下：
+
+1. 基本信息
+- 标题：[从PDF文件名或内容中提取]
+- 作者：[从论文中提取]
+
+2. 实现情况分析
+- 实现类型：[必须是official/unofficial/未知之一]
+- 判断依据：[列出所有支持你判断的具体证据]
+- 代码开源：[是/否]
+- 代码链接：[如果有，提供链接]
+
+注意：
+1. 必须明确给出实现类型的判断
+2. 判断依据必须具体，不能笼统
+3. 如果无法判断类型，标注为"未知"并说明原因
+
+各部分分析结果：
+{part_results}
+"""
+    return [
+        Message(role="system", content=FINAL_SYSTEM_PROMPT),
+        Message(role="user", content=summary_instruction)
+    ]
+
+
+def analysis_job_key(ai_service, instruction: str) -> str:
+    """计算分析任务键，服务、模型、分析指令或系统提示词变化时任务日志中的记录不再复用"""
+    return job_key(getattr(ai_service, "service_name", type(ai_service).__name__.lower()),
+                   getattr(ai_service, "default_model", None),
+                   instruction, CHUNK_SYSTEM_PROMPT, FINAL_SYSTEM_PROMPT)
+
+
+def analysis_job_keys(ai_service, instruction: str) -> List[str]:
+    """经过路由或负载均衡时，每个可能返回结果的服务各有一个任务键，主服务在前
+
+    任务日志按实际返回结果的服务记录，读取时依次查找这些任务键
+    """
+    keys = []
+    for service in candidate_services(ai_service):
+        key = analysis_job_key(service, instruction)
+        if key not in keys:
+            keys.append(key)
+    return keys
+
+
+def extract_response_content(response: Any) -> str:
+    """从AI服务响应中提取文本内容
+
+    兼容三种响应格式：
+    - OpenAIService返回的字典
+    - GrokService返回的ChatCompletion对象
+    - DeepseekService返回的Message对象
+    """
+    if isinstance(response, Message):
+        return response.content
+    if isinstance(response, dict):
+        return response["choices"][0]["message"]["content"]
+    if response is not None and getattr(response, "choices", None):
+        return response.choices[0].message.content
+    raise ValueError("未收到有效的AI响应")
+
+
+def stream_response_content(ai_service, messages: List[Message], on_delta: Callable[[str], None],
+                            cancel_token=None) -> str:
+    """流式发送请求，每收到一段回复文本调用on_delta，返回完整文本
+
+    服务没有stream_message时退回send_message，完整回复作为一段交给on_delta。
+    设置了取消令牌时，取消后关闭响应流并抛出AnalysisCancelled
+    """
+    if hasattr(ai_service, "stream_message"):
+        stream = ai_service.stream_message(messages)
+    else:
+        stream = iter([extract_response_content(ai_service.send_message(messages))])
+    parts = []
+    try:
+        for delta in stream:
+            if cancel_token is not None:
+                cancel_token.raise_if_cancelled()
+            if delta:
+                parts.append(delta)
+                on_delta(delta)
+    finally:
+        # 提前结束时关闭生成器，释放HTTP连接
+        close = getattr(stream, "close", None)
+        if close is not None:
+            close()
+    return "".join(parts)
@@ -0,0 +1,322 @@
+"""
+异步分析引擎
+在单个事件循环中并发驱动大量分块请求，不依赖Qt，可直接在命令行或服务器上使用
+"""
+import asyncio
+import os
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from core.tokenizer import chunking_for_service
+from core.analysis_prompts import (build_chunk_messages, build_final_analysis_messages, extract_response_content,
+                                   stream_response_content, analysis_job_key, analysis_job_keys)
+from core.pdf_reader import iter_pdf_chunks, stream_pdf_chunks, create_extraction_pool
+from core.chunk_stream import ChunkStream, create_stream_manager
+from core.result_writer import save_analysis_result, build_result_record
+from core.cancellation import AnalysisCancelled, CancellationToken, cancel_scope
+from services.routing_context import answering_service, aclose_async_clients
+from utils.config_manager import ConfigManager
+from utils.logger import Logger
+
+
+class AsyncAnalysisEngine:
+    """异步分析引擎
+
+    通过AIService.send_message_async发送请求，所有文件的分块请求共享同一个
+    并发上限，事件通过回调通知调用方：
+    - on_status(message): 状态更新
+    - on_completed(file_path, record): 单个文件分析完成
+    - on_error(file_path, message): 单个文件分析失败
+    - on_partial_text(file_path, text): 最终分析的增量文本，与AnalysisPipeline一致，
+      只有一个文本块时流式返回该块的分析，多个块时流式返回合并请求的结果
+    设置了任务日志时，已完成的文件和已分析的文本块直接使用记录的结果，
+    新的结果按实际返回结果的服务记录任务键和模型。
+    cancel()可在任意线程中调用，取消事件循环中的所有任务，在途的HTTP请求随之中止
+    """
+
+    # 同时在途的最大请求数
+    DEFAULT_MAX_IN_FLIGHT = 100
+    # 同时处理的最大文件数（限制内存中PDF文本的数量）
+    DEFAULT_MAX_FILES = 16
+    # 单个文件同时在途的最大分块请求数
+    DEFAULT_CHUNK_CONCURRENCY = 4
+    # 每个chunk的默认最大token数（模型配置了context_window时按上下文窗口计算）
+    MAX_CHUNK_TOKENS = 10000
+
+    def __init__(self, ai_service, instruction: str,
+                 max_in_flight: int = None,
+                 max_files: int = None,
+                 chunk_concurrency: int = None,
+                 text_cache=None,
+                 extraction_workers: int = None,
+                 journal=None,
+                 cancel_token: CancellationToken = None,
+                 on_status: Optional[Callable[[str], None]] = None,
+                 on_completed: Optional[Callable[[str, Dict], None]] = None,
+                 on_error: Optional[Callable[[str, str], None]] = None,
+                 on_partial_text: Optional[Callable[[str, str], None]] = None):
+        self.ai_service = ai_service
+        self.instruction = instruction
+        self.max_in_flight = max(1, max_in_flight or self.DEFAULT_MAX_IN_FLIGHT)
+        self.max_files = max(1, max_files or self.DEFAULT_MAX_FILES)
+        self.chunk_concurrency = max(1, chunk_concurrency or self.DEFAULT_CHUNK_CONCURRENCY)
+        self.text_cache = text_cache
+        self.token_counter, self.max_chunk_tokens = chunking_for_service(ai_service, self.MAX_CHUNK_TOKENS)
+        # 提取进程数，为None时使用CPU核数
+        self.extraction_workers = extraction_workers
+        # 任务日志（JobJournal），为None时不记录也不续跑
+        self.journal = journal
+        self.cancel_token = cancel_token or CancellationToken()
+        # 读取任务日志时依次查找的任务键，经过路由时包括各备用服务的任务键
+        self.job_keys = analysis_job_keys(ai_service, instruction)
+        self.job_key = self.job_keys[0]
+        self.on_status = on_status
+        self.on_completed = on_completed
+        self.on_error = on_error
+        analysis_config = ConfigManager().get_config().get("analysis", {})
+        self.on_partial_text = on_partial_text if analysis_config.get("stream", True) else None
+        self.logger = Logger.create_logger('async_engine')
+        self._request_semaphore = None
+        self._file_semaphore = None
+        self._extraction_pool = None
+        self._stream_manager = None
+
+    def _ensure_semaphores(self):
+        """在当前事件循环中创建并发控制信号量"""
+        if self._request_semaphore is None:
+            self._request_semaphore = asyncio.Semaphore(self.max_in_flight)
+            self._file_semaphore = asyncio.Semaphore(self.max_files)
+
+    def _emit_status(self, message: str):
+        if self.on_status:
+            self.on_status(message)
+
+    def cancel(self):
+        """取消分析，可在任意线程中调用"""
+        self.cancel_token.cancel()
+
+    async def _send(self, messages, file_semaphore: asyncio.Semaphore = None,
+                    stream_for: Optional[str] = None) -> Tuple[str, Any]:
+        """在并发上限内发送一个请求
+
+        Args:
+            messages: 消息列表
+            file_semaphore: 单个文件的分块并发限制，为None时只受全局上限约束
+            stream_for: 设置了on_partial_text时流式返回的文件路径
+
+        Returns:
+            tuple: (文本内容, 实际返回结果的服务)
+        """
+        if file_semaphore is None:
+            async with self._request_semaphore:
+                return await self._request(messages, stream_for)
+        async with file_semaphore, self._request_semaphore:
+            return await self._request(messages, stream_for)
+
+    async def _request(self, messages, stream_for: Optional[str]) -> Tuple[str, Any]:
+        """发送请求，stream_for为文件路径且设置了on_partial_text时使用流式请求"""
+        if stream_for is None or self.on_partial_text is None:
+            response = await self.ai_service.send_message_async(messages)
+            return extract_response_content(response), answering_service(self.ai_service)
+
+        # 服务只提供同步的流式接口，在线程中读取响应流；任务被取消时通过取消令牌关闭响应流
+        token = CancellationToken()
+        try:
+            return await asyncio.to_thread(self._stream, messages, stream_for, token)
+        except asyncio.CancelledError:
+            token.cancel()
+            raise
+
+    def _stream(self, messages, file_path: str, token: CancellationToken) -> Tuple[str, Any]:
+        """在线程中流式请求，每段回复通过on_partial_text回调"""
+        with cancel_scope(token):
+            content = stream_response_content(self.ai_service, messages,
+                                              lambda delta: self.on_partial_text(file_path, delta), token)
+        return content, answering_service(self.ai_service)
+
+    def _journal_key(self, service) -> tuple:
+        """任务日志中记录的(任务键, 模型)，按实际返回结果的服务计算"""
+        service = service if service is not None else self.ai_service
+        return analysis_job_key(service, self.instruction), getattr(service, "default_model", None)
+
+    async def _analyze_chunk(self, file_path: str, chunk_number: int, chunk_text: str,
+                             file_semaphore: asyncio.Semaphore, is_only: bool = False) -> Tuple[str, Any]:
+        """分析单个文本块，任务日志中已有结果时直接使用；is_only为True时它的分析就是最终分析，流式返回
+
+        Returns:
+            tuple: (分析结果, 实际返回结果的服务，使用日志中的结果时为None)
+        """
+        if self.journal is not None:
+            content = self.journal.get_chunk(file_path, self.job_keys, chunk_number, chunk_text)
+            if content is not None:
+                return content, None
+        content, service = await self._send(build_chunk_messages(self.instruction, chunk_text), file_semaphore,
+                                            file_path if is_only else None)
+        if self.journal is not None:
+            job, model = self._journal_key(service)
+            await asyncio.to_thread(self.journal.record_chunk, file_path, job,
+                                    chunk_number, chunk_text, content, model)
+        return content, service
+
+    def _start_extraction(self, file_path: str):
+        """开始边读取边分块地提取PDF文本
+
+        analyze_files中由进程池提取（PDF解析和分块是CPU密集型操作，不阻塞事件循环也不受GIL限制），
+        每个块填满后即通过ChunkStream传回；单独调用analyze_file时在线程中边读取边分块
+
+        Returns:
+            tuple: (文本块的可迭代对象, 提取进程的任务，在线程中提取时为None)
+        """
+        if self._extraction_pool is None:
+            return iter_pdf_chunks(file_path, self.max_chunk_tokens, self.token_counter, self.text_cache), None
+
+        cache_directory = self.text_cache.directory if self.text_cache is not None else None
+        stream = ChunkStream(self._stream_manager)
+        future = asyncio.get_running_loop().run_in_executor(
+            self._extraction_pool, stream_pdf_chunks, stream, file_path, self.max_chunk_tokens,
+            self.token_counter.model, self.token_counter.encoding_name, cache_directory)
+        # 提取进程未能正常运行时关闭流，避免一直等待
+        future.add_done_callback(lambda f: stream.close() if f.cancelled() or f.exception() else None)
+        return stream, future
+
+    async def _analyze_chunks(self, file_path: str, filename: str) -> Tuple[str, Any]:
+        """边提取PDF文本块边并发分析，全部完成后生成最终分析
+
+        Returns:
+            tuple: (最终分析, 生成最终分析的服务)
+        """
+        self._emit_status(f"Analyzing chunks of {filename}")
+        loop = asyncio.get_running_loop()
+        chunks, extraction = self._start_extraction(file_path)
+        iterator = iter(chunks)
+        chunk_semaphore = asyncio.Semaphore(self.chunk_concurrency)
+        # 已读取但未完成的块不超过并发数的2倍，读取速度快于请求时暂停读取，限制内存占用
+        slots = asyncio.Semaphore(self.chunk_concurrency * 2)
+        tasks = []
+        # 已读取、尚未提交的下一个块
+        lookahead = []
+        try:
+            while True:
+                await slots.acquire()
+                # 在线程中等待下一个块，不阻塞事件循环
+                chunk = lookahead.pop() if lookahead else await loop.run_in_executor(None, next, iterator, None)
+                if chunk is None:
+                    break
+                is_only = False
+                if not tasks and self.on_partial_text is not None:
+                    # 总块数未知，先读取下一个块：只有一个块时它的分析就是最终分析，流式返回
+                    lookahead.append(await loop.run_in_executor(None, next, iterator, None))
+                    is_only = lookahead[0] is None
+                task = asyncio.ensure_future(
+                    self._analyze_chunk(file_path, len(tasks) + 1, chunk.text, chunk_semaphore, is_only))
+                task.add_done_callback(lambda _: slots.release())
+                tasks.append(task)
+            # gather按块顺序返回结果
+            analysis_results = await asyncio.gather(*tasks)
+        except BaseException as e:
+            for task in tasks:
+                task.cancel()
+            if (isinstance(e, AnalysisCancelled) and extraction is not None and extraction.done()
+                    and not extraction.cancelled() and extraction.exception() is not None):
+                # 提取进程异常退出时流被关闭，报告提取进程的错误
+                raise extraction.exception() from None
+            raise
+        finally:
+            # 停止提取，释放打开的PDF文档
+            try:
+                chunks.close()
+            except ValueError:
+                # 取消时线程中的生成器仍在读取下一页，读取结束后随生成器一起回收
+                pass
+
+        if not analysis_results:
+            raise ValueError("没有可用的分析结果")
+        if len(analysis_results) == 1:
+            return analysis_results[0]
+        self._emit_status(f"Generating final summary for {filename} ({len(analysis_results)} chunks)")
+        return await self._send(build_final_analysis_messages([content for content, _ in analysis_results]),
+                                stream_for=file_path)
+
+    async def analyze_file(self, file_path: str) -> Dict:
+        """分析单个PDF文件
+
+        Returns:
+            Dict: 与AnalysisPipeline.analyze_file相同结构的分析结果
+        """
+        self._ensure_semaphores()
+        filename = os.path.basename(file_path)
+
+        final_analysis = None
+        if self.journal is not None:
+            final_analysis = self.journal.get_file(file_path, self.job_keys)
+        if final_analysis is not None:
+            self._emit_status(f"Resumed finished analysis of {filename}")
+        else:
+            final_analysis, service = await self._analyze_chunks(file_path, filename)
+            if self.journal is not None:
+                job, model = self._journal_key(service)
+                await asyncio.to_thread(self.journal.record_file, file_path, job, final_analysis, model)
+
+        result_filename = None
+        try:
+            result_filename = await asyncio.to_thread(save_analysis_result, file_path, final_analysis)
+            self.logger.info(f"分析结果已保存到文件: {result_filename}")
+        except Exception as e:
+            self.logger.error(f"保存分析结果到文件时发生错误: {str(e)}")
+
+        return build_result_record(file_path, final_analysis, result_filename)
+
+    async def _run_file(self, file_path: str) -> Optional[Dict]:
+        """分析单个文件并通过回调报告结果，失败时返回None"""
+        async with self._file_semaphore:
+            try:
+                record = await self.analyze_file(file_path)
+            except Exception as e:
+                self.logger.error(f"处理文件时发生错误: {file_path}, 错误: {str(e)}")
+                if self.on_error:
+                    self.on_error(file_path, str(e))
+                return None
+
+        self.logger.info(f"File analysis completed: {file_path}")
+        if self.on_completed:
+            self.on_completed(file_path, record)
+        return record
+
+    async def analyze_files(self, file_paths: List[str]) -> List[Dict]:
+        """并发分析多个文件
+
+        Returns:
+            List[Dict]: 成功分析的文件结果，顺序与输入一致
+        """
+        self._ensure_semaphores()
+        self._emit_status(f"开始分析 {len(file_paths)} 个PDF文件...")
+        self._extraction_pool = create_extraction_pool(self.extraction_workers)
+        self._stream_manager = create_stream_manager()
+        loop = asyncio.get_running_loop()
+        tasks = [asyncio.ensure_future(self._run_file(path)) for path in file_paths]
+
+        def cancel_tasks():
+            # 取消令牌可能在其他线程中触发，任务只能在事件循环所在线程中取消
+            try:
+                loop.call_soon_threadsafe(lambda: [task.cancel() for task in tasks])
+            except RuntimeError:
+                pass
+
+        self.cancel_token.add_callback(cancel_tasks)
+        try:
+            records = await asyncio.gather(*tasks, return_exceptions=True)
+        finally:
+            self.cancel_token.remove_callback(cancel_tasks)
+            self._extraction_pool.shutdown(wait=False, cancel_futures=True)
+            self._extraction_pool = None
+            self._stream_manager.shutdown()
+            self._stream_manager = None
+            # 异步客户端绑定到本事件循环，循环结束后无法再使用，关闭以释放连接池
+            await aclose_async_clients(self.ai_service)
+        if self.cancel_token.is_cancelled:
+            self.logger.info("异步分析已取消")
+        return [record for record in records if isinstance(record, dict)]
+
+    def run(self, file_paths: List[str]) -> List[Dict]:
+        """在新的事件循环中同步执行analyze_files，供无GUI环境调用"""
+        self._request_semaphore = None
+        self._file_semaphore = None
+        return asyncio.run(self.analyze_files(file_paths))
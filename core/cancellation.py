@@ -0,0 +1,107 @@
+"""
+协作式取消
+分析流程在文本块之间检查取消令牌，取消时通过回调中止在途请求，代替强制终止线程
+"""
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Iterator, List, Optional
+
+
+class AnalysisCancelled(Exception):
+    """分析已被取消"""
+
+
+class CancellationToken:
+    """取消令牌，可在任意线程中取消，取消后不可恢复"""
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks: List[Callable[[], None]] = []
+
+    @property
+    def is_cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self):
+        """取消，并在当前线程中依次调用已注册的回调"""
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback()
+
+    def raise_if_cancelled(self):
+        """已取消时抛出AnalysisCancelled"""
+        if self._event.is_set():
+            raise AnalysisCancelled("分析已取消")
+
+    def wait(self, timeout: float = None) -> bool:
+        """等待取消，返回是否已取消"""
+        return self._event.wait(timeout)
+
+    def add_callback(self, callback: Callable[[], None]):
+        """注册取消时调用的回调，已取消时立即调用"""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def remove_callback(self, callback: Callable[[], None]):
+        """移除回调，请求完成后调用，避免回调累积"""
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+
+# 当前线程（或异步任务）中请求所属的取消令牌，供服务层在重试等待和读取响应流时响应取消
+_current_token: ContextVar[Optional[CancellationToken]] = ContextVar("cancel_token", default=None)
+
+
+@contextmanager
+def cancel_scope(token: CancellationToken) -> Iterator[CancellationToken]:
+    """在with块内把token设为当前取消令牌"""
+    reset = _current_token.set(token)
+    try:
+        yield token
+    finally:
+        _current_token.reset(reset)
+
+
+def current_cancel_token() -> Optional[CancellationToken]:
+    """获取当前取消令牌，不在cancel_scope内时返回None"""
+    return _current_token.get()
+
+
+def cancellable_sleep(seconds: float):
+    """等待seconds秒，当前取消令牌在等待期间取消时立即抛出AnalysisCancelled"""
+    token = _current_token.get()
+    if token is None:
+        time.sleep(seconds)
+    elif token.wait(seconds):
+        token.raise_if_cancelled()
+
+
+@contextmanager
+def close_on_cancel(close: Callable[[], None]) -> Iterator[None]:
+    """在with块内当前取消令牌取消时调用close，中止正在读取的HTTP响应
+
+    close使块内的读取出错时改为抛出AnalysisCancelled；不在cancel_scope内时不做任何处理
+    """
+    token = _current_token.get()
+    if token is None:
+        yield
+        return
+    token.add_callback(close)
+    try:
+        yield
+    except Exception:
+        token.raise_if_cancelled()
+        raise
+    finally:
+        token.remove_callback(close)
@@ -0,0 +1,80 @@
+"""
+文本块流
+提取进程边读取PDF边把文本块放入队列，请求方逐块取出，
+第一个块分好后即可开始发送请求，不必等整个文件读完
+"""
+import multiprocessing
+import queue
+from typing import Iterator
+from core.cancellation import AnalysisCancelled
+from core.text_chunker import TextChunk
+
+
+def create_stream_manager():
+    """创建传递文本块流的管理器进程
+
+    与提取进程池一样使用spawn方式启动，避免在已有Qt和网络线程的进程中fork
+    """
+    return multiprocessing.get_context("spawn").Manager()
+
+
+class ChunkStream:
+    """跨进程的文本块流
+
+    队列和关闭标志由管理器进程持有，ChunkStream可以作为进程池任务的参数传给提取进程。
+    提取进程通过put()逐块放入，结束时放入None，出错时放入异常对象；
+    队列有上限，请求跟不上读取时提取进程暂停读取，内存中等待的文本块不超过buffer_size个。
+    请求方迭代时逐块取出，提取进程中的异常在迭代时重新抛出；
+    close()后提取进程在下一个块之前停止，正在等待文本块的请求方抛出AnalysisCancelled
+    """
+
+    # 默认缓冲的文本块数
+    DEFAULT_BUFFER_SIZE = 8
+    # 等待队列时检查关闭标志的间隔（秒）
+    POLL_SECONDS = 0.2
+
+    def __init__(self, manager, buffer_size: int = DEFAULT_BUFFER_SIZE):
+        """初始化文本块流
+
+        Args:
+            manager: create_stream_manager创建的管理器
+            buffer_size: 队列中最多缓冲的文本块数
+        """
+        self.queue = manager.Queue(max(1, int(buffer_size)))
+        self.closed = manager.Event()
+
+    def put(self, item) -> bool:
+        """放入文本块、结束标记None或异常，队列已满时等待
+
+        Returns:
+            bool: 流已关闭、不再需要后续文本块时返回False
+        """
+        while not self.closed.is_set():
+            try:
+                self.queue.put(item, timeout=self.POLL_SECONDS)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def __iter__(self) -> Iterator[TextChunk]:
+        while True:
+            try:
+                item = self.queue.get(timeout=self.POLL_SECONDS)
+            except queue.Empty:
+                if self.closed.is_set():
+                    raise AnalysisCancelled("文本块流已关闭")
+                continue
+            if item is None:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+
+    def close(self):
+        """关闭流，停止提取，可在任意线程中调用"""
+        try:
+            self.closed.set()
+        except (OSError, EOFError):
+            # 管理器进程已经退出
+            pass
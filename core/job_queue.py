@@ -0,0 +1,127 @@
+"""
+分析任务队列
+按文件全局序号排序的两阶段队列和提供商并发限制，不依赖Qt，由AnalysisScheduler驱动
+"""
+from collections import defaultdict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+import heapq
+import itertools
+
+
+class AnalysisJobQueue:
+    """两阶段分析任务队列
+
+    提交的任务先进入等待提取队列，按global_index出队开始提取后进入所属提供商的待请求队列；
+    已开始提取、等待请求的任务数不超过extraction_queue_size。
+    next_job()在未达到并发上限的提供商中取出global_index最小的任务并占用该提供商的名额，
+    请求结束后调用release()归还。
+
+    等待提取的任务为(global_index, sequence, file_path, ai_service, instruction)，
+    待请求的任务在末尾附加提取结果pdf_chunks
+    """
+
+    # 默认提取缓冲区大小（已提交提取、等待请求的文件数上限）
+    DEFAULT_EXTRACTION_QUEUE_SIZE = 8
+
+    def __init__(self, max_concurrent: int, provider_limits: Dict[str, int] = None,
+                 extraction_queue_size: int = DEFAULT_EXTRACTION_QUEUE_SIZE):
+        """初始化任务队列
+
+        Args:
+            max_concurrent: 没有单独配置上限的提供商的并发上限
+            provider_limits: 提供商并发上限，键为"service"或"service.provider"
+            extraction_queue_size: 已开始提取、等待请求的任务数上限
+        """
+        self.max_concurrent = max(1, int(max_concurrent))
+        self.provider_limits = dict(provider_limits or {})
+        self.extraction_queue_size = max(1, int(extraction_queue_size))
+        # 等待提取的任务，按global_index排序
+        self._to_extract: List[tuple] = []
+        # 每个提供商一个按global_index排序的待请求队列（已开始提取）
+        self._pending: Dict[str, List[tuple]] = defaultdict(list)
+        self._sequence = itertools.count()
+        self._provider_running: Dict[str, int] = defaultdict(int)
+
+    @property
+    def pending_count(self) -> int:
+        """等待中的任务数（包括等待提取和已开始提取、等待请求的任务）"""
+        return len(self._to_extract) + self.ready_count
+
+    @property
+    def ready_count(self) -> int:
+        """已开始提取、等待请求的任务数"""
+        return sum(len(queue) for queue in self._pending.values())
+
+    def running_count(self, provider_key: str) -> int:
+        """提供商正在请求的任务数"""
+        return self._provider_running[provider_key]
+
+    def submit(self, file_path: str, global_index: int, ai_service, instruction: str):
+        """提交一个任务到等待提取队列"""
+        job = (global_index, next(self._sequence), file_path, ai_service, instruction)
+        heapq.heappush(self._to_extract, job)
+
+    @staticmethod
+    def provider_key(ai_service) -> str:
+        """获取服务实例对应的提供商键"""
+        service_name = getattr(ai_service, "service_name", type(ai_service).__name__.lower())
+        provider_name = getattr(ai_service, "provider_name", None)
+        return f"{service_name}.{provider_name}" if provider_name else service_name
+
+    def provider_limit(self, provider_key: str) -> int:
+        """获取提供商的并发上限，优先匹配"service.provider"，其次匹配"service" """
+        limit = self.provider_limits.get(provider_key)
+        if limit is None:
+            limit = self.provider_limits.get(provider_key.split(".", 1)[0])
+        if limit is None:
+            return self.max_concurrent
+        return max(1, int(limit))
+
+    def start_extractions(self, start_extraction: Callable[[str, Any], Iterable]):
+        """在缓冲区上限内按global_index开始提取等待中的任务
+
+        Args:
+            start_extraction: 接收(file_path, ai_service)，返回该文件的文本块（列表或ChunkStream）
+        """
+        while self._to_extract and self.ready_count < self.extraction_queue_size:
+            global_index, sequence, file_path, ai_service, instruction = heapq.heappop(self._to_extract)
+            pdf_chunks = start_extraction(file_path, ai_service)
+            job = (global_index, sequence, file_path, ai_service, instruction, pdf_chunks)
+            heapq.heappush(self._pending[self.provider_key(ai_service)], job)
+
+    def next_job(self) -> Optional[Tuple[str, tuple]]:
+        """在未达到并发上限的提供商中，取出global_index最小的任务并占用一个名额
+
+        Returns:
+            (provider_key, job)，没有可以开始的任务时返回None
+        """
+        candidate_key = None
+        for provider_key, queue in self._pending.items():
+            if not queue:
+                continue
+            if self._provider_running[provider_key] >= self.provider_limit(provider_key):
+                continue
+            if candidate_key is None or queue[0] < self._pending[candidate_key][0]:
+                candidate_key = provider_key
+
+        if candidate_key is None:
+            return None
+        self._provider_running[candidate_key] += 1
+        return candidate_key, heapq.heappop(self._pending[candidate_key])
+
+    def release(self, provider_key: str):
+        """任务结束后归还提供商的并发名额"""
+        if self._provider_running[provider_key] > 0:
+            self._provider_running[provider_key] -= 1
+
+    def clear(self) -> List[tuple]:
+        """清空等待中的任务并重置并发名额
+
+        Returns:
+            List[tuple]: 已开始提取、等待请求的任务，调用方负责结束其提取
+        """
+        ready_jobs = [job for queue in self._pending.values() for job in queue]
+        self._to_extract.clear()
+        self._pending.clear()
+        self._provider_running.clear()
+        return ready_jobs
@@ -0,0 +1,113 @@
+"""
+PDF文本提取
+"""
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Iterator, Optional
+import multiprocessing
+from core.text_chunker import TextChunk, iter_page_chunks, estimate_tokens
+from core.tokenizer import get_token_counter
+from utils.pdf_text_cache import PdfTextCache
+
+
+def iter_pdf_pages(file_path: str, text_cache=None) -> Iterator[str]:
+    """惰性地逐页读取PDF文本
+
+    缓存命中时直接产出缓存的页面；未命中时逐页解析，
+    启用缓存的情况下每页解析后即写入缓存的临时文件，读完后替换为正式缓存，
+    中途停止读取时丢弃临时文件
+
+    Raises:
+        ValueError: 文件格式错误或读取失败
+    """
+    pages = text_cache.get(file_path) if text_cache is not None else None
+    if pages is not None:
+        yield from pages
+        return
+
+    # PDF解析库较重，只在缓存未命中时导入
+    import fitz  # PyMuPDF
+
+    writer = text_cache.open_writer(file_path) if text_cache is not None else None
+    try:
+        try:
+            with fitz.open(file_path) as doc:
+                for page in doc:
+                    page_text = page.get_text()
+                    if writer is not None:
+                        writer.add(page_text)
+                    yield page_text
+        except fitz.FileDataError as e:
+            raise ValueError(f"PDF文件格式错误: {str(e)}")
+        except Exception as e:
+            raise ValueError(f"读取PDF文件时发生错误: {str(e)}")
+
+        if writer is not None:
+            writer.commit()
+            writer = None
+    finally:
+        if writer is not None:
+            writer.abort()
+
+
+def iter_pdf_chunks(file_path: str, max_tokens: int,
+                    count_tokens: Callable[[str], int] = estimate_tokens,
+                    text_cache=None) -> Iterator[TextChunk]:
+    """边读取PDF边产出文本块，第一个块填满后即可开始发送请求
+
+    Raises:
+        ValueError: 文件格式错误、读取失败或内容为空
+    """
+    empty = True
+    for chunk in iter_page_chunks(iter_pdf_pages(file_path, text_cache), max_tokens, count_tokens):
+        empty = False
+        yield chunk
+    if empty:
+        raise ValueError(f"文件内容为空: {file_path}")
+
+
+def stream_pdf_chunks(stream, file_path: str, max_tokens: int, model: Optional[str] = None,
+                      encoding_name: Optional[str] = None,
+                      cache_directory: Optional[str] = None) -> int:
+    """在提取进程中边读取PDF边分块，每个块填满后立即放入ChunkStream
+
+    作为进程池的任务函数，只接收可序列化的参数，token计数也在子进程中完成；
+    指定cache_directory时在子进程中使用该目录下的PDF文本缓存。
+    请求方关闭流后停止读取；出错时把异常放入流，由请求方在迭代时抛出
+
+    Returns:
+        int: 放入流中的文本块数
+    """
+    count = 0
+    chunks = None
+    try:
+        text_cache = PdfTextCache(cache_directory) if cache_directory else None
+        counter = get_token_counter(model, encoding_name)
+        chunks = iter_pdf_chunks(file_path, max_tokens, counter, text_cache)
+        for chunk in chunks:
+            if not stream.put(chunk):
+                return count
+            count += 1
+    except Exception as e:
+        stream.put(e)
+        return count
+    finally:
+        # 提前停止时关闭生成器，释放打开的PDF文档并丢弃未完成的缓存
+        if chunks is not None:
+            chunks.close()
+    stream.put(None)
+    return count
+
+
+def create_extraction_pool(max_workers: Optional[int] = None) -> ProcessPoolExecutor:
+    """创建PDF文本提取进程池
+
+    PDF解析和token计数是CPU密集型操作，放到独立进程中可以绕开GIL、利用多核。
+    使用spawn方式启动子进程，避免在已有Qt和网络线程的进程中fork
+
+    Args:
+        max_workers: 进程数，为None时使用CPU核数
+    """
+    return ProcessPoolExecutor(
+        max_workers=max_workers,
+        mp_context=multiprocessing.get_context("spawn")
+    )
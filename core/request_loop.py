@@ -0,0 +1,40 @@
+"""
+请求事件循环
+线程中运行的分析流水线通过后台事件循环发送异步请求，取消时取消请求任务，在途的HTTP请求随之中止；
+进程内共享一个事件循环，各服务在其中创建的异步客户端和连接池在文件之间复用
+"""
+import asyncio
+import concurrent.futures
+import threading
+from typing import Any, Coroutine, Optional
+from core.cancellation import AnalysisCancelled, CancellationToken
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_lock = threading.Lock()
+
+
+def get_request_loop() -> asyncio.AbstractEventLoop:
+    """获取共享的请求事件循环，首次调用时在后台守护线程中启动"""
+    global _loop
+    with _lock:
+        if _loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="request-loop", daemon=True).start()
+            _loop = loop
+        return _loop
+
+
+def run_request(coro: Coroutine, cancel_token: CancellationToken) -> Any:
+    """在请求事件循环中运行coro并等待结果，cancel_token取消时取消请求任务
+
+    Raises:
+        AnalysisCancelled: 等待期间取消，请求任务已被取消
+    """
+    future = asyncio.run_coroutine_threadsafe(coro, get_request_loop())
+    cancel_token.add_callback(future.cancel)
+    try:
+        return future.result()
+    except concurrent.futures.CancelledError:
+        raise AnalysisCancelled("分析已取消")
+    finally:
+        cancel_token.remove_callback(future.cancel)
@@ -0,0 +1,79 @@
+"""
+分析结果保存
+"""
+import os
+import threading
+from datetime import datetime
+from typing import Optional
+
+
+def get_result_path(file_path: str) -> str:
+    """获取PDF文件对应的分析结果文件路径"""
+    return os.path.splitext(file_path)[0] + "_analysis.txt"
+
+
+def save_analysis_result(file_path: str, content: str) -> str:
+    """将分析结果写入PDF同目录下的 *_analysis.txt 文件
+
+    Args:
+        file_path: PDF文件路径
+        content: 分析结果
+
+    Returns:
+        str: 分析结果文件路径
+    """
+    result_filename = get_result_path(file_path)
+
+    # 确保目录存在
+    os.makedirs(os.path.dirname(result_filename), exist_ok=True)
+
+    # 先写临时文件再替换，取消或崩溃时不会留下写了一半的结果文件；
+    # 临时文件用open创建，权限与直接写入时一样遵循umask
+    temp_path = f"{result_filename}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            # 写入时间戳
+            f.write(f"分析时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+            f.write("="*50 + "\n\n")
+            # 写入分析结果
+            f.write(content)
+        os.replace(temp_path, result_filename)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+    return result_filename
+
+
+def read_analysis_result(file_path: str) -> Optional[str]:
+    """读取PDF对应的已保存分析结果（去掉文件头），结果文件不存在或早于PDF时返回None"""
+    result_filename = get_result_path(file_path)
+    try:
+        if os.path.getmtime(result_filename) < os.path.getmtime(file_path):
+            return None
+        with open(result_filename, 'r', encoding='utf-8') as f:
+            content = f.read()
+    except OSError:
+        return None
+
+    # 文件头为分析时间和分隔线，见save_analysis_result
+    separator = "=" * 50 + "\n\n"
+    if separator in content:
+        content = content.split(separator, 1)[1]
+    return content or None
+
+
+def build_result_record(file_path: str, content: str, result_file: str = None, **extra) -> dict:
+    """构建分析结果记录，字段与AnalysisPipeline的返回值保持一致"""
+    record = {
+        "file_path": file_path,
+        "directory": os.path.dirname(file_path),
+        "filename": os.path.basename(file_path),
+        "content": content,
+        "analysis_status": "已分析",
+        "analysis_time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "result_file": result_file
+    }
+    record.update(extra)
+    return record
@@ -0,0 +1,181 @@
+"""
+汇总报告生成
+根据各文件的分析结果在本地生成汇总表格和统计信息，再由AI服务分层撰写汇总分析，
+不依赖Qt，供SummaryThread和命令行复用
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+from core.analysis_prompts import extract_response_content, stream_response_content
+from core.summary_prompts import build_summary_messages, build_summary_merge_messages
+from core.summary_table import (extract_analysis_fields, sort_fields, build_summary_table,
+                                compute_statistics, format_statistics)
+from utils.config_manager import ConfigManager
+from utils.logger import Logger
+
+
+class SummaryBuilder:
+    """汇总报告生成器"""
+
+    # 每个汇总请求最多包含的文件数或部分汇总数
+    DEFAULT_FAN_OUT = 20
+    # 同一层同时发送的最大汇总请求数
+    DEFAULT_CONCURRENCY = 4
+
+    def __init__(self, ai_service, instruction: str, fan_out: int = None, concurrency: int = None,
+                 on_status: Optional[Callable[[str], None]] = None,
+                 on_partial_text: Optional[Callable[[str], None]] = None):
+        """初始化汇总报告生成器
+
+        Args:
+            ai_service: 使用的AI服务实例
+            instruction: 汇总指令
+            fan_out: 每个请求最多汇总的条目数，为None时读取配置summary.fan_out
+            concurrency: 同一层的并发请求数，为None时读取配置summary.concurrency
+            on_status: 状态更新回调
+            on_partial_text: 报告的增量文本回调，先返回汇总表格和统计信息，再流式返回汇总分析；
+                为None或配置summary.stream为false时不使用流式请求
+        """
+        self.ai_service = ai_service
+        self.instruction = instruction
+        summary_config = ConfigManager().get_config().get("summary", {})
+        if fan_out is None:
+            fan_out = summary_config.get("fan_out", self.DEFAULT_FAN_OUT)
+        if concurrency is None:
+            concurrency = summary_config.get("concurrency", self.DEFAULT_CONCURRENCY)
+        # 至少为2，否则合并层数不会收敛
+        self.fan_out = max(2, int(fan_out))
+        self.concurrency = max(1, int(concurrency))
+        self.on_status = on_status
+        self.on_partial_text = on_partial_text if summary_config.get("stream", True) else None
+        self.logger = Logger.create_logger('summary_builder')
+
+    def _emit_status(self, message: str):
+        if self.on_status:
+            self.on_status(message)
+
+    def _send(self, messages) -> str:
+        """发送一个汇总请求并返回文本内容"""
+        return extract_response_content(self.ai_service.send_message(messages))
+
+    def _send_final(self, messages) -> str:
+        """发送最后一个汇总请求，设置了on_partial_text时流式返回"""
+        if self.on_partial_text is None:
+            return self._send(messages)
+        return stream_response_content(self.ai_service, messages, self.on_partial_text)
+
+    def _send_all(self, message_groups: List[list]) -> List[str]:
+        """并发发送同一层的汇总请求，结果按组顺序返回"""
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            return list(executor.map(self._send, message_groups))
+
+    def _group(self, items: List[str]) -> List[List[str]]:
+        """按fan_out把条目分组"""
+        return [items[i:i + self.fan_out] for i in range(0, len(items), self.fan_out)]
+
+    def reduce_summaries(self, formatted_items: List[str], statistics: str) -> str:
+        """分层生成汇总分析
+
+        条目数不超过fan_out时直接汇总；否则先把每fan_out个文件汇总为一份部分分析，
+        再逐层把每fan_out份部分分析合并，直到只剩一次合并请求，
+        每个请求的大小都受fan_out限制
+
+        Args:
+            formatted_items: 各文件的分析要点
+            statistics: 本地计算的全部文件的统计信息
+        """
+        if len(formatted_items) <= self.fan_out:
+            return self._send_final(build_summary_messages(self.instruction, formatted_items, statistics))
+
+        groups = self._group(formatted_items)
+        self._emit_status(f"正在分组汇总：共 {len(groups)} 组，每组最多 {self.fan_out} 个文件")
+        self.logger.info(f"分层汇总第1层: {len(formatted_items)} 个文件分为 {len(groups)} 组")
+        partials = self._send_all([build_summary_messages(self.instruction, group, statistics) for group in groups])
+
+        level = 2
+        while len(partials) > self.fan_out:
+            groups = self._group(partials)
+            self._emit_status(f"正在合并第 {level} 层汇总：共 {len(groups)} 组")
+            self.logger.info(f"分层汇总第{level}层: {len(partials)} 份部分汇总分为 {len(groups)} 组")
+            partials = self._send_all([build_summary_merge_messages(self.instruction, group, statistics) for group in groups])
+            level += 1
+
+        self._emit_status(f"正在合并 {len(partials)} 份部分汇总")
+        return self._send_final(build_summary_merge_messages(self.instruction, partials, statistics))
+
+    def _normalize(self, item) -> Optional[Dict]:
+        """把一条分析结果整理为 {"global_index", "filename", "analysis"}，内容为空时返回None
+
+        支持(file_path, content)元组，以及带analysis_result或content字段的字典
+        """
+        if isinstance(item, tuple) and len(item) == 2:
+            file_path, content = item
+            item = {"file_path": file_path, "filename": os.path.basename(file_path), "content": content}
+
+        filename = item.get("filename", "")
+        analysis = item.get("analysis_result") or item.get("content", "")
+        if not filename or not analysis:
+            self.logger.warning(f"文件 {filename or item.get('file_path', '')} 的分析结果为空，已跳过")
+            return None
+        return {"global_index": item.get("global_index", "N/A"), "filename": filename, "analysis": analysis}
+
+    def build_report(self, results: List) -> str:
+        """生成完整的汇总报告
+
+        Args:
+            results: 各文件的分析结果
+
+        Returns:
+            str: Markdown格式的汇总报告，包括汇总表格、统计信息和汇总分析
+        """
+        summary_content = [item for item in map(self._normalize, results) if item is not None]
+        if not summary_content:
+            self.logger.error("没有有效的汇总内容可用")
+            raise ValueError("没有有效的汇总内容")
+        self.logger.info(f"成功处理的文件数量: {len(summary_content)}")
+
+        # 从各文件的分析结果中提取结构化字段，表格和统计信息在本地生成
+        records = sort_fields([
+            extract_analysis_fields(item["analysis"], item["global_index"], os.path.splitext(item["filename"])[0])
+            for item in summary_content
+        ])
+        table = build_summary_table(records)
+        statistics = format_statistics(compute_statistics(records))
+
+        # 只把分析要点交给AI服务撰写汇总分析
+        formatted_content = [
+            f"文件 {fields.global_index}：\n"
+            f"- 标题: {fields.title}\n"
+            f"- 实现类型: {fields.implementation_type}\n"
+            f"- 代码开源: {'是' if fields.open_source else '否'}\n"
+            f"- 判断依据: {fields.evidence or '无'}\n"
+            f"---\n"
+            for fields in records
+        ]
+
+        header = (
+            "# 论文分析汇总报告\n\n"
+            f"- 生成时间：{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
+            f"- 分析文件数：{len(summary_content)}\n"
+            "- 说明：使用全局唯一的文件编号(global_index)作为序号\n\n"
+            "---\n\n"
+        )
+        preamble = (
+            f"{header}"
+            f"## 1. 汇总表格\n\n{table}\n\n"
+            f"## 2. 统计信息\n\n{statistics}\n\n"
+            f"## 3. 汇总分析\n\n"
+        )
+        # 表格和统计信息在本地生成，先交给预览显示
+        if self.on_partial_text is not None:
+            self.on_partial_text(preamble)
+
+        # 发送到AI服务，文件较多时分层汇总
+        self._emit_status("正在生成汇总分析...")
+        self.logger.info("正在发送到AI服务进行汇总...")
+        narrative = self.reduce_summaries(formatted_content, statistics)
+
+        report = f"{preamble}{narrative}\n"
+        self.logger.info(f"汇总报告已生成，长度: {len(report)}")
+        return report
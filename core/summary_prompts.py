@@ -0,0 +1,61 @@
+"""
+汇总报告提示词
+构建汇总分析（叙述部分）的分组和合并消息
+汇总表格和统计信息由core.summary_table在本地生成，不再交给模型计算
+"""
+from typing import List
+from services.message_types import Message
+
+# 汇总的系统提示词
+SUMMARY_SYSTEM_PROMPT = "你是一个专业的论文分析助手。请基于给出的各论文实现类型判断和统计信息撰写汇总分析，结论必须基于分析结果中的具体证据。"
+
+# 汇总分析的格式要求
+SUMMARY_FORMAT = """汇总表格和统计信息已根据各文件的分析结果在本地生成，请不要输出表格，也不要重新计算统计数字。
+请撰写汇总分析，包括：
+1. 整体结论：结合统计信息说明各实现类型的分布情况
+2. 主要依据：归纳判断实现类型时最常见的证据
+3. 需要关注的论文：类型为"未知"或判断依据不充分的论文（使用序号引用）及原因"""
+
+
+def build_summary_messages(instruction: str, formatted_items: List[str], statistics: str) -> List[Message]:
+    """构建一组文件的汇总分析消息"""
+    content = f"""
+{instruction}
+
+{SUMMARY_FORMAT}
+
+全部论文的统计信息：
+{statistics}
+
+各文件的分析要点如下：
+
+
+{chr(10).join(formatted_items)}"""
+    return [
+        Message(role="system", content=SUMMARY_SYSTEM_PROMPT),
+        Message(role="user", content=content)
+    ]
+
+
+def build_summary_merge_messages(instruction: str, partial_summaries: List[str], statistics: str) -> List[Message]:
+    """构建多个部分汇总分析的合并消息"""
+    parts = ''.join(
+        f'第{i + 1}组汇总分析：\n{summary}\n\n---\n\n' for i, summary in enumerate(partial_summaries)
+    )
+    content = f"""
+{instruction}
+
+以下是{len(partial_summaries)}组论文的部分汇总分析，请合并为一份完整的汇总分析，保留各组提到的需要关注的论文。
+
+{SUMMARY_FORMAT}
+
+全部论文的统计信息：
+{statistics}
+
+各组汇总分析如下：
+
+{parts}"""
+    return [
+        Message(role="system", content=SUMMARY_SYSTEM_PROMPT),
+        Message(role="user", content=content)
+    ]
@@ -0,0 +1,124 @@
+"""
+汇总表格
+从各文件的分析结果中提取结构化字段，在本地生成汇总表格和统计信息
+"""
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+# 实现类型的取值
+IMPLEMENTATION_TYPES = ("official", "unofficial", "未知")
+# 表格中判断依据的最大长度
+MAX_EVIDENCE_LENGTH = 80
+
+# 字段名后可能带有Markdown加粗和中英文冒号，如"- **实现类型**："
+_FIELD_PREFIX = r'{name}\s*\**\s*[:：]\s*\**\s*\[?\s*'
+_IMPLEMENTATION_PATTERN = re.compile(
+    _FIELD_PREFIX.format(name='实现类型') + r'(unofficial|official|未知)', re.IGNORECASE)
+_OPEN_SOURCE_PATTERN = re.compile(_FIELD_PREFIX.format(name='代码开源') + r'(是|否)')
+_CODE_LINK_PATTERN = re.compile(_FIELD_PREFIX.format(name='代码链接') + r'[^\n]*?(https?://[^\s)\]>，。|]+)')
+_TITLE_PATTERN = re.compile(_FIELD_PREFIX.format(name='标题') + r'([^\n\]]+)')
+_EVIDENCE_PATTERN = re.compile(
+    _FIELD_PREFIX.format(name='判断依据') + r'(.*?)(?=\n\s*[-*]?\s*\**\s*(?:代码开源|代码链接|实现类型)|\n\s*\d+\.\s|\Z)',
+    re.DOTALL
+)
+
+
+@dataclass
+class AnalysisFields:
+    """单个文件分析结果中的结构化字段"""
+    global_index: Any
+    title: str
+    implementation_type: str
+    evidence: str
+    open_source: bool
+    code_link: Optional[str] = None
+
+
+def extract_analysis_fields(analysis: str, global_index: Any = None, default_title: str = "") -> AnalysisFields:
+    """从最终分析报告中提取结构化字段
+
+    报告格式见core.analysis_prompts.build_final_analysis_messages，
+    缺失的字段使用默认值：实现类型为"未知"，有代码链接时视为开源
+    """
+    match = _IMPLEMENTATION_PATTERN.search(analysis)
+    implementation_type = match.group(1).lower() if match else "未知"
+
+    match = _CODE_LINK_PATTERN.search(analysis)
+    code_link = match.group(1).rstrip('.,;') if match else None
+
+    match = _OPEN_SOURCE_PATTERN.search(analysis)
+    open_source = match.group(1) == "是" if match else code_link is not None
+
+    match = _TITLE_PATTERN.search(analysis)
+    title = match.group(1).strip().strip('*') if match else ""
+    if not title or title.startswith("从PDF"):
+        title = default_title
+
+    match = _EVIDENCE_PATTERN.search(analysis)
+    evidence = " ".join(match.group(1).split()) if match else ""
+
+    return AnalysisFields(global_index, title, implementation_type, evidence, open_source, code_link)
+
+
+def _sort_key(fields: AnalysisFields) -> tuple:
+    """按global_index数值排序，无法转换为数字的排在最后"""
+    try:
+        return 0, int(fields.global_index), ""
+    except (TypeError, ValueError):
+        return 1, 0, str(fields.global_index)
+
+
+def sort_fields(records: List[AnalysisFields]) -> List[AnalysisFields]:
+    """按global_index排序"""
+    return sorted(records, key=_sort_key)
+
+
+def _cell(text: str) -> str:
+    """转义表格单元格中的竖线和换行"""
+    return " ".join(str(text).split()).replace("|", "\\|")
+
+
+def _shorten(text: str, limit: int = MAX_EVIDENCE_LENGTH) -> str:
+    return text if len(text) <= limit else text[:limit - 1] + "…"
+
+
+def build_summary_table(records: List[AnalysisFields]) -> str:
+    """生成Markdown汇总表格，每个文件一行"""
+    lines = [
+        "| 序号 | 论文标题 | 实现类型 | 判断依据 | 代码开源 | 代码链接 |",
+        "|------|---------|----------|----------|----------|----------|"
+    ]
+    for fields in sort_fields(records):
+        lines.append(
+            f"| {_cell(fields.global_index)} | {_cell(fields.title)} | {fields.implementation_type} | "
+            f"{_cell(_shorten(fields.evidence)) or '-'} | {'是' if fields.open_source else '否'} | "
+            f"{_cell(fields.code_link) if fields.code_link else '-'} |"
+        )
+    return "\n".join(lines)
+
+
+def compute_statistics(records: List[AnalysisFields]) -> Dict[str, int]:
+    """统计各实现类型和代码开源的数量"""
+    stats = {"total": len(records), "open_source": 0}
+    stats.update({implementation_type: 0 for implementation_type in IMPLEMENTATION_TYPES})
+    for fields in records:
+        stats[fields.implementation_type] += 1
+        stats["open_source"] += fields.open_source
+    return stats
+
+
+def format_statistics(stats: Dict[str, int]) -> str:
+    """把统计结果格式化为Markdown列表"""
+    total = stats["total"]
+
+    def ratio(count: int) -> str:
+        return f"{count / total:.1%}" if total else "0.0%"
+
+    return "\n".join([
+        f"- 分析论文总数：{total}",
+        f"- 官方实现（official）：{stats['official']}（{ratio(stats['official'])}）",
+        f"- 非官方实现（unofficial）：{stats['unofficial']}（{ratio(stats['unofficial'])}）",
+        f"- 未知类型：{stats['未知']}（{ratio(stats['未知'])}）",
+        f"- 代码开源：{stats['open_source']}（{ratio(stats['open_source'])}）",
+    ])
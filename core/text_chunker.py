@@ -0,0 +1,88 @@
+"""
+文本分块
+"""
+import re
+from dataclasses import dataclass
+from typing import Callable, Iterable, Iterator, List
+
+# 中文字符（CJK统一表意文字基本区）
+_CHINESE_CHAR_PATTERN = re.compile('[\u4e00-\u9fff]')
+
+
+def estimate_tokens(text: str) -> int:
+    """估算文本的token数量（粗略估算）"""
+    # 英文单词数（按空格分割）
+    words = len(text.split())
+    # 中文字符数
+    chinese = len(_CHINESE_CHAR_PATTERN.findall(text))
+    # 估算token数（英文单词约1.3倍，中文字符约2倍）
+    return int(words * 1.3 + chinese * 2)
+
+
+@dataclass
+class TextChunk:
+    """文本块及其在PDF中的页码范围（从1开始，包含两端）"""
+    text: str
+    start_page: int
+    end_page: int
+
+    @property
+    def page_range(self) -> str:
+        """页码范围描述，如 3 或 3-5"""
+        if self.start_page == self.end_page:
+            return str(self.start_page)
+        return f"{self.start_page}-{self.end_page}"
+
+
+def iter_page_chunks(pages: Iterable[str], max_tokens: int,
+                     count_tokens: Callable[[str], int] = estimate_tokens) -> Iterator[TextChunk]:
+    """逐页消费文本并在块填满时立即产出
+
+    不会拼接完整文档，内存中只保留当前页和当前块。
+    段落按空行分割，页边界也视为段落边界；超过限制的段落再按句子分割。
+
+    Args:
+        pages: 逐页文本，可以是惰性生成器
+        max_tokens: 每个块的最大token数
+        count_tokens: token计数函数，带count_batch方法时（如TokenCounter）按页批量计数
+
+    Yields:
+        TextChunk: 文本块
+    """
+    count_batch = getattr(count_tokens, "count_batch", None) \
+        or (lambda texts: [count_tokens(t) for t in texts])
+
+    parts: List[str] = []
+    current_tokens = 0
+    start_page = end_page = 1
+
+    for page_number, page_text in enumerate(pages, 1):
+        # 每页的段落一次性计数
+        paragraphs = [paragraph.strip() for paragraph in page_text.split('\n\n')]
+        paragraphs = [paragraph for paragraph in paragraphs if paragraph]
+
+        for paragraph, paragraph_tokens in zip(paragraphs, count_batch(paragraphs)):
+            # 如果单个段落就超过限制，按句子分割
+            if paragraph_tokens > max_tokens:
+                sentences = [sentence.strip() for sentence in paragraph.split('. ')]
+                sentences = [sentence for sentence in sentences if sentence]
+                pieces = [(sentence + '. ', tokens) for sentence, tokens in
+                          zip(sentences, count_batch(sentences))]
+            else:
+                pieces = [(paragraph + '\n\n', paragraph_tokens)]
+
+            for piece, piece_tokens in pieces:
+                if parts and current_tokens + piece_tokens > max_tokens:
+                    yield TextChunk(''.join(parts).strip(), start_page, end_page)
+                    parts = []
+                    current_tokens = 0
+                if not parts:
+                    start_page = page_number
+                parts.append(piece)
+                current_tokens += piece_tokens
+                end_page = page_number
+
+    # 最后一个块
+    if parts:
+        yield TextChunk(''.join(parts).strip(), start_page, end_page)
+
@@ -0,0 +1,120 @@
+"""
+Token计数
+基于tiktoken的BPE编码精确计数，按模型懒加载并缓存；
+未安装tiktoken或编码加载失败时退回到estimate_tokens估算
+"""
+import functools
+from typing import Any, Dict, List, Optional, Tuple
+from core.text_chunker import estimate_tokens
+from utils.logger import Logger
+
+# 未在配置中声明上下文窗口时使用的分块大小
+DEFAULT_MAX_CHUNK_TOKENS = 10000
+# 为系统提示词和分析指令预留的token数
+PROMPT_RESERVED_TOKENS = 1000
+# 模型不在tiktoken内置映射中时使用的编码
+DEFAULT_ENCODING = "cl100k_base"
+
+
+class TokenCounter:
+    """Token计数器
+
+    可以直接作为count_tokens函数调用，也可以通过count_batch一次计算多段文本
+    """
+
+    def __init__(self, model: Optional[str] = None, encoding_name: Optional[str] = None):
+        """初始化计数器
+
+        Args:
+            model: 模型名称，用于选择tiktoken编码
+            encoding_name: 指定编码名称，优先于model
+        """
+        self.model = model
+        self.encoding_name = encoding_name
+        self.logger = Logger.create_logger('tokenizer')
+        self._encoding = None
+        self._loaded = False
+
+    def _get_encoding(self):
+        """首次使用时加载编码，加载失败时返回None"""
+        if self._loaded:
+            return self._encoding
+        self._loaded = True
+        try:
+            import tiktoken
+        except ImportError:
+            self.logger.warning("未安装tiktoken，使用估算的token数进行分块")
+            return None
+
+        try:
+            if self.encoding_name:
+                self._encoding = tiktoken.get_encoding(self.encoding_name)
+            else:
+                try:
+                    self._encoding = tiktoken.encoding_for_model(self.model or "")
+                except KeyError:
+                    self._encoding = tiktoken.get_encoding(DEFAULT_ENCODING)
+        except Exception as e:
+            self.logger.warning(f"加载tiktoken编码失败，使用估算的token数: {str(e)}")
+            self._encoding = None
+        return self._encoding
+
+    @property
+    def exact(self) -> bool:
+        """是否为精确计数"""
+        return self._get_encoding() is not None
+
+    def count(self, text: str) -> int:
+        """计算单段文本的token数"""
+        encoding = self._get_encoding()
+        if encoding is None:
+            return estimate_tokens(text)
+        return len(encoding.encode_ordinary(text))
+
+    def count_batch(self, texts: List[str]) -> List[int]:
+        """批量计算多段文本的token数，tiktoken在多线程中并行编码"""
+        encoding = self._get_encoding()
+        if encoding is None:
+            return [estimate_tokens(text) for text in texts]
+        return [len(tokens) for tokens in encoding.encode_ordinary_batch(texts)]
+
+    def __call__(self, text: str) -> int:
+        return self.count(text)
+
+
+@functools.lru_cache(maxsize=None)
+def get_token_counter(model: Optional[str] = None, encoding_name: Optional[str] = None) -> TokenCounter:
+    """获取模型对应的计数器，相同模型共享同一个实例"""
+    return TokenCounter(model, encoding_name)
+
+
+def max_chunk_tokens_for(model_config: Dict[str, Any], default: int = DEFAULT_MAX_CHUNK_TOKENS) -> int:
+    """根据模型的上下文窗口计算每个分块的最大token数
+
+    分块大小 = context_window - max_tokens(响应) - 提示词预留，至少为上下文窗口的1/4；
+    未配置context_window时返回default
+    """
+    context_window = model_config.get("context_window")
+    if not context_window:
+        return default
+    context_window = int(context_window)
+    budget = context_window - int(model_config.get("max_tokens", 0)) - PROMPT_RESERVED_TOKENS
+    return max(budget, context_window // 4)
+
+
+def chunking_for_service(ai_service, default: int = DEFAULT_MAX_CHUNK_TOKENS) -> Tuple[TokenCounter, int]:
+    """获取AI服务当前模型的计数器和分块大小
+
+    Returns:
+        Tuple[TokenCounter, int]: (计数器, 每个分块的最大token数)
+    """
+    model = getattr(ai_service, "default_model", None)
+    try:
+        model_config = ai_service.get_model_config()
+    except (KeyError, AttributeError):
+        model_config = {}
+
+    # 去掉"openai/gpt-4"这类提供商前缀后再匹配tiktoken编码
+    model_name = model_config.get("internal_name", model) or ""
+    counter = get_token_counter(model_name.split("/")[-1], model_config.get("tokenizer"))
+    return counter, max_chunk_tokens_for(model_config, default)
@@ -1,5 +1,6 @@
 from PyQt6.QtWidgets import QFrame, QVBoxLayout, QLabel, QTextEdit
 from PyQt6.QtCore import Qt
+from PyQt6.QtGui import QTextCursor
 
 class AnalysisResultWindow(QFrame):
     """分析结果窗口"""
@@ -12,8 +13,8 @@ class AnalysisResultWindow(QFrame):
         layout = QVBoxLayout()
         
         # 文件名标签
-        name_label = QLabel(self.file_name)
-        name_label.setStyleSheet("""
+        self.name_label = QLabel(self.file_name)
+        self.name_label.setStyleSheet("""
             QLabel {
                 font-weight: bold;
                 color: #2c3e50;
@@ -24,7 +25,7 @@ class AnalysisResultWindow(QFrame):
                 margin-bottom: 8px;
             }
         """)
-        layout.addWidget(name_label)
+        layout.addWidget(self.name_label)
         
         # 分析结果显示区域
         self.result_display = QTextEdit()
@@ -57,4 +58,19 @@ class AnalysisResultWindow(QFrame):
                 padding: 12px;
                 box-shadow: 0 2px 4px rgba(0,0,0,0.1);
             }
-        """) 
\ No newline at end of file
+        """)
+
+    def set_title(self, file_name: str):
+        """更新标题"""
+        self.file_name = file_name
+        self.name_label.setText(file_name)
+
+    def append_text(self, text: str):
+        """在末尾追加流式返回的文本，已滚动到底部时保持跟随"""
+        scroll_bar = self.result_display.verticalScrollBar()
+        at_bottom = scroll_bar.value() >= scroll_bar.maximum()
+        cursor = self.result_display.textCursor()
+        cursor.movePosition(QTextCursor.MoveOperation.End)
+        cursor.insertText(text)
+        if at_bottom:
+            scroll_bar.setValue(scroll_bar.maximum())
@@ -2,20 +2,30 @@ import os
 from PyQt6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QTextEdit, 
                             QPushButton, QLabel, QFileDialog, QProgressBar,
                             QMessageBox, QSplitter, QFrame, QScrollArea, QComboBox,
-                            QDialog, QListWidget, QListWidgetItem, QGroupBox, QGraphicsEffect)
+                            QDialog, QListWidget, QListWidgetItem, QGroupBox, QGraphicsEffect,
+                            QCheckBox)
 from PyQt6.QtCore import Qt, QThread, pyqtSignal
-from PyQt6.QtGui import QFont
+from PyQt6.QtGui import QFont, QTextCursor
 from utils.logger import Logger
 from services.openai_service import OpenAIService
 from services.grok_service import GrokService
 from services.deepseek_service import DeepseekService
+from services.service_router import ServiceRouter, create_service_router
+from services.load_balancer import LoadBalancer, create_load_balancer
 from utils.prompt_manager import PromptManager
 from utils.config_manager import ConfigManager
 from datetime import datetime
 from forms.analysis_result_window import AnalysisResultWindow
-from threads.analysis_thread import AnalysisThread
+from threads.analysis_scheduler import AnalysisScheduler
+from threads.async_analysis_thread import AsyncAnalysisThread
 from threads.summary_thread import SummaryThread
-from utils.file_index_manager import FileIndexManager
+from threads.directory_watcher import DirectoryWatcher
+from utils.file_index_manager import create_file_index_manager
+from utils.pdf_text_cache import PdfTextCache
+from utils.job_journal import JobJournal
+from utils.content_hash import link_duplicates, expand_duplicate_results
+from core.result_writer import save_analysis_result
+from core.analysis_prompts import analysis_job_keys
 from widgets.file_selection_dialog import FileSelectionDialog
 
 
@@ -34,17 +44,34 @@ class ArticleForm(QWidget):
             self.prompt_manager = PromptManager()
             
             # 初始化文件索引管理器
-            self.file_index_manager = FileIndexManager(self.logger)
+            self.file_index_manager = create_file_index_manager(self.logger)
             self.current_directory = None
             self.file_index = None
             
             # 添加停止分析的标志
             self.is_analyzing = False
-            self.analysis_threads = []
+            
+            # 分析任务调度器，限制同时运行的分析线程数
+            self.analysis_scheduler = AnalysisScheduler(parent=self)
+            self.analysis_scheduler.analysis_completed.connect(self.handle_analysis_result)
+            self.analysis_scheduler.error_occurred.connect(self.handle_analysis_error)
+            self.analysis_scheduler.status_updated.connect(self.update_status)
+            self.analysis_scheduler.partial_result.connect(self.handle_partial_result)
+            self.async_analysis_thread = None
+            # 已取消、仍在结束在途请求的线程
+            self.stopping_threads = set()
             self.selected_files = []  # 存储选中的文件列表
             
+            # 目录监视器，新增或变化的PDF写入完成后自动提交分析
+            self.directory_watcher = DirectoryWatcher(self.file_index_manager, parent=self)
+            self.directory_watcher.files_ready.connect(self.handle_watched_files)
+            self.watched_in_flight = set()  # 监视模式提交、尚未完成的文件
+            self.analysis_total = 0  # 本轮需要分析的文件数
+            self.duplicate_links = {}  # 规范文件路径 -> 内容相同、共用其分析结果的文件路径
+            
             # 存储分析结果
             self.analysis_results = {}  # 用于存储分析结果
+            self.streaming_windows = {}  # 文件路径 -> 正在流式显示最终分析的结果窗口
             
             # 添加提示词更改标志
             self.has_unsaved_analysis_changes = False
@@ -81,8 +108,10 @@ class ArticleForm(QWidget):
                 if not self.ai_services:
                     raise RuntimeError("没有可用的AI服务")
 
-                # self.current_service = next(iter(self.ai_services.keys()))  # 使用第一个可用的服务
-                self.current_service = "Grok"
+                # 默认使用故障转移顺序中第一个可用的服务，未配置时使用Grok
+                self.current_service = self._default_service_name()
+                # 服务名 -> 以该服务为主服务的路由，保留各服务的延迟统计
+                self.service_routers = {}
 
                 self.logger.info(f"默认使用服务: {self.current_service}")
                 
@@ -375,6 +404,12 @@ class ArticleForm(QWidget):
         
         button_layout.addWidget(select_dir_btn)
         button_layout.addWidget(select_files_btn)
+        
+        # 监视目录开关，选择目录后可用
+        self.watch_checkbox = QCheckBox("监视目录并自动分析新文件")
+        self.watch_checkbox.setEnabled(False)
+        self.watch_checkbox.toggled.connect(self.toggle_directory_watch)
+        button_layout.addWidget(self.watch_checkbox)
         button_layout.addStretch()
         file_selection_layout.addLayout(button_layout)
         
@@ -726,6 +761,8 @@ class ArticleForm(QWidget):
         """处理Provider选择变化"""
         try:
             service = self.ai_services[self.current_service]
+            # 负载均衡的后端随所选提供商和模型变化，下次分析时重新创建路由
+            self.service_routers.pop(self.current_service, None)
             if hasattr(service, 'set_provider'):
                 service.set_provider(provider_name)
                 self.update_status(f"Switching to provider: {provider_name}")
@@ -746,6 +783,7 @@ class ArticleForm(QWidget):
             self.update_status(f"Switching to model: {model_name}")
             # 更新当前服务使用的模型
             self.ai_services[self.current_service].model = model_name
+            self.service_routers.pop(self.current_service, None)
             self.update_status("Ready")
         except Exception as e:
             self.logger.error(f"Failed to switch model: {str(e)}")
@@ -792,6 +830,23 @@ class ArticleForm(QWidget):
                 self.current_directory = dir_path
                 self.file_index = self.file_index_manager.generate_index(dir_path)
                 
+                # PDF文本缓存与file_index.json保存在同一目录
+                analysis_config = ConfigManager().get_config().get("analysis", {})
+                if analysis_config.get("cache_pdf_text", True):
+                    self.analysis_scheduler.text_cache = PdfTextCache(dir_path, self.logger)
+                else:
+                    self.analysis_scheduler.text_cache = None
+                # 任务日志记录已完成的文件和文本块，重新开始分析时从中断处继续
+                if analysis_config.get("journal", True):
+                    self.analysis_scheduler.journal = JobJournal(dir_path, self.logger)
+                else:
+                    self.analysis_scheduler.journal = None
+                
+                # 正在监视时切换到新目录
+                self.watch_checkbox.setEnabled(True)
+                if self.watch_checkbox.isChecked():
+                    self.directory_watcher.start(dir_path)
+                
                 # 清除旧的选择状态
                 self.selected_files = []
                 self.selected_files_display.setText(dir_path)
@@ -815,9 +870,84 @@ class ArticleForm(QWidget):
                 self.logger.error(f"处理目录时发生错误: {str(e)}")
                 QMessageBox.critical(self, "错误", f"处理目录时发生错误: {str(e)}")
     
+    def toggle_directory_watch(self, checked: bool):
+        """开启或关闭目录监视"""
+        if checked and self.current_directory:
+            self.directory_watcher.start(self.current_directory)
+            self.update_status(f"正在监视目录: {self.current_directory}")
+        else:
+            self.directory_watcher.stop()
+            self.update_status("已停止监视目录")
+
+    def handle_watched_files(self, file_paths: list):
+        """监视到新增或变化的PDF文件，提交到分析调度器"""
+        try:
+            instruction = self.analysis_instruction.toPlainText().strip()
+            if not instruction:
+                instruction = self.prompt_manager.get_prompt('analysis') or ""
+            if not instruction:
+                self.logger.warning("分析指令为空，跳过自动分析")
+                return
+            
+            # 监视器已把新文件写入索引
+            self.file_index = self.file_index_manager.load_index(self.current_directory)
+            
+            submitted = []
+            for file_path in file_paths:
+                file_info = self.file_index["files"].get(self._index_key(file_path))
+                if file_info is None:
+                    continue
+                if file_path in self.watched_in_flight:
+                    self.logger.info(f"文件正在分析中，跳过本次变化: {file_path}")
+                    continue
+                if file_info.get("duplicate_of"):
+                    self.logger.info(f"文件与 {file_info['duplicate_of']} 内容相同，跳过自动分析: {file_path}")
+                    continue
+                if file_info.get('size', 0) / (1024 * 1024) > 30:
+                    self.logger.warning(f"文件大于30MB，跳过自动分析: {file_path}")
+                    continue
+                
+                if file_path not in self.selected_files:
+                    self.selected_files.append(file_path)
+                # 文件变化后重新分析，旧结果作废
+                if self.analysis_results.pop(file_path, None) is None:
+                    self.analysis_total += 1
+                self.watched_in_flight.add(file_path)
+                self.analysis_scheduler.submit(
+                    file_path,
+                    file_info["index"],
+                    self._routed_service(),
+                    instruction
+                )
+                submitted.append(file_path)
+            
+            if not submitted:
+                return
+            
+            self.update_selected_files_display()
+            self.progress_bar.setMaximum(self.analysis_total)
+            self.progress_bar.setValue(len(self.analysis_results))
+            self.progress_bar.setVisible(True)
+            self.analysis_count_label.setText(f"{len(self.analysis_results)}/{self.analysis_total}")
+            self.is_analyzing = True
+            self.start_button.setEnabled(False)
+            self.stop_button.setEnabled(True)
+            self.summary_button.setEnabled(False)
+            
+            self.logger.info(f"自动分析 {len(submitted)} 个新增或变化的PDF文件")
+            self.update_status(f"发现 {len(submitted)} 个新文件，已加入分析队列")
+            
+        except Exception as e:
+            self.logger.error(f"处理监视到的文件时发生错误: {str(e)}")
+
+    def _index_key(self, file_path: str) -> str:
+        """文件在索引中的键：相对当前目录的路径，以/分隔"""
+        return os.path.relpath(file_path, self.current_directory).replace(os.sep, '/')
+
     def _clear_analysis_state(self):
         """清除分析相关的状态"""
         self.analysis_results.clear()
+        self.streaming_windows.clear()
         for i in reversed(range(self.result_layout.count())): 
             widget = self.result_layout.itemAt(i).widget()
             if widget is not None:
@@ -830,22 +960,28 @@ class ArticleForm(QWidget):
     def handle_analysis_result(self, file_path: str, result: str):
         """处理分析结果"""
         try:
+            self.watched_in_flight.discard(file_path)
+            
             # 更新文件的分析状态
-            filename = os.path.basename(file_path)
-            self.file_index_manager.update_analysis_status(self.current_directory, filename)
+            self.file_index_manager.update_analysis_status(self.current_directory, self._index_key(file_path))
+            self._share_with_duplicates(file_path, result)
             
             # 保存结果
             self.analysis_results[file_path] = result
             self.logger.info(f"File analysis completed: {file_path}")
 
-            # 显示结果
-            result_window = AnalysisResultWindow(file_path)
+            # 显示结果，流式显示过的窗口替换为完整结果
+            result_window = self.streaming_windows.pop(file_path, None)
+            if result_window is None:
+                result_window = AnalysisResultWindow(self._result_title(file_path))
+                self.result_layout.addWidget(result_window)
+            else:
+                result_window.set_title(self._result_title(file_path))
             result_window.result_display.setText(result)
-            self.result_layout.addWidget(result_window)
 
             # 更新进度条和计数
             current = len(self.analysis_results)
-            total = len(self.selected_files)
+            total = self.analysis_total
             self.progress_bar.setValue(current)
             self.analysis_count_label.setText(f"{current}/{total}")
             
@@ -858,6 +994,15 @@ class ArticleForm(QWidget):
                 self.progress_bar.setVisible(False)
                 self.update_status("所有文件分析完成")
                 self.logger.info("所有文件分析完成")
+                response_cache = getattr(self.ai_services[self.current_service], "response_cache", None)
+                if response_cache is not None:
+                    self.logger.info(f"响应缓存统计: {response_cache.stats()}")
+                router = self.service_routers.get(self.current_service)
+                if isinstance(router, ServiceRouter):
+                    self.logger.info(f"服务路由统计: {router.stats()}")
+                    router = router.primary
+                if isinstance(router, LoadBalancer):
+                    self.logger.info(f"负载均衡统计: {router.stats()}")
                 
                 # 启用汇总按钮，禁用其他按钮
                 self.summary_button.setEnabled(True)
@@ -879,11 +1024,68 @@ class ArticleForm(QWidget):
             self.logger.error(f"处理分析结果时发生错误: {str(e)}")
             self.handle_analysis_error(file_path, str(e))
 
+    def _default_service_name(self) -> str:
+        """按配置routing.failover的顺序选择第一个已初始化的服务，未配置时优先使用Grok"""
+        by_name = {service.service_name: name for name, service in self.ai_services.items()}
+        failover = ConfigManager().get_config().get("routing", {}).get("failover", [])
+        for service_name in failover:
+            if service_name in by_name:
+                return by_name[service_name]
+        if "Grok" in self.ai_services:
+            return "Grok"
+        return next(iter(self.ai_services))
+
+    def _routed_service(self):
+        """当前服务的路由：开启负载均衡时在该服务已启用的提供商之间分发请求，
+        失败时按routing.failover切换到其他服务，可选对冲请求"""
+        router = self.service_routers.get(self.current_service)
+        if router is None:
+            primary = create_load_balancer(self.ai_services[self.current_service])
+            router = create_service_router(primary, self.ai_services.values())
+            self.service_routers[self.current_service] = router
+        return router
+
+    def _share_with_duplicates(self, file_path: str, result: str):
+        """内容相同的文件共用该结果：写入各自的结果文件并更新分析状态，下次不再排队"""
+        for linked_path in self.duplicate_links.get(file_path, []):
+            try:
+                save_analysis_result(linked_path, result)
+                self.file_index_manager.update_analysis_status(self.current_directory, self._index_key(linked_path))
+            except Exception as e:
+                self.logger.error(f"保存重复文件的分析结果失败 {linked_path}: {str(e)}")
+
+    def _result_title(self, file_path: str) -> str:
+        """结果窗口标题，内容相同的文件共用该结果"""
+        title = self._index_key(file_path)
+        duplicates = self.duplicate_links.get(file_path, [])
+        if duplicates:
+            title += f"（内容相同: {', '.join(self._index_key(path) for path in duplicates)}）"
+        return title
+
+    def handle_partial_result(self, file_path: str, text: str):
+        """流式显示最终分析，首段文本到达时创建结果窗口"""
+        result_window = self.streaming_windows.get(file_path)
+        if result_window is None:
+            result_window = AnalysisResultWindow(f"{self._result_title(file_path)}（生成中...）")
+            self.result_layout.addWidget(result_window)
+            self.streaming_windows[file_path] = result_window
+        result_window.append_text(text)
+
+    def _discard_streaming_windows(self, file_path: str = None):
+        """移除未完成的流式结果窗口，file_path为None时移除全部"""
+        paths = [file_path] if file_path is not None else list(self.streaming_windows)
+        for path in paths:
+            result_window = self.streaming_windows.pop(path, None)
+            if result_window is not None:
+                result_window.deleteLater()
+
     def handle_analysis_error(self, file_path: str, error: str):
         """处理分析错误"""
         try:
             self.logger.error(f"分析文件 {file_path} 时发生错误: {error}")
             self.update_status(f"分析文件 {file_path} 时发生错误")
+            self.watched_in_flight.discard(file_path)
+            self._discard_streaming_windows(file_path)
             
             # 更新进度条
             current = self.progress_bar.value() + 1
@@ -893,7 +1095,7 @@ class ArticleForm(QWidget):
             QMessageBox.warning(self, "错误", f"分析文件 {file_path} 时发生错误: {error}")
             
             # 检查是否所有文件都处理完成
-            if current == len(self.selected_files):
+            if current == self.analysis_total:
                 self.progress_bar.setVisible(False)
                 self.is_analyzing = False
                 self.start_button.setEnabled(True)
@@ -929,16 +1131,17 @@ class ArticleForm(QWidget):
             self.progress_bar.setVisible(True)
             self.progress_bar.setMaximum(0)  # 设置为循环进度条
             
-            # 准备汇总数据，添加完整的文件信息
+            # 准备汇总数据，添加完整的文件信息，内容相同的文件各占一个条目
             summary_data = []
-            for file_path, content in sorted(self.analysis_results.items()):
+            results = expand_duplicate_results(self.analysis_results, self.duplicate_links)
+            for file_path, content in sorted(results.items()):
                 filename = os.path.basename(file_path)
                 file_info = {
                     "file_path": file_path,
                     "directory": os.path.dirname(file_path),
                     "filename": filename,
                     "analysis_result": content,
-                    "global_index": self.file_index["files"][filename]["index"],
+                    "global_index": self.file_index["files"][self._index_key(file_path)]["index"],
                     "batch_index": len(summary_data) + 1
                 }
                 summary_data.append(file_info)
@@ -947,18 +1150,20 @@ class ArticleForm(QWidget):
             summary_id = datetime.now().strftime("%Y%m%d_%H%M%S")
             self.file_index_manager.update_summary_status(
                 self.current_directory,
-                [item["filename"] for item in summary_data],
+                [self._index_key(item["file_path"]) for item in summary_data],
                 summary_id
             )
             
             # 创建新的汇总线程
             self.summary_thread = SummaryThread(
                 summary_data,
-                self.ai_services[self.current_service],
+                self._routed_service(),
                 instruction
             )
             
-            # 连接信号
+            # 连接信号，汇总报告边生成边显示
+            self.summary_display.clear()
+            self.summary_thread.partial_text.connect(self.handle_summary_partial)
             self.summary_thread.completed.connect(self.handle_summary_result)
             self.summary_thread.error_occurred.connect(self.handle_summary_error)
             self.summary_thread.status_updated.connect(self.update_status)
@@ -1009,10 +1214,22 @@ class ArticleForm(QWidget):
                 self.summary_thread.deleteLater()
                 self.summary_thread = None
 
+    def handle_summary_partial(self, text: str):
+        """在汇总预览末尾追加流式返回的文本，已滚动到底部时保持跟随"""
+        scroll_bar = self.summary_display.verticalScrollBar()
+        at_bottom = scroll_bar.value() >= scroll_bar.maximum()
+        cursor = self.summary_display.textCursor()
+        cursor.movePosition(QTextCursor.MoveOperation.End)
+        cursor.insertText(text)
+        if at_bottom:
+            scroll_bar.setValue(scroll_bar.maximum())
+
     def handle_summary_error(self, error: str):
         """处理汇总错误"""
         self.logger.error(f"汇总报告生成失败: {error}")
         self.update_status("汇总报告生成失败")
+        # 不保留未完成的汇总报告，避免被当作完整报告保存
+        self.summary_display.clear()
         QMessageBox.warning(self, "错误", f"生成汇总报告时发生错误: {error}")
         
         # 清理线程
@@ -1271,13 +1488,15 @@ class ArticleForm(QWidget):
             # 获取目录下所有文件
             all_files = []
             for filename, file_info in self.file_index["files"].items():
-                file_path = os.path.join(self.current_directory, filename)
+                file_path = os.path.normpath(os.path.join(self.current_directory, filename))
                 try:
-                    # 获取文件大小（以MB为单位）
-                    file_size = os.path.getsize(file_path) / (1024 * 1024)
-                    file_info['size_mb'] = round(file_size, 2)
-                    file_info['file_path'] = file_path
-                    all_files.append(file_info)
+                    # 使用扫描目录时缓存的文件大小（以MB为单位），旧索引中没有时再读取
+                    file_size = file_info.get('size')
+                    if file_size is None:
+                        file_size = os.path.getsize(file_path)
+                    size_mb = round(file_size / (1024 * 1024), 2)
+                    # 只用于显示的字段放在副本中，不写回索引
+                    all_files.append({**file_info, 'size_mb': size_mb, 'file_path': file_path})
                 except Exception as e:
                     self.logger.error(f"获取文件{filename}大小时出错: {str(e)}")
                     continue
@@ -1298,7 +1517,7 @@ class ArticleForm(QWidget):
             
             # 添加文件信息
             for file_info in all_files:
-                filename = os.path.basename(file_info['file_path'])
+                filename = self._index_key(file_info['file_path'])
                 file_path = file_info['file_path']
                 
                 # 确定文件状态
@@ -1307,6 +1526,8 @@ class ArticleForm(QWidget):
                     status.append("⚠️超大文件")
                 if file_path in self.selected_files:
                     status.append("✅已选择")
+                if file_info.get("duplicate_of"):
+                    status.append(f"🔁与{file_info['duplicate_of']}内容相同")
                 status = ", ".join(status) if status else "未选择"
                 
                 # 格式化时间
@@ -1403,6 +1624,14 @@ class ArticleForm(QWidget):
                 QMessageBox.warning(self, "警告", "没有可分析的文件（所有选中的文件都超过30MB）")
                 return
             
+            # 内容相同的文件只分析规范文件（序号最小的一个），结果关联到其余文件
+            files_to_analyze, self.duplicate_links = link_duplicates(
+                self.current_directory, self.file_index["files"], files_to_analyze)
+            duplicate_count = sum(len(paths) for paths in self.duplicate_links.values())
+            if duplicate_count:
+                self.logger.info(f"跳过 {duplicate_count} 个内容重复的文件")
+            self.analysis_total = len(files_to_analyze)
+            
             # 清除旧的分析结果
             self.analysis_results.clear()
             
@@ -1427,24 +1656,30 @@ class ArticleForm(QWidget):
             self.start_button.setEnabled(False)
             self.stop_button.setEnabled(True)
             
-            # 创建并启动分析线程
-            self.analysis_threads.clear()
+            # 任务日志中已完成的文件直接恢复结果，不再提交
+            files_to_analyze = self._restore_journaled_results(files_to_analyze, instruction)
+            if not files_to_analyze:
+                return
             
-            # 按文件索引顺序排序文件
-            sorted_files = sorted(
-                files_to_analyze,
-                key=lambda x: self.file_index["files"][os.path.basename(x)]["index"]
-            )
+            # 配置为异步引擎时，所有文件在同一个事件循环中分析
+            analysis_config = ConfigManager().get_config().get("analysis", {})
+            if analysis_config.get("engine", "threads") == "async":
+                self._start_async_analysis(files_to_analyze, instruction, analysis_config)
+                return
             
-            for file_path in sorted_files:
-                thread = AnalysisThread(file_path, self.ai_services[self.current_service], instruction)
-                thread.analysis_completed.connect(self.handle_analysis_result)
-                thread.error_occurred.connect(self.handle_analysis_error)
-                thread.status_updated.connect(self.update_status)
-                self.analysis_threads.append(thread)
-                thread.start()
-            
-            self.logger.info(f"开始分析 {len(files_to_analyze)} 个PDF文件")
+            # 将文件提交到调度器，按文件索引顺序出队，并发数受配置限制
+            for file_path in files_to_analyze:
+                self.analysis_scheduler.submit(
+                    file_path,
+                    self.file_index["files"][self._index_key(file_path)]["index"],
+                    self._routed_service(),
+                    instruction
+                )
+            
+            self.logger.info(
+                f"开始分析 {len(files_to_analyze)} 个PDF文件，"
+                f"最大并发数: {self.analysis_scheduler.max_concurrent}"
+            )
             self.update_status(f"开始分析 {len(files_to_analyze)} 个PDF文件...")
             
         except Exception as e:
@@ -1455,6 +1690,59 @@ class ArticleForm(QWidget):
             self.stop_button.setEnabled(False)
             self.progress_bar.setVisible(False)
         
+    def _restore_journaled_results(self, files_to_analyze: list, instruction: str) -> list:
+        """从任务日志恢复已完成文件的分析结果，返回仍需分析的文件"""
+        journal = self.analysis_scheduler.journal
+        if journal is None:
+            return files_to_analyze
+        job = analysis_job_keys(self._routed_service(), instruction)
+        remaining = []
+        restored = []
+        for file_path in files_to_analyze:
+            content = journal.get_file(file_path, job)
+            if content is None:
+                remaining.append(file_path)
+            else:
+                restored.append((file_path, content))
+        if restored:
+            self.logger.info(f"从任务日志恢复 {len(restored)} 个已完成文件的分析结果")
+            for file_path, content in restored:
+                self.handle_analysis_result(file_path, content)
+        return remaining
+        
+    def _start_async_analysis(self, files_to_analyze: list, instruction: str, analysis_config: dict):
+        """使用异步分析引擎分析文件"""
+        self.async_analysis_thread = AsyncAnalysisThread(
+            files_to_analyze,
+            self._routed_service(),
+            instruction,
+            max_in_flight=analysis_config.get("max_in_flight_requests"),
+            chunk_concurrency=analysis_config.get("chunk_concurrency"),
+            text_cache=self.analysis_scheduler.text_cache,
+            extraction_workers=analysis_config.get("extraction_workers"),
+            journal=self.analysis_scheduler.journal
+        )
+        self.async_analysis_thread.analysis_completed.connect(self.handle_analysis_result)
+        self.async_analysis_thread.error_occurred.connect(self.handle_analysis_error)
+        self.async_analysis_thread.status_updated.connect(self.update_status)
+        self.async_analysis_thread.partial_result.connect(self.handle_partial_result)
+        self.async_analysis_thread.start()
+        
+        self.logger.info(f"使用异步引擎开始分析 {len(files_to_analyze)} 个PDF文件")
+        self.update_status(f"开始分析 {len(files_to_analyze)} 个PDF文件...")
+        
+    def _cancel_async_analysis(self):
+        """取消异步分析线程，线程结束前保留引用，结束后再释放"""
+        thread = self.async_analysis_thread
+        self.async_analysis_thread = None
+        thread.analysis_completed.disconnect(self.handle_analysis_result)
+        thread.error_occurred.disconnect(self.handle_analysis_error)
+        thread.status_updated.disconnect(self.update_status)
+        thread.cancel()
+        if thread.isRunning():
+            self.stopping_threads.add(thread)
+            thread.finished.connect(lambda t=thread: self.stopping_threads.discard(t))
+        
     def stop_analysis(self):
         """停止分析"""
         try:
@@ -1473,15 +1761,12 @@ class ArticleForm(QWidget):
             if reply == QMessageBox.StandardButton.Yes:
                 self.logger.info("用户确认停止分析")
                 
-                # 停止所有分析线程
-                for thread in self.analysis_threads:
-                    if thread.isRunning():
-                        self.logger.info(f"正在停止线程: {thread}")
-                        thread.terminate()
-                        thread.wait()
-                    
-                # 清理线程列表
-                self.analysis_threads.clear()
+                # 清空等待队列并取消所有分析线程，不等待在途请求
+                self.analysis_scheduler.stop()
+                self.watched_in_flight.clear()
+                self._discard_streaming_windows()
+                if self.async_analysis_thread is not None:
+                    self._cancel_async_analysis()
                 
                 # 更新UI状态
                 self.is_analyzing = False
@@ -1520,12 +1805,12 @@ class ArticleForm(QWidget):
             # 按文件索引排序
             sorted_files = sorted(
                 self.selected_files,
-                key=lambda x: self.file_index["files"][os.path.basename(x)]["index"]
+                key=lambda x: self.file_index["files"][self._index_key(x)]["index"]
             )
             
             # 生成显示文本
             for file_path in sorted_files:
-                filename = os.path.basename(file_path)
+                filename = self._index_key(file_path)
                 file_index = self.file_index["files"][filename]["index"]
                 analysis_count = self.file_index["files"][filename]["analysis_count"]
                 
@@ -1,8 +1,12 @@
+import asyncio
 import requests
 from abc import ABC, abstractmethod
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Callable, Optional, List, Iterator
+from core.analysis_prompts import extract_response_content
 from utils.config_manager import ConfigManager
 from .message_types import Message
+from .response_cache import get_response_cache
+from .retry_policy import get_retry_policy
 
 
 class AIService(ABC):
@@ -25,6 +29,12 @@ class AIService(ABC):
         self.base_url = self.provider_config.get("base_url", "")
         self.api_key = self.provider_config.get("api_key", "")
         self.default_model = self.config.get_default_model(self.service_name)
+        # 响应缓存，未启用时为None
+        self.response_cache = get_response_cache()
+        # 请求重试策略，由with_retry装饰器使用
+        self.retry_policy = get_retry_policy()
+        # 异步客户端绑定到事件循环，按事件循环分别保存，同一服务可同时在多个事件循环中使用
+        self._async_clients: Dict[Any, Any] = {}
     
     @abstractmethod
     def send_message(self, messages: List[Message], model: str = None, **kwargs) -> Dict[str, Any]:
@@ -40,6 +50,71 @@ class AIService(ABC):
         """
         pass
     
+    async def send_message_async(self, messages: List[Message], model: str = None, **kwargs) -> Any:
+        """异步发送消息到AI服务
+        
+        默认在线程池中调用同步的send_message，子类可覆盖为原生异步实现
+        
+        Args:
+            messages: 消息列表
+            model: 模型名称，如果为None则使用默认模型
+            **kwargs: 其他参数，如temperature、max_tokens等
+            
+        Returns:
+            Any: 与send_message相同格式的响应
+        """
+        if model is not None:
+            kwargs["model"] = model
+        return await asyncio.to_thread(self.send_message, messages, **kwargs)
+    
+    def _get_loop_client(self, create_client: Callable[[], Any]) -> Any:
+        """获取当前事件循环对应的异步客户端，首次调用时用create_client创建"""
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            client = self._async_clients[loop] = create_client()
+        return client
+    
+    async def aclose_async_clients(self):
+        """关闭在当前事件循环中创建的异步客户端，释放其连接池
+        
+        事件循环结束前由调用方调用，之后在该事件循环中的异步请求会重新创建客户端
+        """
+        client = self._async_clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            # httpx.AsyncClient为aclose()，AsyncOpenAI为close()
+            close = getattr(client, "aclose", None) or client.close
+            await close()
+    
+    def stream_message(self, messages: List[Message], model: str = None, **kwargs) -> Iterator[str]:
+        """流式发送消息，逐段返回回复文本
+        
+        默认不支持流式响应，完整回复作为一段返回；支持流式响应的子类覆盖此方法
+        
+        Args:
+            messages: 消息列表
+            model: 模型名称，如果为None则使用默认模型
+            **kwargs: 其他参数，如temperature、max_tokens等
+            
+        Yields:
+            str: 回复文本的增量片段
+        """
+        if model is not None:
+            kwargs["model"] = model
+        yield extract_response_content(self.send_message(messages, **kwargs))
+    
+    def _wrap_cached_content(self, content: str) -> Any:
+        """将缓存的响应文本还原为该服务send_message的返回格式
+        
+        默认返回与OpenAI响应兼容的字典，子类可按需覆盖
+        """
+        return {
+            "choices": [{
+                "message": {"role": "assistant", "content": content}
+            }],
+            "cached": True
+        }
+    
     def get_model_config(self, model_name: str = None) -> Dict[str, Any]:
         """获取模型配置
         
@@ -1,6 +1,11 @@
+import httpx
 from typing import List, Dict
 from .message_types import Message
 from .ai_service import AIService
+from .response_cache import cached_response
+from .retry_policy import with_retry
+from .rate_limiter import rate_limited
+from .http_session import create_async_client
 from .providers.base_provider import BaseProvider
 from .providers.deepseek_provider import DeepseekProvider
 from .providers.zhipu_provider import ZhipuProvider
@@ -61,6 +66,9 @@ class DeepseekService(AIService):
                 base_url=self.config.get('siliconflow_base_url', 'https://api.siliconflow.com/v1')
             )
 
+    @cached_response
+    @with_retry
+    @rate_limited
     def send_message(self, messages: List[Message]) -> Message:
         """发送消息到当前选择的提供商"""
         if not self.providers:
@@ -77,6 +85,38 @@ class DeepseekService(AIService):
             self.logger.error(f"Failed to send message: {str(e)}")
             raise
 
+    def _get_async_http_client(self) -> httpx.AsyncClient:
+        """获取当前事件循环对应的异步HTTP客户端"""
+        return self._get_loop_client(create_async_client)
+
+    @cached_response
+    @with_retry
+    @rate_limited
+    async def send_message_async(self, messages: List[Message], model: str = None, **kwargs) -> Message:
+        """异步发送消息到当前选择的提供商"""
+        if not self.providers:
+            raise Exception("No available Deepseek providers")
+            
+        if self.current_provider not in self.providers:
+            raise Exception(f"Provider {self.current_provider} not available")
+            
+        try:
+            provider = self.providers[self.current_provider]
+            return await provider.send_message_async(
+                messages,
+                model or self.default_model,
+                self._get_async_http_client(),
+                **kwargs
+            )
+            
+        except Exception as e:
+            self.logger.error(f"Failed to send message asynchronously: {str(e)}")
+            raise
+
+    def _wrap_cached_content(self, content: str) -> Message:
+        """缓存命中时返回与send_message相同的Message对象"""
+        return Message(role="assistant", content=content)
+
     def get_models(self) -> List[str]:
         """获取当前提供商支持的模型列表"""
         if not self.providers:
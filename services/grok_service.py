@@ -1,8 +1,12 @@
 import httpx
 import ssl
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI, DefaultHttpxClient, DefaultAsyncHttpxClient
 from services.message_types import Message
+from core.cancellation import AnalysisCancelled, close_on_cancel
 from services.ai_service import AIService
+from services.response_cache import cached_response, cached_stream
+from services.retry_policy import with_retry
+from services.rate_limiter import rate_limited, observe_response, observe_response_async
 from typing import List, Dict, Any, Generator, Union, Optional
 from utils.config_manager import ConfigManager
 from utils.logger import Logger
@@ -38,25 +42,29 @@ class GrokService(AIService):
         # 初始化OpenAI客户端
         client_kwargs = {
             "api_key": self.api_key,
-            "base_url": self.base_url
+            "base_url": self.base_url,
+            # 重试由with_retry统一处理，关闭SDK自带的重试，避免重试次数叠加
+            "max_retries": 0
         }
         
-        # 配置HTTP客户端
+        # 配置HTTP客户端，未使用代理时也创建客户端以挂载限流响应钩子
         http_client = self._configure_http_client(provider_config)
-        if http_client:
-            client_kwargs["http_client"] = http_client
+        client_kwargs["http_client"] = http_client or DefaultHttpxClient(
+            event_hooks={"response": [observe_response]})
         
         # Initialize OpenAI client with all prepared arguments
         self.client = OpenAI(**client_kwargs)
     
-    def _configure_http_client(self, provider_config: Dict[str, Any]) -> Optional[httpx.Client]:
+    def _configure_http_client(self, provider_config: Dict[str, Any],
+                               async_client: bool = False) -> Optional[Union[httpx.Client, httpx.AsyncClient]]:
         """配置HTTP客户端，处理代理设置
 
         Args:
             provider_config: 提供商配置
+            async_client: 是否创建httpx.AsyncClient
 
         Returns:
-            配置好的httpx.Client实例，如果不使用代理则返回None
+            配置好的httpx客户端实例，如果不使用代理则返回None
         """
         # 检查是否使用代理
         use_proxy = provider_config.get("use_proxy", False)
@@ -85,10 +93,13 @@ class GrokService(AIService):
             self.logger.info(f"使用代理服务器: {proxy_url}")
             
             # 创建httpx客户端
-            return httpx.Client(
+            client_class = httpx.AsyncClient if async_client else httpx.Client
+            hook = observe_response_async if async_client else observe_response
+            return client_class(
                 proxy=proxy_url,
                 timeout=60.0,
-                verify=True  # 生产环境应启用SSL验证
+                verify=True,  # 生产环境应启用SSL验证
+                event_hooks={"response": [hook]}
             )
         except Exception as e:
             self.logger.error(f"代理配置失败: {str(e)}")
@@ -108,27 +119,34 @@ class GrokService(AIService):
             raise ValueError(f"不支持的模型: {model}")
         return self.SUPPORTED_MODELS[model]
 
+    def _build_request_kwargs(self, messages, model=None, stream=False, **kwargs) -> Dict[str, Any]:
+        """构建chat.completions请求参数"""
+        # 获取模型配置
+        model = model or self.default_model
+        model_config = self.get_model_config(model)
+        
+        # 将 Message 对象转换为字典
+        messages_dict = [
+            {"role": msg.role, "content": msg.content} if isinstance(msg, Message) else msg
+            for msg in messages
+        ]
+        
+        # 准备请求参数
+        return {
+            "model": model,
+            "messages": messages_dict,
+            "stream": stream,
+            **model_config,
+            **kwargs
+        }
+
+    @cached_response
+    @with_retry
+    @rate_limited
     def send_message(self, messages, model=None, stream=False, **kwargs):
         """发送消息到 Grok API"""
         try:
-            # 获取模型配置
-            model = model or self.default_model
-            model_config = self.get_model_config(model)
-            
-            # 将 Message 对象转换为字典
-            messages_dict = [
-                {"role": msg.role, "content": msg.content} if isinstance(msg, Message) else msg
-                for msg in messages
-            ]
-            
-            # 准备请求参数
-            request_kwargs = {
-                "model": model,
-                "messages": messages_dict,
-                "stream": stream,
-                **model_config,
-                **kwargs
-            }
+            request_kwargs = self._build_request_kwargs(messages, model, stream, **kwargs)
             
             # 发送请求
             completion = self.client.chat.completions.create(**request_kwargs)
@@ -139,6 +157,47 @@ class GrokService(AIService):
             self.logger.error(f"异常类型: {type(e)}")
             raise Exception(f"API请求失败: {str(e)}")
 
+    @cached_stream
+    def stream_message(self, messages, model=None, **kwargs) -> Generator:
+        """流式发送消息，逐段返回回复文本
+
+        请求经过send_message的重试和限流，建立连接后的中断不重试
+        """
+        kwargs.pop("stream", None)
+        yield from self._handle_stream_response(self.send_message(messages, model, stream=True, **kwargs))
+
+    def _create_async_client(self) -> AsyncOpenAI:
+        """创建AsyncOpenAI客户端"""
+        client_kwargs = {
+            "api_key": self.api_key,
+            "base_url": self.base_url,
+            "max_retries": 0
+        }
+        provider_config = self.config.get_provider_config("grok", self.provider_name)
+        http_client = self._configure_http_client(provider_config, async_client=True)
+        client_kwargs["http_client"] = http_client or DefaultAsyncHttpxClient(
+            event_hooks={"response": [observe_response_async]})
+        return AsyncOpenAI(**client_kwargs)
+
+    def _get_async_client(self) -> AsyncOpenAI:
+        """获取当前事件循环对应的AsyncOpenAI客户端"""
+        return self._get_loop_client(self._create_async_client)
+
+    @cached_response
+    @with_retry
+    @rate_limited
+    async def send_message_async(self, messages, model=None, **kwargs):
+        """异步发送消息到 Grok API，不支持流式响应"""
+        try:
+            kwargs.pop("stream", None)
+            request_kwargs = self._build_request_kwargs(messages, model, False, **kwargs)
+            return await self._get_async_client().chat.completions.create(**request_kwargs)
+            
+        except Exception as e:
+            self.logger.error(f"异步API请求失败: {str(e)}")
+            self.logger.error(f"异常类型: {type(e)}")
+            raise Exception(f"API请求失败: {str(e)}")
+
     def _handle_stream_response(self, stream) -> Generator:
         """处理流式响应
 
@@ -149,9 +208,13 @@ class GrokService(AIService):
             每个响应块的内容
         """
         try:
-            for chunk in stream:
-                if chunk.choices[0].delta.content is not None:
-                    yield chunk.choices[0].delta.content
+            # 取消时关闭响应流，正在等待的读取随即中止
+            with close_on_cancel(stream.close):
+                for chunk in stream:
+                    if chunk.choices[0].delta.content is not None:
+                        yield chunk.choices[0].delta.content
+        except AnalysisCancelled:
+            raise
         except Exception as e:
             self.logger.error(f"流式响应处理失败: {str(e)}")
             raise Exception(f"流式响应处理失败: {str(e)}")
@@ -0,0 +1,119 @@
+"""
+HTTP连接池
+为使用requests/httpx直接调用API的提供商维护长连接会话，按base_url在进程内共享，
+所有分析线程复用同一组TCP/TLS连接，避免每个文本块都重新握手
+"""
+import atexit
+import threading
+from typing import Any, Dict
+from utils.config_manager import ConfigManager
+from utils.logger import Logger
+from .rate_limiter import observe_response, observe_response_async
+
+DEFAULT_POOL_SIZE = 10
+DEFAULT_TIMEOUT = 60.0
+DEFAULT_KEEPALIVE_EXPIRY = 30.0
+
+_sessions: Dict[str, Any] = {}
+_sessions_lock = threading.Lock()
+logger = Logger.create_logger('http_session')
+
+
+def _pool_config() -> Dict[str, Any]:
+    """读取配置http_pool"""
+    pool_config = ConfigManager().get_config().get("http_pool", {})
+    return {
+        "pool_size": max(1, int(pool_config.get("pool_size", DEFAULT_POOL_SIZE))),
+        "http2": bool(pool_config.get("http2", False)),
+        "timeout": float(pool_config.get("timeout", DEFAULT_TIMEOUT)),
+        "keepalive_expiry": float(pool_config.get("keepalive_expiry", DEFAULT_KEEPALIVE_EXPIRY)),
+    }
+
+
+def _http2_available() -> bool:
+    """httpx的HTTP/2支持需要安装h2（pip install httpx[http2]）"""
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def _create_httpx_client(pool_config: Dict[str, Any], http2: bool):
+    """创建同步httpx客户端"""
+    import httpx
+    return httpx.Client(
+        http2=http2,
+        timeout=pool_config["timeout"],
+        limits=httpx.Limits(max_connections=pool_config["pool_size"],
+                            max_keepalive_connections=pool_config["pool_size"],
+                            keepalive_expiry=pool_config["keepalive_expiry"]),
+        event_hooks={"response": [observe_response]}
+    )
+
+
+def _create_requests_session(pool_config: Dict[str, Any]):
+    """创建requests会话，连接池大小与并发线程数匹配"""
+    import requests
+    from requests.adapters import HTTPAdapter
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_config["pool_size"], pool_maxsize=pool_config["pool_size"])
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.hooks["response"].append(observe_response)
+    return session
+
+
+def get_http_session(base_url: str):
+    """获取base_url共享的同步HTTP会话
+
+    配置http_pool.http2为true且安装了h2时返回开启HTTP/2的httpx.Client，否则返回requests.Session。
+    两者都支持post/get、raise_for_status和json，请求超时使用http_pool.timeout
+    """
+    with _sessions_lock:
+        session = _sessions.get(base_url)
+        if session is None:
+            pool_config = _pool_config()
+            if pool_config["http2"] and _http2_available():
+                session = _create_httpx_client(pool_config, http2=True)
+            else:
+                if pool_config["http2"]:
+                    logger.warning("HTTP/2 requires the h2 package (pip install httpx[http2]), using HTTP/1.1")
+                session = _create_requests_session(pool_config)
+            _sessions[base_url] = session
+            logger.info(f"Created pooled HTTP session for {base_url} "
+                        f"({type(session).__name__}, pool size {pool_config['pool_size']})")
+        return session
+
+
+def get_request_timeout() -> float:
+    """同步请求的超时秒数，requests会话需要在每次请求时传入"""
+    return _pool_config()["timeout"]
+
+
+def create_async_client():
+    """按配置http_pool创建httpx.AsyncClient，调用方负责在各自的事件循环中持有"""
+    import httpx
+    pool_config = _pool_config()
+    http2 = pool_config["http2"] and _http2_available()
+    return httpx.AsyncClient(
+        http2=http2,
+        timeout=pool_config["timeout"],
+        limits=httpx.Limits(max_connections=pool_config["pool_size"],
+                            max_keepalive_connections=pool_config["pool_size"],
+                            keepalive_expiry=pool_config["keepalive_expiry"]),
+        event_hooks={"response": [observe_response_async]}
+    )
+
+
+@atexit.register
+def close_http_sessions():
+    """关闭所有共享会话，释放连接"""
+    with _sessions_lock:
+        sessions = list(_sessions.values())
+        _sessions.clear()
+    for session in sessions:
+        try:
+            session.close()
+        except Exception as e:
+            logger.warning(f"Failed to close HTTP session: {str(e)}")
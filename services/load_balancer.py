@@ -0,0 +1,256 @@
+"""
+负载均衡
+把同一服务的请求分发到所有已启用的提供商和等价模型上，
+按各后端的延迟EWMA、错误率和剩余限流配额加权，使总吞吐量接近各提供商配额之和
+"""
+import asyncio
+import random
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Set
+from core.analysis_prompts import extract_response_content
+from core.cancellation import AnalysisCancelled
+from utils.config_manager import ConfigManager
+from utils.logger import Logger
+from .rate_limiter import get_rate_limiter
+from .retry_policy import is_retryable
+from .routing_context import set_answered
+
+
+class Backend:
+    """一个(提供商, 模型)后端及其实时统计"""
+
+    def __init__(self, service):
+        self.service = service
+        self.provider = getattr(service, "current_provider", None) or getattr(service, "provider_name", None)
+        self.model = getattr(service, "default_model", None)
+        self.name = f"{getattr(service, 'service_name', type(service).__name__)}.{self.provider}.{self.model}"
+        # 成功请求耗时的EWMA（秒），还没有成功请求时为None
+        self.latency: Optional[float] = None
+        # 失败率的EWMA（0到1）
+        self.error_rate = 0.0
+        self.in_flight = 0
+        self.requests = 0
+        self.errors = 0
+
+    def limiter(self):
+        return get_rate_limiter(getattr(self.service, "service_name", type(self.service).__name__),
+                                self.provider, self.model)
+
+
+class LoadBalancer:
+    """在多个等价后端之间按权重分发请求
+
+    权重 = 1 / (延迟EWMA × (1 + 在途请求数)) × (1 - 错误率) × 剩余配额比例，
+    各因子不低于MIN_FACTOR，暂时变差的后端仍会分到少量请求，恢复后权重随之回升。
+    还没有延迟数据的后端按已知后端的平均延迟计，保证新后端能分到请求。
+    请求因临时错误失败时（重试用尽后）换用尚未尝试的后端，认证失败、请求错误等不可重试的错误直接抛出；
+    未定义的属性转发给第一个后端（界面中选择的提供商和模型），
+    实际返回结果的后端通过routing_context.answering_service获取
+    """
+
+    DEFAULT_ALPHA = 0.3
+    # 各权重因子的下限
+    MIN_FACTOR = 0.05
+    # 还没有任何延迟数据时假定的延迟（秒）
+    DEFAULT_LATENCY = 1.0
+
+    def __init__(self, services: List[Any], alpha: float = DEFAULT_ALPHA):
+        """初始化负载均衡器
+
+        Args:
+            services: 同一服务的等价后端实例，第一个为主后端
+            alpha: EWMA的平滑系数，越大越偏重最近的请求
+        """
+        if not services:
+            raise ValueError("至少需要一个AI服务")
+        self.services = list(services)
+        self.backends = [Backend(service) for service in self.services]
+        self.alpha = min(1.0, max(0.01, float(alpha)))
+        self._lock = threading.Lock()
+        self.logger = Logger.create_logger('load_balancer')
+
+    def __getattr__(self, name):
+        # 只在常规属性查找失败时调用，services尚未设置时不转发，避免递归
+        if name == "services":
+            raise AttributeError(name)
+        return getattr(self.services[0], name)
+
+    def weight(self, backend: Backend) -> float:
+        """计算后端的当前权重"""
+        with self._lock:
+            known = [b.latency for b in self.backends if b.latency is not None]
+            latency = backend.latency
+            if latency is None:
+                latency = sum(known) / len(known) if known else self.DEFAULT_LATENCY
+            in_flight = backend.in_flight
+            error_rate = backend.error_rate
+        limiter = backend.limiter()
+        headroom = limiter.headroom() if limiter is not None else 1.0
+        return (1.0 / (max(latency, 0.001) * (1 + in_flight))
+                * max(self.MIN_FACTOR, 1.0 - error_rate)
+                * max(self.MIN_FACTOR, headroom))
+
+    def choose(self, exclude: Set[Backend] = frozenset()) -> Backend:
+        """按权重随机选择一个未排除的后端"""
+        candidates = [backend for backend in self.backends if backend not in exclude]
+        return random.choices(candidates, weights=[self.weight(backend) for backend in candidates])[0]
+
+    def _begin(self, backend: Backend):
+        with self._lock:
+            backend.in_flight += 1
+            backend.requests += 1
+
+    def _finish(self, backend: Backend, started: float, failed: bool):
+        """请求结束后更新在途数、延迟EWMA和错误率EWMA"""
+        with self._lock:
+            backend.in_flight -= 1
+            backend.error_rate += self.alpha * ((1.0 if failed else 0.0) - backend.error_rate)
+            if failed:
+                backend.errors += 1
+                return
+            elapsed = time.monotonic() - started
+            if backend.latency is None:
+                backend.latency = elapsed
+            else:
+                backend.latency += self.alpha * (elapsed - backend.latency)
+
+    def _should_try_next(self, tried: Set[Backend], error: Exception) -> bool:
+        """只有临时错误且还有未尝试的后端时才换用其他后端"""
+        return is_retryable(error) and len(tried) < len(self.backends)
+
+    def _log_failure(self, backend: Backend, error: Exception):
+        self.logger.warning(f"{backend.name} 请求失败，换用其他后端: {str(error)}")
+
+    def send_message(self, messages, *args, **kwargs):
+        """选择一个后端发送消息，因临时错误失败时换用尚未尝试的后端"""
+        tried: Set[Backend] = set()
+        while True:
+            backend = self.choose(tried)
+            tried.add(backend)
+            started = time.monotonic()
+            self._begin(backend)
+            try:
+                response = backend.service.send_message(messages, *args, **kwargs)
+            except AnalysisCancelled:
+                self._finish(backend, started, failed=False)
+                raise
+            except Exception as e:
+                self._finish(backend, started, failed=True)
+                if not self._should_try_next(tried, e):
+                    raise
+                self._log_failure(backend, e)
+                continue
+            self._finish(backend, started, failed=False)
+            set_answered(backend.service)
+            return response
+
+    async def send_message_async(self, messages, *args, **kwargs):
+        """异步发送消息，因临时错误失败时换用尚未尝试的后端"""
+        tried: Set[Backend] = set()
+        while True:
+            backend = self.choose(tried)
+            tried.add(backend)
+            started = time.monotonic()
+            self._begin(backend)
+            try:
+                response = await backend.service.send_message_async(messages, *args, **kwargs)
+            except (AnalysisCancelled, asyncio.CancelledError):
+                self._finish(backend, started, failed=False)
+                raise
+            except Exception as e:
+                self._finish(backend, started, failed=True)
+                if not self._should_try_next(tried, e):
+                    raise
+                self._log_failure(backend, e)
+                continue
+            self._finish(backend, started, failed=False)
+            set_answered(backend.service)
+            return response
+
+    def stream_message(self, messages, *args, **kwargs) -> Iterator[str]:
+        """流式发送消息，收到第一段文本之前因临时错误失败时换用其他后端"""
+        tried: Set[Backend] = set()
+        while True:
+            backend = self.choose(tried)
+            tried.add(backend)
+            service = backend.service
+            started = time.monotonic()
+            received = False
+            self._begin(backend)
+            try:
+                if hasattr(service, "stream_message"):
+                    stream = service.stream_message(messages, *args, **kwargs)
+                else:
+                    stream = iter([extract_response_content(service.send_message(messages, *args, **kwargs))])
+                for delta in stream:
+                    received = True
+                    yield delta
+            except Exception as e:
+                cancelled = isinstance(e, AnalysisCancelled)
+                self._finish(backend, started, failed=not cancelled)
+                if cancelled or received or not self._should_try_next(tried, e):
+                    raise
+                self._log_failure(backend, e)
+                continue
+            except BaseException:
+                # 调用方提前关闭了流
+                self._finish(backend, started, failed=False)
+                raise
+            self._finish(backend, started, failed=False)
+            set_answered(backend.service)
+            return
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """各后端的统计信息"""
+        with self._lock:
+            return {
+                backend.name: {
+                    "latency": round(backend.latency, 3) if backend.latency is not None else None,
+                    "error_rate": round(backend.error_rate, 3),
+                    "in_flight": backend.in_flight,
+                    "requests": backend.requests,
+                    "errors": backend.errors,
+                }
+                for backend in self.backends
+            }
+
+
+def create_load_balancer(primary):
+    """根据配置load_balancing为服务创建负载均衡器
+
+    后端包括该服务所有已启用且配置了API密钥的提供商中，与主服务当前模型同名
+    或在load_balancing.equivalent_models中列为等价的模型；只有主服务一个后端或未启用时直接返回主服务
+    """
+    balancing_config = ConfigManager().get_config().get("load_balancing", {})
+    if not balancing_config.get("enabled", False):
+        return primary
+
+    logger = Logger.create_logger('load_balancer')
+    config = primary.config
+    service_name = primary.service_name
+    model = primary.default_model
+    models = [model] + [m for m in balancing_config.get("equivalent_models", {}).get(model, []) if m != model]
+    # 界面切换提供商只更新current_provider，provider_name仍是创建时的默认提供商
+    primary_provider = getattr(primary, "current_provider", None) or primary.provider_name
+    services = [primary]
+    for provider in config.get_enabled_providers(service_name):
+        provider_config = config.get_provider_config(service_name, provider)
+        if "api_key" in provider_config and not provider_config["api_key"]:
+            continue
+        for candidate in models:
+            if candidate not in provider_config.get("models", {}):
+                continue
+            if provider == primary_provider and candidate == model:
+                continue
+            try:
+                service = type(primary)(config_manager=config, provider_name=provider)
+                service.default_model = candidate
+                service.model = candidate
+                services.append(service)
+            except Exception as e:
+                logger.warning(f"后端 {service_name}.{provider}.{candidate} 初始化失败，已跳过: {str(e)}")
+    if len(services) == 1:
+        return primary
+    logger.info(f"{service_name} 负载均衡后端: {[Backend(service).name for service in services]}")
+    return LoadBalancer(services, balancing_config.get("alpha", LoadBalancer.DEFAULT_ALPHA))
@@ -1,8 +1,12 @@
 import httpx
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI, DefaultHttpxClient, DefaultAsyncHttpxClient
 from typing import Dict, Any, List, Generator, Union
 from .ai_service import AIService
+from .response_cache import cached_response, cached_stream
+from .retry_policy import with_retry
+from .rate_limiter import rate_limited, observe_response, observe_response_async
 from .message_types import Message
+from core.cancellation import AnalysisCancelled, close_on_cancel
 from utils.config_manager import ConfigManager
 from utils.logger import Logger
 import os
@@ -38,7 +42,8 @@ class OpenAIService(AIService):
         
         # 获取代理配置
         proxies = self.get_proxies()
-        http_client = None
+        # 响应钩子把限流相关的响应头交给限流器
+        event_hooks = {"response": [observe_response]}
         
         if proxies:
             formatted_proxies = {
@@ -47,25 +52,66 @@ class OpenAIService(AIService):
             }
             http_client = httpx.Client(
                 proxies=formatted_proxies,
-                transport=httpx.HTTPTransport(local_address="0.0.0.0")
+                transport=httpx.HTTPTransport(local_address="0.0.0.0"),
+                event_hooks=event_hooks
             )
+        else:
+            http_client = DefaultHttpxClient(event_hooks=event_hooks)
         
         # 初始化OpenAI客户端
+        client_kwargs = self._get_client_kwargs()
+        client_kwargs["http_client"] = http_client
+            
+        self.client = OpenAI(**client_kwargs)
+    
+    def _get_client_kwargs(self) -> Dict[str, Any]:
+        """获取OpenAI客户端的公共初始化参数"""
         client_kwargs = {
             "api_key": self.get_api_key(),
-            "base_url": self.get_base_url()
+            "base_url": self.get_base_url(),
+            # 重试由with_retry统一处理，关闭SDK自带的重试，避免重试次数叠加
+            "max_retries": 0
         }
         
-        # 如果配置了代理，添加http_client
-        if http_client:
-            client_kwargs["http_client"] = http_client
-        
         # 如果配置了organization_id，添加到参数中
         if "organization_id" in self.provider_config:
             client_kwargs["organization"] = self.provider_config["organization_id"]
-            
-        self.client = OpenAI(**client_kwargs)
+        return client_kwargs
+    
+    def _build_request_kwargs(self, messages: List[Message], model: str = None, **kwargs) -> Dict[str, Any]:
+        """构建chat.completions请求参数"""
+        # 获取模型配置
+        model_config = self.get_model_config(model)
+        
+        # 准备消息列表
+        message_list = []
+        
+        # 添加系统消息（如果提供）
+        system_message = kwargs.get("system_message")
+        if system_message:
+            message_list.append({"role": "system", "content": system_message})
+        
+        # 添加用户消息
+        message_list.extend([m.to_dict() for m in messages])
+        
+        # 准备请求参数
+        request_kwargs = {
+            "model": model_config.get("internal_name", model or self.default_model),
+            "messages": message_list,
+            "stream": kwargs.get("stream", False),
+            "max_tokens": kwargs.get("max_tokens", model_config.get("max_tokens", 4000)),
+            "temperature": kwargs.get("temperature", model_config.get("temperature", 0.7))
+        }
+        
+        # 添加其他可选参数
+        for k, v in kwargs.items():
+            if k not in ["max_tokens", "temperature", "stream", "system_message"]:
+                request_kwargs[k] = v
+        return request_kwargs
     
+    @cached_response
+    @with_retry
+    @rate_limited
     def send_message(self, messages: List[Message], model: str = None, **kwargs) -> Union[Dict[str, Any], Generator]:
         """发送消息到OpenAI服务
 
@@ -87,33 +133,7 @@ class OpenAIService(AIService):
             如果需要原始对象而非字典，可修改此方法直接返回completion而不调用model_dump()
         """
         try:
-            # 获取模型配置
-            model_config = self.get_model_config(model)
-            
-            # 准备消息列表
-            message_list = []
-            
-            # 添加系统消息（如果提供）
-            system_message = kwargs.get("system_message")
-            if system_message:
-                message_list.append({"role": "system", "content": system_message})
-            
-            # 添加用户消息
-            message_list.extend([m.to_dict() for m in messages])
-            
-            # 准备请求参数
-            request_kwargs = {
-                "model": model_config["internal_name"],
-                "messages": message_list,
-                "stream": kwargs.get("stream", False),
-                "max_tokens": kwargs.get("max_tokens", model_config.get("max_tokens", 4000)),
-                "temperature": kwargs.get("temperature", model_config.get("temperature", 0.7))
-            }
-            
-            # 添加其他可选参数
-            for k, v in kwargs.items():
-                if k not in ["max_tokens", "temperature", "stream", "system_message"]:
-                    request_kwargs[k] = v
+            request_kwargs = self._build_request_kwargs(messages, model, **kwargs)
             
             # 发送请求
             completion = self.client.chat.completions.create(**request_kwargs)
@@ -130,6 +150,53 @@ class OpenAIService(AIService):
             self.logger.error(f"异常类型: {type(e)}")
             raise Exception(f"API请求失败: {str(e)}")
 
+    @cached_stream
+    def stream_message(self, messages: List[Message], model: str = None, **kwargs) -> Generator:
+        """流式发送消息，逐段返回回复文本
+
+        请求经过send_message的重试和限流，建立连接后的中断不重试
+        """
+        kwargs["stream"] = True
+        yield from self.send_message(messages, model, **kwargs)
+
+    def _create_async_client(self) -> AsyncOpenAI:
+        """创建AsyncOpenAI客户端"""
+        client_kwargs = self._get_client_kwargs()
+        proxies = self.get_proxies()
+        event_hooks = {"response": [observe_response_async]}
+        if proxies:
+            client_kwargs["http_client"] = httpx.AsyncClient(mounts={
+                f"{scheme}://": httpx.AsyncHTTPTransport(proxy=url)
+                for scheme, url in proxies.items() if url
+            }, event_hooks=event_hooks)
+        else:
+            client_kwargs["http_client"] = DefaultAsyncHttpxClient(event_hooks=event_hooks)
+        return AsyncOpenAI(**client_kwargs)
+
+    def _get_async_client(self) -> AsyncOpenAI:
+        """获取当前事件循环对应的AsyncOpenAI客户端"""
+        return self._get_loop_client(self._create_async_client)
+
+    @cached_response
+    @with_retry
+    @rate_limited
+    async def send_message_async(self, messages: List[Message], model: str = None, **kwargs) -> Dict[str, Any]:
+        """异步发送消息到OpenAI服务，不支持流式响应
+
+        Returns:
+            完整的响应字典，格式与send_message一致
+        """
+        try:
+            kwargs["stream"] = False
+            request_kwargs = self._build_request_kwargs(messages, model, **kwargs)
+            completion = await self._get_async_client().chat.completions.create(**request_kwargs)
+            return completion.model_dump()
+            
+        except Exception as e:
+            self.logger.error(f"异步API请求失败: {str(e)}")
+            self.logger.error(f"异常类型: {type(e)}")
+            raise Exception(f"API请求失败: {str(e)}")
+
     def _handle_stream_response(self, stream) -> Generator:
         """处理流式响应
 
@@ -144,9 +211,13 @@ class OpenAIService(AIService):
             如果需要处理完整对象（如处理函数调用等），请修改此方法直接yield chunk
         """
         try:
-            for chunk in stream:
-                if chunk.choices[0].delta.content is not None:
-                    yield chunk.choices[0].delta.content
+            # 取消时关闭响应流，正在等待的读取随即中止
+            with close_on_cancel(stream.close):
+                for chunk in stream:
+                    if chunk.choices[0].delta.content is not None:
+                        yield chunk.choices[0].delta.content
+        except AnalysisCancelled:
+            raise
         except Exception as e:
             self.logger.error(f"流式响应处理失败: {str(e)}")
             raise Exception(f"流式响应处理失败: {str(e)}")
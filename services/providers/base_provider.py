@@ -1,6 +1,8 @@
+import httpx
 from abc import ABC, abstractmethod
-from typing import List, Dict
+from typing import List, Dict, Any
 from ..message_types import Message
+from ..http_session import get_http_session, get_request_timeout
 
 
 class BaseProvider(ABC):
@@ -10,11 +12,77 @@ class BaseProvider(ABC):
         self.api_key = api_key
         self.base_url = base_url
         
+    def _get_session(self):
+        """获取base_url共享的长连接HTTP会话"""
+        return get_http_session(self.base_url)
+    
+    def _post(self, path: str, **kwargs):
+        """通过共享会话发送POST请求"""
+        return self._get_session().post(f'{self.base_url}{path}', headers=self._get_headers(),
+                                        timeout=get_request_timeout(), **kwargs)
+    
+    def _get(self, path: str, **kwargs):
+        """通过共享会话发送GET请求"""
+        return self._get_session().get(f'{self.base_url}{path}', headers=self._get_headers(),
+                                       timeout=get_request_timeout(), **kwargs)
+        
     @abstractmethod
     def send_message(self, messages: List[Message], model: str, **kwargs) -> Message:
         """发送消息到API"""
         pass
     
+    async def send_message_async(self, messages: List[Message], model: str,
+                                 client: httpx.AsyncClient, **kwargs) -> Message:
+        """使用httpx.AsyncClient异步发送消息到API
+        
+        Args:
+            messages: 消息列表
+            model: 模型名称
+            client: 调用方持有的异步HTTP客户端，用于复用连接
+            **kwargs: 其他参数，如temperature、max_tokens等
+        """
+        try:
+            response = await client.post(
+                f'{self.base_url}/chat/completions',
+                headers=self._get_headers(),
+                json=self._build_payload(messages, model, **kwargs)
+            )
+            
+            response.raise_for_status()
+            
+            return Message(
+                role="assistant",
+                content=self._parse_content(response.json())
+            )
+            
+        except Exception as e:
+            self.logger.error(f"Failed to send message asynchronously: {str(e)}")
+            raise
+    
+    def _get_headers(self) -> Dict[str, str]:
+        """获取请求头"""
+        return {
+            'Authorization': f'Bearer {self.api_key}',
+            'Content-Type': 'application/json'
+        }
+    
+    def _convert_model_name(self, model: str) -> str:
+        """转换模型名称为提供商特定格式"""
+        return model
+    
+    def _build_payload(self, messages: List[Message], model: str, **kwargs) -> Dict[str, Any]:
+        """构建chat/completions请求体"""
+        return {
+            'model': self._convert_model_name(model),
+            'messages': [msg.to_dict() for msg in messages],
+            'temperature': kwargs.get('temperature', 0.7),
+            'max_tokens': kwargs.get('max_tokens', 4000)
+        }
+    
+    def _parse_content(self, result: Dict[str, Any]) -> str:
+        """从响应数据中提取回复内容"""
+        return result['choices'][0]['message']['content']
+    
     @abstractmethod
     def get_available_models(self) -> List[str]:
         """获取可用的模型列表"""
@@ -28,4 +96,4 @@ class BaseProvider(ABC):
     @abstractmethod
     def get_supported_models(self) -> List[str]:
         """获取支持的模型列表"""
-        pass 
\ No newline at end of file
+        pass 
@@ -1,4 +1,3 @@
-import requests
 from typing import List, Dict
 from .base_provider import BaseProvider
 from ..message_types import Message
@@ -14,30 +13,16 @@ class DeepseekProvider(BaseProvider):
         
     def send_message(self, messages: List[Message], model: str, **kwargs) -> Message:
         try:
-            headers = {
-                'Authorization': f'Bearer {self.api_key}',
-                'Content-Type': 'application/json'
-            }
-            
-            data = {
-                'model': model,
-                'messages': [msg.to_dict() for msg in messages],
-                'temperature': kwargs.get('temperature', 0.7),
-                'max_tokens': kwargs.get('max_tokens', 4000)
-            }
-            
-            response = requests.post(
-                f'{self.base_url}/chat/completions',
-                headers=headers,
-                json=data
+            response = self._post(
+                '/chat/completions',
+                json=self._build_payload(messages, model, **kwargs)
             )
             
             response.raise_for_status()
-            result = response.json()
             
             return Message(
                 role="assistant",
-                content=result['choices'][0]['message']['content']
+                content=self._parse_content(response.json())
             )
             
         except Exception as e:
@@ -46,15 +31,7 @@ class DeepseekProvider(BaseProvider):
             
     def get_available_models(self) -> List[str]:
         try:
-            headers = {
-                'Authorization': f'Bearer {self.api_key}',
-                'Content-Type': 'application/json'
-            }
-            
-            response = requests.get(
-                f'{self.base_url}/models',
-                headers=headers
-            )
+            response = self._get('/models')
             
             response.raise_for_status()
             result = response.json()
@@ -0,0 +1,359 @@
+"""
+请求限流
+按(服务, 提供商, 模型)共享令牌桶，限制每分钟请求数(RPM)和token数(TPM)，
+并根据服务器返回的Retry-After和x-ratelimit-*响应头动态调整
+"""
+import asyncio
+import contextvars
+import functools
+import inspect
+import re
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Mapping, Optional, Tuple
+from core.cancellation import cancellable_sleep
+from core.tokenizer import chunking_for_service
+from utils.config_manager import ConfigManager
+from utils.logger import Logger
+
+
+class TokenBucket:
+    """按分钟配额匀速补充的令牌桶
+
+    允许预支：取令牌后余额可以为负，调用方等待余额回到0所需的时间，
+    先到的请求先得到配额，不会在同一时刻一起醒来
+    """
+
+    # 桶容量对应的补充时长（秒），即允许的突发量
+    BURST_SECONDS = 10
+
+    def __init__(self, per_minute: float):
+        self.level = 0.0
+        self.updated = time.monotonic()
+        self.set_limit(per_minute)
+        self.level = self.capacity
+
+    def set_limit(self, per_minute: float):
+        """设置每分钟配额"""
+        self.per_minute = float(per_minute)
+        self.rate = self.per_minute / 60.0
+        self.capacity = max(1.0, self.rate * self.BURST_SECONDS)
+        self.level = min(self.level, self.capacity)
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount: float, now: float) -> float:
+        """取出amount个令牌，返回需要等待的秒数；超过桶容量时按容量计"""
+        self._refill(now)
+        self.level -= min(float(amount), self.capacity)
+        return max(0.0, -self.level / self.rate)
+
+    def adjust(self, amount: float, now: float):
+        """修正余额，正数归还多取的令牌，负数补扣少取的令牌"""
+        self._refill(now)
+        self.level = min(self.capacity, self.level + amount)
+
+    def headroom(self, now: float) -> float:
+        """当前余额占桶容量的比例，预支后为0"""
+        self._refill(now)
+        return max(0.0, self.level / self.capacity)
+
+    def limit_remaining(self, remaining: float, now: float):
+        """服务器报告的剩余配额少于本地余额时以服务器为准"""
+        self._refill(now)
+        self.level = min(self.level, float(remaining))
+
+
+def _parse_duration(value: str) -> Optional[float]:
+    """解析x-ratelimit-reset-*的时长，支持"20"、"1.5s"、"120ms"、"6m0s"、"1h2m3s"等格式"""
+    value = value.strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = re.findall(r'(\d+(?:\.\d+)?)(ms|h|m|s)', value)
+    if not parts or ''.join(number + unit for number, unit in parts) != value:
+        return None
+    scale = {"h": 3600.0, "m": 60.0, "s": 1.0, "ms": 0.001}
+    return sum(float(number) * scale[unit] for number, unit in parts)
+
+
+def parse_retry_after(headers: Mapping[str, str]) -> Optional[float]:
+    """解析retry-after-ms或retry-after（秒数或HTTP日期）"""
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return float(value) / 1000.0
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _header_number(headers: Mapping[str, str], name: str) -> Optional[float]:
+    value = headers.get(name)
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+class RateLimiter:
+    """一个服务/提供商/模型的请求限流器，线程安全，可同时用于同步和异步请求
+
+    - rpm/tpm为配置的上限，为None时在服务器返回配额响应头之前不限制
+    - 收到429或剩余配额为0时，在Retry-After或配额重置之前暂停所有请求
+    """
+
+    # 429响应没有Retry-After时的首次等待秒数，连续429时加倍
+    DEFAULT_BACKOFF_SECONDS = 1.0
+    MAX_BACKOFF_SECONDS = 60.0
+
+    def __init__(self, name: str, rpm: Optional[float] = None, tpm: Optional[float] = None):
+        self.name = name
+        self.configured_rpm = rpm
+        self.configured_tpm = tpm
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self._blocked_until = 0.0
+        self._backoff = self.DEFAULT_BACKOFF_SECONDS
+        self._lock = threading.Lock()
+        self.logger = Logger.create_logger('rate_limiter')
+        self.waits = 0
+        self.waited_seconds = 0.0
+        self.rate_limited = 0
+
+    def reserve(self, tokens: int = 0) -> float:
+        """预约一个请求和tokens个token的配额，返回需要等待的秒数"""
+        with self._lock:
+            now = time.monotonic()
+            delay = max(0.0, self._blocked_until - now)
+            if self.requests is not None:
+                delay = max(delay, self.requests.reserve(1, now))
+            if self.tokens is not None and tokens:
+                delay = max(delay, self.tokens.reserve(tokens, now))
+            if delay > 0:
+                self.waits += 1
+                self.waited_seconds += delay
+            return delay
+
+    def acquire(self, tokens: int = 0):
+        """等待直到可以发送请求，在取消范围内等待时取消后立即抛出AnalysisCancelled"""
+        delay = self.reserve(tokens)
+        if delay > 0:
+            cancellable_sleep(delay)
+
+    async def acquire_async(self, tokens: int = 0):
+        """在事件循环中等待直到可以发送请求"""
+        delay = self.reserve(tokens)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def reconcile(self, estimated: int, actual: int):
+        """用响应中的实际token用量修正预约时的估算值"""
+        if self.tokens is None or not actual:
+            return
+        with self._lock:
+            self.tokens.adjust(estimated - actual, time.monotonic())
+
+    def _block_for(self, seconds: float, now: float):
+        self._blocked_until = max(self._blocked_until, now + seconds)
+
+    def _apply_limit(self, bucket_attr: str, configured: Optional[float], server_limit: Optional[float]):
+        """按服务器返回的配额调整令牌桶，配置了更小的上限时保留配置值"""
+        if not server_limit:
+            return
+        limit = min(server_limit, configured) if configured else server_limit
+        bucket = getattr(self, bucket_attr)
+        if bucket is None:
+            setattr(self, bucket_attr, TokenBucket(limit))
+        elif bucket.per_minute != limit:
+            bucket.set_limit(limit)
+
+    def update_from_headers(self, status_code: int, headers: Mapping[str, str]):
+        """根据响应状态码和响应头调整限流
+
+        Args:
+            status_code: HTTP状态码，429表示触发了服务器限流
+            headers: 响应头（键不区分大小写，如httpx.Headers或requests的CaseInsensitiveDict）
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._apply_limit("requests", self.configured_rpm, _header_number(headers, "x-ratelimit-limit-requests"))
+            self._apply_limit("tokens", self.configured_tpm, _header_number(headers, "x-ratelimit-limit-tokens"))
+
+            for bucket, kind in ((self.requests, "requests"), (self.tokens, "tokens")):
+                remaining = _header_number(headers, f"x-ratelimit-remaining-{kind}")
+                if remaining is None:
+                    continue
+                if bucket is not None:
+                    bucket.limit_remaining(remaining, now)
+                if remaining <= 0:
+                    reset = _parse_duration(headers.get(f"x-ratelimit-reset-{kind}", ""))
+                    if reset:
+                        self._block_for(reset, now)
+
+            if status_code == 429:
+                self.rate_limited += 1
+                retry_after = parse_retry_after(headers)
+                if retry_after is None:
+                    retry_after = self._backoff
+                    self._backoff = min(self._backoff * 2, self.MAX_BACKOFF_SECONDS)
+                self._block_for(retry_after, now)
+                self.logger.warning(f"{self.name} 触发服务器限流，暂停 {retry_after:.1f} 秒")
+            elif 200 <= status_code < 300:
+                self._backoff = self.DEFAULT_BACKOFF_SECONDS
+
+    def headroom(self) -> float:
+        """剩余配额比例（0到1），取请求数和token数中较小的一项，暂停期间为0，不占用配额"""
+        with self._lock:
+            now = time.monotonic()
+            if now < self._blocked_until:
+                return 0.0
+            ratios = [bucket.headroom(now) for bucket in (self.requests, self.tokens) if bucket is not None]
+            return min(ratios) if ratios else 1.0
+
+    def stats(self) -> Dict[str, Any]:
+        """获取限流统计信息"""
+        with self._lock:
+            return {
+                "rpm": self.requests.per_minute if self.requests is not None else None,
+                "tpm": self.tokens.per_minute if self.tokens is not None else None,
+                "waits": self.waits,
+                "waited_seconds": round(self.waited_seconds, 2),
+                "rate_limited": self.rate_limited
+            }
+
+
+_limiters: Dict[Tuple[str, Optional[str], Optional[str]], RateLimiter] = {}
+_limiters_lock = threading.Lock()
+# 当前请求所用的限流器，供HTTP客户端的响应钩子读取
+_current_limiter: contextvars.ContextVar[Optional[RateLimiter]] = contextvars.ContextVar(
+    "current_rate_limiter", default=None)
+
+
+def get_rate_limiter(service: str, provider: Optional[str], model: Optional[str]) -> Optional[RateLimiter]:
+    """根据配置获取(服务, 提供商, 模型)共享的限流器，未启用时返回None
+
+    配置rate_limits.limits中的键依次匹配"服务.提供商.模型"、"服务.提供商"和"服务"，
+    没有匹配时不设上限，只根据响应头限流
+    """
+    rate_config = ConfigManager().get_config().get("rate_limits", {})
+    if not rate_config.get("enabled", True):
+        return None
+
+    key = (service, provider, model)
+    with _limiters_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            limits = rate_config.get("limits", {})
+            candidates = [f"{service}.{provider}.{model}", f"{service}.{provider}", service]
+            limit = next((limits[name] for name in candidates if name in limits), {})
+            name = ".".join(part for part in (service, provider, model) if part)
+            limiter = RateLimiter(name, limit.get("rpm"), limit.get("tpm"))
+            _limiters[key] = limiter
+        return limiter
+
+
+def observe_response(response, *args, **kwargs):
+    """HTTP响应钩子，把状态码和响应头交给当前请求的限流器
+
+    可直接用作httpx.Client的event_hooks["response"]和requests的hooks["response"]
+    """
+    limiter = _current_limiter.get()
+    if limiter is not None:
+        limiter.update_from_headers(response.status_code, response.headers)
+    return response
+
+
+async def observe_response_async(response):
+    """httpx.AsyncClient的响应钩子"""
+    observe_response(response)
+
+
+def _limiter_for(service, args, kwargs) -> Optional[RateLimiter]:
+    """获取一次send_message调用所用的限流器"""
+    model = kwargs.get("model") or (args[0] if args else None) or getattr(service, "default_model", None)
+    return get_rate_limiter(
+        getattr(service, "service_name", type(service).__name__),
+        getattr(service, "current_provider", None) or getattr(service, "provider_name", None),
+        model
+    )
+
+
+def _estimate_request_tokens(service, messages) -> int:
+    """计算请求消息的token数，用于TPM预约
+
+    使用与分块相同的计数器（chunking_for_service），预约的配额与分块大小按同一口径计算
+    """
+    contents = []
+    for msg in messages:
+        content = msg.get("content") if isinstance(msg, dict) else getattr(msg, "content", None)
+        if content:
+            contents.append(str(content))
+    if not contents:
+        return 0
+    counter, _ = chunking_for_service(service)
+    return sum(counter.count_batch(contents))
+
+
+def _usage_tokens(response: Any) -> Optional[int]:
+    """从响应中读取实际的token用量，没有用量信息时返回None"""
+    usage = response.get("usage") if isinstance(response, dict) else getattr(response, "usage", None)
+    if isinstance(usage, dict):
+        return usage.get("total_tokens")
+    return getattr(usage, "total_tokens", None)
+
+
+def rate_limited(send_message):
+    """AIService.send_message / send_message_async 的限流装饰器
+
+    发送前按RPM/TPM等待配额，请求期间通过上下文变量把限流器交给HTTP响应钩子，
+    返回后用响应中的实际token用量修正估算值。放在cached_response之内，缓存命中时不占用配额
+    """
+    if inspect.iscoroutinefunction(send_message):
+        @functools.wraps(send_message)
+        async def async_wrapper(self, messages, *args, **kwargs):
+            limiter = _limiter_for(self, args, kwargs)
+            if limiter is None:
+                return await send_message(self, messages, *args, **kwargs)
+            estimated = _estimate_request_tokens(self, messages)
+            await limiter.acquire_async(estimated)
+            token = _current_limiter.set(limiter)
+            try:
+                response = await send_message(self, messages, *args, **kwargs)
+            finally:
+                _current_limiter.reset(token)
+            limiter.reconcile(estimated, _usage_tokens(response))
+            return response
+        return async_wrapper
+
+    @functools.wraps(send_message)
+    def wrapper(self, messages, *args, **kwargs):
+        limiter = _limiter_for(self, args, kwargs)
+        if limiter is None:
+            return send_message(self, messages, *args, **kwargs)
+        estimated = _estimate_request_tokens(self, messages)
+        limiter.acquire(estimated)
+        token = _current_limiter.set(limiter)
+        try:
+            response = send_message(self, messages, *args, **kwargs)
+        finally:
+            _current_limiter.reset(token)
+        limiter.reconcile(estimated, _usage_tokens(response))
+        return response
+    return wrapper
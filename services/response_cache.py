@@ -0,0 +1,260 @@
+"""
+LLM响应缓存
+以(服务, 提供商, 模型, 消息内容哈希, 请求参数)为键，把响应文本持久化到SQLite，
+相同的请求再次发送时直接返回缓存结果，不再调用API
+"""
+import functools
+import hashlib
+import inspect
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+from core.analysis_prompts import extract_response_content
+from utils.config_manager import ConfigManager
+from utils.logger import Logger
+
+
+def _message_fields(msg) -> tuple:
+    """获取Message对象或消息字典的(role, content)"""
+    if isinstance(msg, dict):
+        return msg.get("role"), msg.get("content")
+    return msg.role, msg.content
+
+
+class ResponseCache:
+    """基于SQLite的响应缓存，按最近访问时间进行LRU淘汰"""
+
+    # 淘汰后保留的容量比例，避免每次写入都触发淘汰
+    EVICT_TARGET_RATIO = 0.9
+
+    def __init__(self, db_path: str, max_size_bytes: int = 512 * 1024 * 1024):
+        """初始化响应缓存
+
+        Args:
+            db_path: SQLite数据库文件路径
+            max_size_bytes: 缓存内容的最大总字节数
+        """
+        self.db_path = db_path
+        self.max_size_bytes = max_size_bytes
+        self.hits = 0
+        self.misses = 0
+        self.logger = Logger.create_logger('response_cache')
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY,"
+            " content TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_last_access ON responses(last_access)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(service: str, provider: Optional[str], model: Optional[str],
+                 messages: List[Any], params: Dict[str, Any] = None) -> str:
+        """生成缓存键
+
+        消息内容（系统提示词、指令和文本块）各自取哈希后参与计算，
+        任意一项变化都会得到不同的键
+        """
+        payload = {
+            "service": service,
+            "provider": provider,
+            "model": model,
+            "messages": [
+                [role, hashlib.sha256(str(content).encode('utf-8')).hexdigest()]
+                for role, content in map(_message_fields, messages)
+            ],
+            "params": params or {}
+        }
+        raw = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """读取缓存内容，命中时刷新访问时间"""
+        with self._lock:
+            row = self._conn.execute("SELECT content FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, content: str) -> None:
+        """写入缓存内容，超出容量时淘汰最久未访问的条目"""
+        if content is None:
+            return
+        now = time.time()
+        size = len(content.encode('utf-8'))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, content, size, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, content, size, now, now)
+            )
+            self._evict_locked()
+            self._conn.commit()
+
+    def _evict_locked(self) -> None:
+        """按LRU顺序删除条目，直到总大小低于目标容量"""
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_size_bytes:
+            return
+
+        target = int(self.max_size_bytes * self.EVICT_TARGET_RATIO)
+        evicted = 0
+        rows = self._conn.execute("SELECT key, size FROM responses ORDER BY last_access ASC").fetchall()
+        for key, size in rows:
+            if total <= target:
+                break
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+            evicted += 1
+        self.logger.info(f"响应缓存超出容量，已淘汰 {evicted} 条记录")
+
+    def stats(self) -> Dict[str, int]:
+        """获取缓存统计信息"""
+        with self._lock:
+            entries, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": entries,
+            "size_bytes": size
+        }
+
+    def clear(self) -> None:
+        """清空缓存"""
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+            self.hits = 0
+            self.misses = 0
+
+    def close(self) -> None:
+        """关闭数据库连接"""
+        with self._lock:
+            self._conn.close()
+
+
+_shared_cache: Optional[ResponseCache] = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """根据配置获取全局共享的响应缓存，未启用时返回None"""
+    global _shared_cache
+    cache_config = ConfigManager().get_config().get("response_cache", {})
+    if not cache_config.get("enabled", False):
+        return None
+
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            db_path = cache_config.get("path", os.path.join("cache", "llm_responses.sqlite"))
+            if not os.path.isabs(db_path):
+                db_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), db_path)
+            max_size_mb = cache_config.get("max_size_mb", 512)
+            _shared_cache = ResponseCache(db_path, int(max_size_mb * 1024 * 1024))
+        return _shared_cache
+
+
+def _cache_key_for(service, messages, args, kwargs) -> Optional[str]:
+    """为一次send_message调用生成缓存键，不可缓存时返回None"""
+    if getattr(service, "response_cache", None) is None:
+        return None
+    # 流式响应和带附件的消息不缓存
+    if kwargs.get("stream"):
+        return None
+    if any(getattr(msg, "attachments", None) for msg in messages):
+        return None
+
+    model = kwargs.get("model") or (args[0] if args else None) \
+        or getattr(service, "default_model", None)
+    params = {k: v for k, v in kwargs.items() if k not in ("model", "stream")}
+    return ResponseCache.make_key(
+        getattr(service, "service_name", type(service).__name__),
+        getattr(service, "current_provider", None) or getattr(service, "provider_name", None),
+        model,
+        messages,
+        params
+    )
+
+
+def _store(cache: ResponseCache, key: str, response: Any) -> None:
+    """从响应中提取文本并写入缓存，无法提取时跳过"""
+    try:
+        cache.put(key, extract_response_content(response))
+    except (ValueError, KeyError, IndexError, TypeError) as e:
+        cache.logger.warning(f"响应无法缓存: {str(e)}")
+
+
+def cached_response(send_message):
+    """AIService.send_message / send_message_async 的缓存装饰器
+
+    命中时通过service._wrap_cached_content把缓存文本还原为该服务的响应格式，
+    未命中时调用原方法并从响应中提取文本写入缓存
+    """
+    if inspect.iscoroutinefunction(send_message):
+        @functools.wraps(send_message)
+        async def async_wrapper(self, messages, *args, **kwargs):
+            key = _cache_key_for(self, messages, args, kwargs)
+            if key is not None:
+                content = self.response_cache.get(key)
+                if content is not None:
+                    return self._wrap_cached_content(content)
+            response = await send_message(self, messages, *args, **kwargs)
+            if key is not None:
+                _store(self.response_cache, key, response)
+            return response
+        return async_wrapper
+
+    @functools.wraps(send_message)
+    def wrapper(self, messages, *args, **kwargs):
+        key = _cache_key_for(self, messages, args, kwargs)
+        if key is not None:
+            content = self.response_cache.get(key)
+            if content is not None:
+                return self._wrap_cached_content(content)
+        response = send_message(self, messages, *args, **kwargs)
+        if key is not None:
+            _store(self.response_cache, key, response)
+        return response
+    return wrapper
+
+
+def cached_stream(stream_message):
+    """AIService.stream_message 的缓存装饰器
+
+    与send_message共用缓存键：命中时把缓存文本作为一段返回，
+    未命中时边转发增量片段边拼接，流完整结束后写入缓存，中途失败或被关闭时不缓存
+    """
+    @functools.wraps(stream_message)
+    def wrapper(self, messages, *args, **kwargs):
+        key = _cache_key_for(self, messages, args, kwargs)
+        if key is not None:
+            content = self.response_cache.get(key)
+            if content is not None:
+                yield content
+                return
+        parts = []
+        for delta in stream_message(self, messages, *args, **kwargs):
+            parts.append(delta)
+            yield delta
+        if key is not None and parts:
+            self.response_cache.put(key, "".join(parts))
+    return wrapper
@@ -0,0 +1,178 @@
+"""
+请求重试
+区分可重试的临时错误（超时、连接中断、429、5xx）和不可重试的错误，
+按指数退避加随机抖动重试，所有重试都限制在总时限之内
+"""
+import asyncio
+import functools
+import inspect
+import random
+import time
+from typing import Iterator, Optional
+from core.cancellation import AnalysisCancelled, cancellable_sleep
+from utils.config_manager import ConfigManager
+from utils.logger import Logger
+from .rate_limiter import parse_retry_after
+
+# 可重试的HTTP状态码
+RETRYABLE_STATUS_CODES = {408, 409, 425, 429, 500, 502, 503, 504}
+# 可重试的异常类名：openai、httpx和requests的超时与连接错误，以及内置的超时和连接错误。
+# 按类名匹配，不需要导入这些可选的依赖
+RETRYABLE_ERROR_NAMES = {
+    "APITimeoutError", "APIConnectionError",  # openai
+    "TimeoutException", "NetworkError", "RemoteProtocolError",  # httpx
+    "Timeout", "ChunkedEncodingError",  # requests
+    "TimeoutError", "ConnectionError",  # 内置，包括ConnectionResetError，也匹配requests.ConnectionError
+}
+
+
+def _error_chain(error: BaseException) -> Iterator[BaseException]:
+    """遍历异常及其__cause__/__context__，服务层把原始异常包装成了Exception"""
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        yield error
+        error = error.__cause__ or error.__context__
+
+
+def _status_code(error: BaseException) -> Optional[int]:
+    """获取异常对应的HTTP状态码（openai.APIStatusError、httpx.HTTPStatusError、requests.HTTPError）"""
+    status = getattr(error, "status_code", None)
+    if isinstance(status, int):
+        return status
+    response = getattr(error, "response", None)
+    status = getattr(response, "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def is_retryable(error: BaseException) -> bool:
+    """判断错误是否为可重试的临时错误"""
+    for item in _error_chain(error):
+        if isinstance(item, AnalysisCancelled):
+            return False
+        status = _status_code(item)
+        if status is not None:
+            return status in RETRYABLE_STATUS_CODES
+        if any(cls.__name__ in RETRYABLE_ERROR_NAMES for cls in type(item).__mro__):
+            return True
+    return False
+
+
+def _retry_after(error: BaseException) -> Optional[float]:
+    """读取错误响应中的Retry-After"""
+    for item in _error_chain(error):
+        headers = getattr(getattr(item, "response", None), "headers", None)
+        if headers is not None:
+            return parse_retry_after(headers)
+    return None
+
+
+class RetryPolicy:
+    """指数退避重试策略
+
+    第n次重试前等待 [0, min(max_delay, base_delay * 2^(n-1))] 之间的随机时长（full jitter），
+    服务器返回Retry-After时至少等待该时长；总耗时超过deadline时不再重试
+    """
+
+    DEFAULT_MAX_ATTEMPTS = 4
+    DEFAULT_BASE_DELAY = 1.0
+    DEFAULT_MAX_DELAY = 30.0
+    DEFAULT_DEADLINE = 300.0
+
+    def __init__(self, max_attempts: int = DEFAULT_MAX_ATTEMPTS, base_delay: float = DEFAULT_BASE_DELAY,
+                 max_delay: float = DEFAULT_MAX_DELAY, deadline: Optional[float] = DEFAULT_DEADLINE):
+        """初始化重试策略
+
+        Args:
+            max_attempts: 最多尝试次数（包括第一次请求）
+            base_delay: 首次重试的最大等待秒数
+            max_delay: 单次等待的上限秒数
+            deadline: 从第一次请求开始的总时限秒数，为None时不限制
+        """
+        self.max_attempts = max(1, int(max_attempts))
+        self.base_delay = float(base_delay)
+        self.max_delay = float(max_delay)
+        self.deadline = deadline
+        self.logger = Logger.create_logger('retry_policy')
+
+    def next_delay(self, attempt: int, error: BaseException, started: float) -> Optional[float]:
+        """计算第attempt次请求失败后的等待秒数，不应重试时返回None"""
+        if attempt >= self.max_attempts or not is_retryable(error):
+            return None
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+        retry_after = _retry_after(error)
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.max_delay))
+        if self.deadline is not None and time.monotonic() + delay - started > self.deadline:
+            return None
+        return delay
+
+    def _log_retry(self, label: str, attempt: int, delay: float, error: BaseException):
+        self.logger.warning(
+            f"{label} 第{attempt}次请求失败，{delay:.1f}秒后重试 "
+            f"({attempt + 1}/{self.max_attempts}): {str(error)}"
+        )
+
+    def call(self, func, *args, label: str = "request", **kwargs):
+        """调用func，遇到可重试的错误时按策略重试"""
+        started = time.monotonic()
+        attempt = 1
+        while True:
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                delay = self.next_delay(attempt, e, started)
+                if delay is None:
+                    raise
+                self._log_retry(label, attempt, delay, e)
+            # 在取消范围内等待时，取消后立即结束等待
+            cancellable_sleep(delay)
+            attempt += 1
+
+    async def call_async(self, func, *args, label: str = "request", **kwargs):
+        """异步调用func，遇到可重试的错误时按策略重试"""
+        started = time.monotonic()
+        attempt = 1
+        while True:
+            try:
+                return await func(*args, **kwargs)
+            except Exception as e:
+                delay = self.next_delay(attempt, e, started)
+                if delay is None:
+                    raise
+                self._log_retry(label, attempt, delay, e)
+            await asyncio.sleep(delay)
+            attempt += 1
+
+
+def get_retry_policy() -> RetryPolicy:
+    """根据配置retry创建重试策略"""
+    retry_config = ConfigManager().get_config().get("retry", {})
+    return RetryPolicy(
+        max_attempts=retry_config.get("max_attempts", RetryPolicy.DEFAULT_MAX_ATTEMPTS),
+        base_delay=retry_config.get("base_delay", RetryPolicy.DEFAULT_BASE_DELAY),
+        max_delay=retry_config.get("max_delay", RetryPolicy.DEFAULT_MAX_DELAY),
+        deadline=retry_config.get("deadline_seconds", RetryPolicy.DEFAULT_DEADLINE)
+    )
+
+
+def with_retry(send_message):
+    """AIService.send_message / send_message_async 的重试装饰器
+
+    放在cached_response之内、rate_limited之外，每次重试都重新等待限流配额。
+    流式请求返回的是生成器，只重试建立连接的阶段
+    """
+    if inspect.iscoroutinefunction(send_message):
+        @functools.wraps(send_message)
+        async def async_wrapper(self, messages, *args, **kwargs):
+            policy = getattr(self, "retry_policy", None) or get_retry_policy()
+            return await policy.call_async(send_message, self, messages, *args,
+                                           label=getattr(self, "service_name", type(self).__name__), **kwargs)
+        return async_wrapper
+
+    @functools.wraps(send_message)
+    def wrapper(self, messages, *args, **kwargs):
+        policy = getattr(self, "retry_policy", None) or get_retry_policy()
+        return policy.call(send_message, self, messages, *args,
+                           label=getattr(self, "service_name", type(self).__name__), **kwargs)
+    return wrapper
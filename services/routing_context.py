@@ -0,0 +1,76 @@
+"""
+路由上下文
+记录经过ServiceRouter和LoadBalancer的请求实际由哪个服务返回结果，
+任务日志据此记录真正生成结果的服务和模型
+"""
+from contextvars import ContextVar
+from typing import Any, List
+from utils.logger import Logger
+
+# 当前线程（或异步任务）中最近一次经过路由的请求实际返回结果的服务
+_answered_by: ContextVar = ContextVar("answered_by", default=None)
+
+
+def reset_answered():
+    """发送请求前清除记录，避免沿用上一次请求的结果"""
+    _answered_by.set(None)
+
+
+def mark_answered(service: Any):
+    """记录实际返回结果的服务；内层的路由或负载均衡器已记录更具体的服务时保留"""
+    if _answered_by.get() is None:
+        _answered_by.set(service)
+
+
+def set_answered(service: Any):
+    """覆盖记录，对冲等在其他线程或任务中完成的请求由调用方写回"""
+    _answered_by.set(service)
+
+
+def current_answered() -> Any:
+    return _answered_by.get()
+
+
+def _nested_services(ai_service) -> List[Any]:
+    # 路由和负载均衡器把未定义的属性转发给主服务，只查看实例自身的属性
+    return getattr(ai_service, "__dict__", {}).get("services") or []
+
+
+def answering_service(ai_service) -> Any:
+    """返回最近一次通过ai_service发出的请求实际使用的服务
+
+    需在发出请求的同一线程或异步任务中调用；ai_service不是路由或负载均衡器时返回其本身
+    """
+    if not _nested_services(ai_service):
+        return ai_service
+    answered = _answered_by.get()
+    return answered if answered is not None else ai_service
+
+
+def candidate_services(ai_service) -> List[Any]:
+    """展开路由和负载均衡器，返回可能返回结果的所有服务，主服务在前"""
+    nested = _nested_services(ai_service)
+    if not nested:
+        return [ai_service]
+    services = []
+    for service in nested:
+        for candidate in candidate_services(service):
+            if candidate not in services:
+                services.append(candidate)
+    return services
+
+
+async def aclose_async_clients(ai_service):
+    """关闭ai_service在当前事件循环中创建的异步客户端，经过路由或负载均衡时关闭所有后端的客户端
+
+    在事件循环结束前调用；关闭失败只记录日志，不影响调用方
+    """
+    for service in candidate_services(ai_service):
+        close = getattr(service, "aclose_async_clients", None)
+        if close is None:
+            continue
+        try:
+            await close()
+        except Exception as e:
+            Logger.create_logger('service_router').warning(
+                f"关闭 {getattr(service, 'service_name', type(service).__name__)} 的异步客户端失败: {str(e)}")
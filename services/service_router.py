@@ -0,0 +1,298 @@
+"""
+服务路由
+按配置的顺序在多个AI服务之间故障转移，并可在主服务响应慢于其p95延迟时
+向下一个服务发送对冲请求，取先返回的结果，降低大批量分析的尾部延迟
+"""
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Iterable, Iterator, List, Optional
+from core.analysis_prompts import extract_response_content
+from core.cancellation import AnalysisCancelled
+from utils.config_manager import ConfigManager
+from utils.logger import Logger
+from .retry_policy import is_retryable
+from .routing_context import current_answered, mark_answered, reset_answered, set_answered
+
+
+class LatencyTracker:
+    """记录最近若干次成功请求的耗时，计算分位数"""
+
+    # 保留的最近样本数
+    WINDOW = 200
+    # 低于该耗时的请求（缓存命中等本地返回）不计入
+    MIN_SAMPLE_SECONDS = 0.05
+
+    def __init__(self):
+        self._samples = deque(maxlen=self.WINDOW)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        if seconds >= self.MIN_SAMPLE_SECONDS:
+            with self._lock:
+                self._samples.append(seconds)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, percent: float) -> Optional[float]:
+        """返回耗时的分位数，没有样本时返回None"""
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        index = min(len(samples) - 1, max(0, int(round(percent / 100 * len(samples))) - 1))
+        return samples[index]
+
+
+class ServiceRouter:
+    """在多个AI服务之间路由请求
+
+    services[0]为主服务，其余按故障转移顺序排列。请求因临时错误失败时（重试用尽后）依次换用下一个服务，
+    认证失败、请求错误等不可重试的错误直接抛出；
+    开启对冲时，主服务的请求超过其p95延迟（不少于hedge_min_delay）仍未返回，
+    就向下一个服务发送相同请求，取先成功返回的结果，较慢的请求结果被丢弃。
+    未定义的属性（service_name、default_model等）转发给主服务，调用方可以像使用单个服务一样使用；
+    实际返回结果的服务通过routing_context.answering_service获取
+    """
+
+    DEFAULT_HEDGE_PERCENTILE = 95.0
+    DEFAULT_HEDGE_MIN_SAMPLES = 20
+    DEFAULT_HEDGE_MIN_DELAY = 5.0
+
+    def __init__(self, services: List[Any], hedge: bool = False,
+                 hedge_percentile: float = DEFAULT_HEDGE_PERCENTILE,
+                 hedge_min_samples: int = DEFAULT_HEDGE_MIN_SAMPLES,
+                 hedge_min_delay: float = DEFAULT_HEDGE_MIN_DELAY):
+        """初始化服务路由
+
+        Args:
+            services: 按优先级排列的AI服务实例，第一个为主服务
+            hedge: 是否发送对冲请求
+            hedge_percentile: 触发对冲的主服务延迟分位数
+            hedge_min_samples: 主服务的延迟样本数达到该值后才开始对冲
+            hedge_min_delay: 对冲等待时长的下限（秒）
+        """
+        if not services:
+            raise ValueError("至少需要一个AI服务")
+        self.services = list(services)
+        self.hedge = hedge and len(self.services) > 1
+        self.hedge_percentile = float(hedge_percentile)
+        self.hedge_min_samples = max(1, int(hedge_min_samples))
+        self.hedge_min_delay = float(hedge_min_delay)
+        self.latencies = [LatencyTracker() for _ in self.services]
+        self.failovers = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self._stats_lock = threading.Lock()
+        self.logger = Logger.create_logger('service_router')
+
+    @property
+    def primary(self):
+        return self.services[0]
+
+    def __getattr__(self, name):
+        # 只在常规属性查找失败时调用，services尚未设置时不转发，避免递归
+        if name == "services":
+            raise AttributeError(name)
+        return getattr(self.services[0], name)
+
+    def _name(self, index: int) -> str:
+        service = self.services[index]
+        return getattr(service, "service_name", type(service).__name__)
+
+    def hedge_delay(self) -> Optional[float]:
+        """对冲前等待主服务的秒数，未开启对冲或样本不足时返回None"""
+        if not self.hedge or len(self.latencies[0]) < self.hedge_min_samples:
+            return None
+        return max(self.hedge_min_delay, self.latencies[0].percentile(self.hedge_percentile))
+
+    def _count(self, name: str):
+        with self._stats_lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def stats(self) -> dict:
+        """路由统计"""
+        return {
+            "failovers": self.failovers,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "p95": {self._name(i): tracker.percentile(95) for i, tracker in enumerate(self.latencies)},
+        }
+
+    def _call(self, index: int, messages, args, kwargs):
+        """向第index个服务发送请求，返回(响应, 实际返回结果的服务)"""
+        started = time.monotonic()
+        reset_answered()
+        response = self.services[index].send_message(messages, *args, **kwargs)
+        self.latencies[index].record(time.monotonic() - started)
+        mark_answered(self.services[index])
+        return response, current_answered()
+
+    def _should_fail_over(self, index: int, error: Exception) -> bool:
+        """只有临时错误且还有备用服务时才故障转移"""
+        return is_retryable(error) and index + 1 < len(self.services)
+
+    def _send_with_failover(self, start: int, messages, args, kwargs):
+        """从第start个服务开始依次尝试，返回第一个成功的(响应, 服务)"""
+        for index in range(start, len(self.services)):
+            try:
+                return self._call(index, messages, args, kwargs)
+            except AnalysisCancelled:
+                raise
+            except Exception as e:
+                if not self._should_fail_over(index, e):
+                    raise
+                self._count("failovers")
+                self.logger.warning(f"{self._name(index)} 请求失败，切换到 {self._name(index + 1)}: {str(e)}")
+
+    def send_message(self, messages, *args, **kwargs):
+        """发送消息，失败时故障转移，开启对冲时主服务过慢则发送对冲请求"""
+        delay = None if kwargs.get("stream") else self.hedge_delay()
+        if delay is None:
+            response, answered = self._send_with_failover(0, messages, args, kwargs)
+            set_answered(answered)
+            return response
+
+        executor = ThreadPoolExecutor(max_workers=2)
+        try:
+            primary = executor.submit(self._send_with_failover, 0, messages, args, kwargs)
+            done, _ = wait([primary], timeout=delay)
+            if done:
+                response, answered = primary.result()
+                set_answered(answered)
+                return response
+
+            self._count("hedges")
+            self.logger.info(f"{self._name(0)} 超过{delay:.1f}秒未返回，向 {self._name(1)} 发送对冲请求")
+            hedge = executor.submit(self._send_with_failover, 1, messages, args, kwargs)
+            pending = {primary, hedge}
+            last_error = None
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future.exception() is None:
+                        if future is hedge:
+                            self._count("hedge_wins")
+                        response, answered = future.result()
+                        set_answered(answered)
+                        return response
+                    last_error = future.exception()
+            raise last_error
+        finally:
+            # 较慢的请求无法中断，在后台结束后丢弃其结果
+            executor.shutdown(wait=False)
+
+    def stream_message(self, messages, *args, **kwargs) -> Iterator[str]:
+        """流式发送消息，收到第一段文本之前因临时错误失败时故障转移，之后的中断直接抛出"""
+        for index, service in enumerate(self.services):
+            started = False
+            reset_answered()
+            try:
+                if hasattr(service, "stream_message"):
+                    stream = service.stream_message(messages, *args, **kwargs)
+                else:
+                    stream = iter([extract_response_content(service.send_message(messages, *args, **kwargs))])
+                for delta in stream:
+                    started = True
+                    yield delta
+                mark_answered(service)
+                return
+            except AnalysisCancelled:
+                raise
+            except Exception as e:
+                if started or not self._should_fail_over(index, e):
+                    raise
+                self._count("failovers")
+                self.logger.warning(f"{self._name(index)} 流式请求失败，切换到 {self._name(index + 1)}: {str(e)}")
+
+    async def _call_async(self, index: int, messages, args, kwargs):
+        started = time.monotonic()
+        reset_answered()
+        response = await self.services[index].send_message_async(messages, *args, **kwargs)
+        self.latencies[index].record(time.monotonic() - started)
+        mark_answered(self.services[index])
+        return response, current_answered()
+
+    async def _send_with_failover_async(self, start: int, messages, args, kwargs):
+        for index in range(start, len(self.services)):
+            try:
+                return await self._call_async(index, messages, args, kwargs)
+            except (AnalysisCancelled, asyncio.CancelledError):
+                raise
+            except Exception as e:
+                if not self._should_fail_over(index, e):
+                    raise
+                self._count("failovers")
+                self.logger.warning(f"{self._name(index)} 异步请求失败，切换到 {self._name(index + 1)}: {str(e)}")
+
+    async def send_message_async(self, messages, *args, **kwargs):
+        """异步发送消息，对冲时较慢的请求被取消"""
+        delay = self.hedge_delay()
+        if delay is None:
+            response, answered = await self._send_with_failover_async(0, messages, args, kwargs)
+            set_answered(answered)
+            return response
+
+        primary = asyncio.ensure_future(self._send_with_failover_async(0, messages, args, kwargs))
+        pending = {primary}
+        try:
+            done, pending = await asyncio.wait(pending, timeout=delay)
+            if done:
+                response, answered = primary.result()
+                set_answered(answered)
+                return response
+
+            self._count("hedges")
+            self.logger.info(f"{self._name(0)} 超过{delay:.1f}秒未返回，向 {self._name(1)} 发送对冲请求")
+            hedge = asyncio.ensure_future(self._send_with_failover_async(1, messages, args, kwargs))
+            pending = {primary, hedge}
+            last_error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self._count("hedge_wins")
+                        response, answered = task.result()
+                        set_answered(answered)
+                        return response
+                    last_error = task.exception()
+            raise last_error
+        finally:
+            for task in pending:
+                task.cancel()
+
+
+def create_service_router(primary, services: Iterable[Any]):
+    """根据配置routing为主服务创建路由
+
+    配置routing.failover按服务名（如"grok"）给出故障转移顺序，主服务之外列出的服务依次作为备用；
+    默认为空，不会把文档发送给所选服务之外的服务。没有备用服务时直接返回主服务
+
+    Args:
+        primary: 当前选择的AI服务实例
+        services: 所有可用的AI服务实例
+    """
+    routing_config = ConfigManager().get_config().get("routing", {})
+    by_name = {getattr(service, "service_name", None): service for service in services}
+    primary_name = getattr(primary, "service_name", None)
+    fallbacks = []
+    for name in routing_config.get("failover", []):
+        service = by_name.get(name)
+        # 主服务可能是同名服务的负载均衡器，按服务名排除
+        if service is not None and name != primary_name and service not in fallbacks:
+            fallbacks.append(service)
+    if not fallbacks:
+        return primary
+
+    hedge_config = routing_config.get("hedge", {})
+    return ServiceRouter(
+        [primary] + fallbacks,
+        hedge=hedge_config.get("enabled", False),
+        hedge_percentile=hedge_config.get("percentile", ServiceRouter.DEFAULT_HEDGE_PERCENTILE),
+        hedge_min_samples=hedge_config.get("min_samples", ServiceRouter.DEFAULT_HEDGE_MIN_SAMPLES),
+        hedge_min_delay=hedge_config.get("min_delay", ServiceRouter.DEFAULT_HEDGE_MIN_DELAY)
+    )
@@ -0,0 +1,272 @@
+import unittest
+import os
+import shutil
+import tempfile
+import asyncio
+import threading
+import time
+from services.message_types import Message
+from core.text_chunker import TextChunk
+from core.analysis_pipeline import AnalysisPipeline, resolve_source_path
+from core.cancellation import AnalysisCancelled, CancellationToken, close_on_cancel
+from core.result_writer import get_result_path
+from core.result_writer import read_analysis_result
+from utils.job_journal import JobJournal
+
+
+class FakeService:
+    """返回请求序号的AI服务"""
+
+    def __init__(self):
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def send_message(self, messages):
+        with self._lock:
+            self.calls.append(messages)
+            return Message(role="assistant", content=f"结果{len(self.calls)}")
+
+
+class BlockingService(FakeService):
+    """请求一直阻塞直到release()，模拟卡住的HTTP请求"""
+
+    def __init__(self):
+        super().__init__()
+        self.started = threading.Event()
+        self.released = threading.Event()
+
+    def send_message(self, messages):
+        self.started.set()
+        self.released.wait(5)
+        return super().send_message(messages)
+
+
+class StreamingService(FakeService):
+    """分段返回结果的AI服务"""
+
+    def stream_message(self, messages):
+        content = self.send_message(messages).content
+        yield from (content[:1], content[1:])
+
+
+class AbortableService(FakeService):
+    """异步请求一直挂起，记录请求任务是否被取消，模拟可中止的HTTP请求"""
+
+    def __init__(self):
+        super().__init__()
+        self.started = threading.Event()
+        self.aborted = threading.Event()
+
+    async def send_message_async(self, messages):
+        self.started.set()
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            self.aborted.set()
+            raise
+        return self.send_message(messages)
+
+
+class HangingStream:
+    """返回第一段后一直等待，close()后读取出错，模拟关闭连接后中断的响应流"""
+
+    def __init__(self):
+        self.closed = threading.Event()
+
+    def __iter__(self):
+        yield "部分"
+        self.closed.wait(5)
+        raise ConnectionError("连接已关闭")
+
+    def close(self):
+        self.closed.set()
+
+
+class HangingStreamService(FakeService):
+    """与服务实现一样，在取消时关闭响应流"""
+
+    def __init__(self):
+        super().__init__()
+        self.stream = HangingStream()
+
+    def stream_message(self, messages):
+        with close_on_cancel(self.stream.close):
+            yield from self.stream
+
+
+class TestCancellationToken(unittest.TestCase):
+    def test_callbacks(self):
+        """测试取消时调用回调，取消后注册的回调立即调用，已移除的回调不调用"""
+        token = CancellationToken()
+        calls = []
+        token.add_callback(lambda: calls.append("a"))
+        removed = lambda: calls.append("removed")
+        token.add_callback(removed)
+        token.remove_callback(removed)
+        token.cancel()
+        token.cancel()
+        token.add_callback(lambda: calls.append("b"))
+        self.assertEqual(calls, ["a", "b"])
+        with self.assertRaises(AnalysisCancelled):
+            token.raise_if_cancelled()
+
+
+class TestAnalysisPipeline(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.pdf_path = os.path.join(self.temp_dir, "paper.pdf")
+        with open(self.pdf_path, 'wb') as f:
+            f.write(b"%PDF")
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_single_chunk(self):
+        """测试只有一个文本块时直接使用其结果并保存"""
+        service = FakeService()
+        pipeline = AnalysisPipeline(service, "分析", chunk_concurrency=2)
+        record = pipeline.analyze_file(self.pdf_path, [TextChunk("正文", 1, 1)])
+        self.assertEqual(len(service.calls), 1)
+        self.assertEqual(record["content"], "结果1")
+        self.assertEqual(read_analysis_result(self.pdf_path), "结果1")
+
+    def test_map_reduce_with_callbacks(self):
+        """测试多个文本块并发分析后合并，并通过回调报告进度"""
+        service = FakeService()
+        statuses, progress = [], []
+        pipeline = AnalysisPipeline(service, "分析", chunk_concurrency=2, on_status=statuses.append,
+                                    on_chunk_completed=lambda *args: progress.append(args))
+        chunks = [TextChunk(f"第{i}部分", i, i) for i in range(1, 4)]
+        record = pipeline.analyze_file(self.pdf_path, chunks)
+        self.assertEqual(len(service.calls), 4)
+        self.assertEqual(record["content"], "结果4")
+        self.assertEqual(sorted(number for _, number, _ in progress), [1, 2, 3])
+        self.assertTrue(all(total == 3 for _, _, total in progress))
+        self.assertTrue(any("Generating final summary" in message for message in statuses))
+
+    def test_streams_final_analysis(self):
+        """测试只流式返回最终分析：单个文本块流式返回该块，多个块只流式返回合并请求"""
+        partials = []
+        pipeline = AnalysisPipeline(StreamingService(), "分析", chunk_concurrency=2,
+                                    on_partial_text=lambda *args: partials.append(args))
+        record = pipeline.analyze_file(self.pdf_path, [TextChunk("正文", 1, 1)])
+        self.assertEqual(partials, [(self.pdf_path, "结"), (self.pdf_path, "果1")])
+        self.assertEqual(record["content"], "结果1")
+
+        partials.clear()
+        chunks = [TextChunk(f"第{i}部分", i, i) for i in range(1, 4)]
+        record = pipeline.analyze_file(self.pdf_path, chunks)
+        self.assertEqual("".join(text for _, text in partials), record["content"])
+        self.assertEqual(record["content"], "结果5")
+
+    def test_streams_single_chunk_of_unknown_total(self):
+        """测试边读取边分块、总块数未知时，只有一个块也流式返回"""
+        partials = []
+        pipeline = AnalysisPipeline(StreamingService(), "分析",
+                                    on_partial_text=lambda *args: partials.append(args))
+        record = pipeline.analyze_file(self.pdf_path, iter([TextChunk("正文", 1, 1)]))
+        self.assertEqual(partials, [(self.pdf_path, "结"), (self.pdf_path, "果1")])
+        self.assertEqual(record["content"], "结果1")
+
+        partials.clear()
+        record = pipeline.analyze_file(self.pdf_path, iter([TextChunk(f"第{i}部分", i, i) for i in range(1, 4)]))
+        self.assertEqual("".join(text for _, text in partials), record["content"])
+        self.assertEqual(record["content"], "结果5")
+
+    def test_resume_from_journal(self):
+        """测试已记录的文本块不再请求，文件完成后直接恢复结果"""
+        chunks = [TextChunk(f"第{i}部分", i, i) for i in range(1, 4)]
+        journal = JobJournal(self.temp_dir)
+        first = AnalysisPipeline(FakeService(), "分析", chunk_concurrency=1, journal=journal)
+        journal.record_chunk(self.pdf_path, first.job_key, 1, "第1部分", "已完成")
+
+        service = FakeService()
+        pipeline = AnalysisPipeline(service, "分析", chunk_concurrency=1, journal=JobJournal(self.temp_dir))
+        record = pipeline.analyze_file(self.pdf_path, chunks)
+        self.assertEqual(len(service.calls), 3)
+        self.assertIn("已完成", service.calls[-1][-1].content)
+
+        resumed_service = FakeService()
+        resumed = AnalysisPipeline(resumed_service, "分析", journal=JobJournal(self.temp_dir))
+        self.assertEqual(resumed.analyze_file(self.pdf_path, chunks)["content"], record["content"])
+        self.assertEqual(resumed_service.calls, [])
+
+        changed = AnalysisPipeline(FakeService(), "新的分析指令", journal=JobJournal(self.temp_dir))
+        self.assertNotEqual(changed.job_key, pipeline.job_key)
+
+    def test_cancel_returns_without_waiting(self):
+        """测试取消后不等待在途请求立即返回，且不写入结果文件"""
+        service = BlockingService()
+        pipeline = AnalysisPipeline(service, "分析", chunk_concurrency=2)
+        chunks = [TextChunk(f"第{i}部分", i, i) for i in range(1, 4)]
+        errors = []
+
+        def run():
+            try:
+                pipeline.analyze_file(self.pdf_path, chunks)
+            except AnalysisCancelled as e:
+                errors.append(e)
+
+        worker = threading.Thread(target=run)
+        worker.start()
+        self.assertTrue(service.started.wait(5))
+        started = time.monotonic()
+        pipeline.cancel()
+        worker.join(5)
+        try:
+            self.assertFalse(worker.is_alive())
+            self.assertLess(time.monotonic() - started, 1)
+            self.assertEqual(len(errors), 1)
+            self.assertFalse(os.path.exists(get_result_path(self.pdf_path)))
+        finally:
+            service.released.set()
+
+    def _cancel_while_running(self, pipeline, chunks, started: threading.Event):
+        """在另一个线程中分析，started后取消，返回(是否抛出AnalysisCancelled, 取消后的耗时)"""
+        errors = []
+
+        def run():
+            try:
+                pipeline.analyze_file(self.pdf_path, chunks)
+            except AnalysisCancelled as e:
+                errors.append(e)
+
+        worker = threading.Thread(target=run)
+        worker.start()
+        self.assertTrue(started.wait(5))
+        cancelled_at = time.monotonic()
+        pipeline.cancel()
+        worker.join(5)
+        self.assertFalse(worker.is_alive())
+        return len(errors) == 1, time.monotonic() - cancelled_at
+
+    def test_cancel_aborts_request(self):
+        """测试取消时在途的异步请求任务被取消，而不只是不再等待"""
+        service = AbortableService()
+        pipeline = AnalysisPipeline(service, "分析")
+        cancelled, elapsed = self._cancel_while_running(pipeline, [TextChunk("全文", 1, 1)], service.started)
+        self.assertTrue(cancelled)
+        self.assertLess(elapsed, 1)
+        self.assertTrue(service.aborted.wait(1))
+        self.assertEqual(service.calls, [])
+
+    def test_cancel_closes_stream(self):
+        """测试取消时关闭正在读取的响应流"""
+        service = HangingStreamService()
+        received = threading.Event()
+        pipeline = AnalysisPipeline(service, "分析", on_partial_text=lambda path, delta: received.set())
+        cancelled, elapsed = self._cancel_while_running(pipeline, [TextChunk("全文", 1, 1)], received)
+        self.assertTrue(cancelled)
+        self.assertLess(elapsed, 1)
+        self.assertTrue(service.stream.closed.is_set())
+        self.assertFalse(os.path.exists(get_result_path(self.pdf_path)))
+
+    def test_resolve_source_path(self):
+        """测试._前缀文件替换为原始文件，文件不存在时抛出异常"""
+        self.assertEqual(resolve_source_path(os.path.join(self.temp_dir, "._paper.pdf")), self.pdf_path)
+        with self.assertRaises(FileNotFoundError):
+            resolve_source_path(os.path.join(self.temp_dir, "missing.pdf"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,154 @@
+import unittest
+import importlib.util
+import os
+import shutil
+import tempfile
+import threading
+from services.message_types import Message
+from core.text_chunker import TextChunk
+
+HAS_PYQT = importlib.util.find_spec("PyQt6") is not None
+if HAS_PYQT:
+    from PyQt6.QtCore import QCoreApplication, QEventLoop, QTimer
+    from threads.analysis_scheduler import AnalysisScheduler
+
+
+class GatedService:
+    """请求阻塞到release()后才返回的AI服务，记录请求的文件顺序和同时在途的最大请求数"""
+    service_name = "fake"
+    default_model = "fake-model"
+
+    def __init__(self, provider_name):
+        self.provider_name = provider_name
+        self.files = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.started = threading.Event()
+        self.released = threading.Event()
+        self._lock = threading.Lock()
+
+    def release(self):
+        self.released.set()
+
+    def send_message(self, messages):
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            self.files.append(messages[-1].content.split("文件:", 1)[1].split()[0])
+        self.started.set()
+        self.released.wait(5)
+        with self._lock:
+            self.in_flight -= 1
+        return Message(role="assistant", content="结果")
+
+
+class InlineChunks(list):
+    """只有一个文本块的列表，记录是否被调度器关闭"""
+
+    def __init__(self, name):
+        super().__init__([TextChunk(f"文件:{name} 正文", 1, 1)])
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+if HAS_PYQT:
+    class InlineScheduler(AnalysisScheduler):
+        """不启动提取进程池，直接把文件名作为文本块交给请求线程"""
+
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.extracted = {}
+
+        def _start_extraction(self, file_path, ai_service):
+            name = os.path.splitext(os.path.basename(file_path))[0]
+            self.extracted[name] = InlineChunks(name)
+            return self.extracted[name]
+
+
+@unittest.skipUnless(HAS_PYQT, "需要安装PyQt6")
+class TestAnalysisScheduler(unittest.TestCase):
+    def setUp(self):
+        self.app = QCoreApplication.instance() or QCoreApplication([])
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def _pdf(self, name):
+        pdf_path = os.path.join(self.temp_dir, f"{name}.pdf")
+        with open(pdf_path, 'wb') as f:
+            f.write(b"%PDF")
+        return pdf_path
+
+    def _wait_all_finished(self, scheduler):
+        """运行事件循环直到all_finished，超时时测试失败"""
+        loop = QEventLoop()
+        finished = []
+        scheduler.all_finished.connect(lambda: finished.append(True))
+        scheduler.all_finished.connect(loop.quit)
+        QTimer.singleShot(10000, loop.quit)
+        loop.exec()
+        self.assertTrue(finished, "等待all_finished超时")
+
+    def test_dispatch_in_global_index_order(self):
+        """测试等待中的任务按global_index出队，与提交顺序无关"""
+        service = GatedService("a")
+        scheduler = InlineScheduler(max_concurrent=1, provider_limits={})
+        for global_index, name in [(5, "e"), (3, "c"), (1, "a"), (2, "b")]:
+            scheduler.submit(self._pdf(name), global_index, service, "分析指令")
+        self.assertEqual(scheduler.running_count, 1)
+        self.assertEqual(scheduler.pending_count, 3)
+        service.release()
+        self._wait_all_finished(scheduler)
+        self.assertEqual(service.files, ["e", "a", "b", "c"])
+        self.assertTrue(scheduler.is_idle())
+
+    def test_provider_limit(self):
+        """测试达到上限的提供商的任务继续等待，不占用其他提供商的并发名额"""
+        limited, free = GatedService("a"), GatedService("b")
+        scheduler = InlineScheduler(max_concurrent=3, provider_limits={"fake.a": 1})
+        completed = []
+        scheduler.analysis_completed.connect(lambda file_path, content: completed.append(file_path))
+        for global_index, name in enumerate(["a1", "a2", "a3"]):
+            scheduler.submit(self._pdf(name), global_index, limited, "分析指令")
+        scheduler.submit(self._pdf("b1"), 3, free, "分析指令")
+        self.assertEqual(scheduler.running_count, 2)
+        self.assertEqual(scheduler.pending_count, 2)
+
+        limited.release()
+        free.release()
+        self._wait_all_finished(scheduler)
+        self.assertEqual(limited.files, ["a1", "a2", "a3"])
+        self.assertEqual(limited.max_in_flight, 1)
+        self.assertEqual(len(completed), 4)
+
+    def test_stop_cancels_and_disconnects(self):
+        """测试stop()清空等待队列并关闭其文本块流，被取消线程的结果不再转发"""
+        service = GatedService("a")
+        scheduler = InlineScheduler(max_concurrent=1, provider_limits={})
+        events = []
+        scheduler.analysis_completed.connect(lambda *args: events.append(args))
+        scheduler.error_occurred.connect(lambda *args: events.append(args))
+        scheduler.all_finished.connect(lambda: events.append("all_finished"))
+        for global_index, name in enumerate(["a", "b", "c"]):
+            scheduler.submit(self._pdf(name), global_index, service, "分析指令")
+        self.assertTrue(service.started.wait(5))
+        thread = next(iter(scheduler._running))
+
+        self.assertEqual(scheduler.stop(), 2)
+        self.assertTrue(scheduler.is_idle())
+        self.assertTrue(scheduler.extracted["b"].closed)
+        self.assertTrue(scheduler.extracted["c"].closed)
+
+        service.release()
+        self.assertTrue(thread.wait(5000))
+        self.app.processEvents()
+        self.assertEqual(events, [])
+        self.assertEqual(service.files, ["a"])
+        self.assertEqual(scheduler._stopping, set())
+
+
+if __name__ == '__main__':
+    unittest.main()
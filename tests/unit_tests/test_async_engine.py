@@ -0,0 +1,149 @@
+import unittest
+import asyncio
+import os
+import shutil
+import tempfile
+import threading
+import time
+from services.message_types import Message
+from services.service_router import ServiceRouter
+from core.async_engine import AsyncAnalysisEngine
+from utils.pdf_text_cache import PdfTextCache
+
+
+class FakeAsyncService:
+    """异步返回结果的AI服务，记录同时在途的最大请求数和关闭异步客户端的事件循环；请求内容包含fail_on时返回错误"""
+    service_name = "fake"
+    default_model = "fake-model"
+
+    def __init__(self, delay=0.02, fail_on=None):
+        self.delay = delay
+        self.fail_on = fail_on
+        self.calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.closed_loops = []
+
+    async def send_message_async(self, messages):
+        self.calls += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+            if self.fail_on is not None and self.fail_on in messages[-1].content:
+                raise Exception("API请求失败: 400")
+        finally:
+            self.in_flight -= 1
+        return Message(role="assistant", content=f"结果{self.calls}")
+
+    async def aclose_async_clients(self):
+        self.closed_loops.append(asyncio.get_running_loop())
+
+
+class StreamingAsyncService(FakeAsyncService):
+    """同步流式请求分两段返回结果的AI服务"""
+
+    def stream_message(self, messages):
+        self.calls += 1
+        content = f"结果{self.calls}"
+        yield from (content[:1], content[1:])
+
+
+class TestAsyncAnalysisEngine(unittest.TestCase):
+    def setUp(self):
+        """创建模拟的PDF文件，并把逐页文本写入缓存，提取时不需要解析PDF"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.text_cache = PdfTextCache(self.temp_dir)
+        self.pdf_paths = []
+        for name in ["a", "b", "c"]:
+            pdf_path = os.path.join(self.temp_dir, f"{name}.pdf")
+            with open(pdf_path, 'wb') as f:
+                f.write(f"%PDF {name}".encode())
+            # 每页约40个token，分块上限为50时每页一个块
+            self.text_cache.put(pdf_path, [f"{name}{page} " + "word " * 30 + "\n\n" for page in range(4)])
+            self.pdf_paths.append(pdf_path)
+
+    def tearDown(self):
+        """删除临时目录"""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def _engine(self, service, **kwargs):
+        engine = AsyncAnalysisEngine(service, "分析指令", text_cache=self.text_cache, **kwargs)
+        engine.max_chunk_tokens = 50
+        return engine
+
+    def test_max_in_flight(self):
+        """测试所有文件的请求共享并发上限，结果按输入顺序返回"""
+        service = FakeAsyncService()
+        completed = []
+        engine = self._engine(service, max_in_flight=2,
+                              on_completed=lambda file_path, record: completed.append(file_path))
+        records = engine.run(self.pdf_paths)
+        self.assertEqual([record["file_path"] for record in records], self.pdf_paths)
+        self.assertEqual(sorted(completed), self.pdf_paths)
+        # 每个文件4个块和1次最终分析
+        self.assertEqual(service.calls, 15)
+        self.assertEqual(service.max_in_flight, 2)
+
+    def test_chunk_concurrency(self):
+        """测试单个文件同时在途的分块请求数不超过chunk_concurrency"""
+        service = FakeAsyncService()
+        engine = self._engine(service, max_in_flight=10, chunk_concurrency=2)
+        record = asyncio.run(engine.analyze_file(self.pdf_paths[0]))
+        self.assertEqual(record["content"], "结果5")
+        self.assertEqual(service.max_in_flight, 2)
+
+    def test_error_reported_per_file(self):
+        """测试单个文件失败时通过on_error报告，其他文件继续完成"""
+        errors = []
+        engine = self._engine(FakeAsyncService(fail_on="b2"),
+                              on_error=lambda file_path, message: errors.append((file_path, message)))
+        records = engine.run(self.pdf_paths)
+        self.assertEqual([record["file_path"] for record in records], [self.pdf_paths[0], self.pdf_paths[2]])
+        self.assertEqual(errors, [(self.pdf_paths[1], "API请求失败: 400")])
+
+        errors.clear()
+        records = engine.run([os.path.join(self.temp_dir, "missing.pdf")])
+        self.assertEqual(records, [])
+        self.assertEqual(len(errors), 1)
+
+    def test_cancel_from_other_thread(self):
+        """测试在其他线程中取消时立即中止在途请求，不报告完成或失败"""
+        events = []
+        engine = self._engine(FakeAsyncService(delay=10),
+                              on_completed=lambda *args: events.append(args),
+                              on_error=lambda *args: events.append(args))
+        threading.Timer(0.5, engine.cancel).start()
+        started = time.monotonic()
+        self.assertEqual(engine.run(self.pdf_paths), [])
+        self.assertLess(time.monotonic() - started, 5)
+        self.assertEqual(events, [])
+        self.assertTrue(engine.cancel_token.is_cancelled)
+
+    def test_streams_final_analysis(self):
+        """测试只流式返回最终分析：只有一个块时流式返回该块，多个块时只流式返回合并请求"""
+        single_page = os.path.join(self.temp_dir, "single.pdf")
+        with open(single_page, 'wb') as f:
+            f.write(b"%PDF single")
+        self.text_cache.put(single_page, ["single " + "word " * 30 + "\n\n"])
+        for file_path, content in [(single_page, "结果1"), (self.pdf_paths[0], "结果5")]:
+            partials = []
+            engine = self._engine(StreamingAsyncService(), on_partial_text=lambda *args: partials.append(args))
+            self.assertEqual(engine.run([file_path])[0]["content"], content)
+            self.assertEqual(partials, [(file_path, "结"), (file_path, content[1:])])
+
+    def test_async_clients_closed(self):
+        """测试分析结束后关闭各服务（经过路由时包括备用服务）在本事件循环中创建的异步客户端"""
+        primary, backup = FakeAsyncService(), FakeAsyncService()
+        engine = self._engine(ServiceRouter([primary, backup]))
+        self.assertEqual(len(engine.run(self.pdf_paths[:1])), 1)
+        self.assertEqual(len(primary.closed_loops), 1)
+        self.assertEqual(len(backup.closed_loops), 1)
+
+        engine.run(self.pdf_paths[1:2])
+        self.assertEqual(len(primary.closed_loops), 2)
+        self.assertIsNot(primary.closed_loops[0], primary.closed_loops[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
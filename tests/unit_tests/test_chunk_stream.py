@@ -0,0 +1,88 @@
+import unittest
+import os
+import shutil
+import tempfile
+import threading
+import time
+from services.message_types import Message
+from core.analysis_pipeline import AnalysisPipeline
+from core.cancellation import AnalysisCancelled
+from core.chunk_stream import ChunkStream, create_stream_manager
+from core.pdf_reader import stream_pdf_chunks
+from core.text_chunker import TextChunk
+from utils.pdf_text_cache import PdfTextCache
+
+
+class FakeService:
+    """返回固定结果的AI服务"""
+
+    def send_message(self, messages):
+        return Message(role="assistant", content="结果")
+
+
+class TestChunkStream(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        """启动管理器进程"""
+        cls.manager = create_stream_manager()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.manager.shutdown()
+
+    def setUp(self):
+        """创建临时目录，并把模拟PDF的逐页文本写入缓存，提取时不需要解析PDF"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.pdf_path = os.path.join(self.temp_dir, "paper.pdf")
+        with open(self.pdf_path, 'wb') as f:
+            f.write(b"%PDF-1.4 fake content")
+        PdfTextCache(self.temp_dir).put(self.pdf_path, [f"page {i} " * 50 for i in range(1, 6)])
+
+    def tearDown(self):
+        """删除临时目录"""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_chunks_arrive_while_extracting(self):
+        """测试提取过程中逐块取出，缓冲区满时提取暂停"""
+        stream = ChunkStream(self.manager, buffer_size=1)
+        worker = threading.Thread(target=stream_pdf_chunks,
+                                  args=(stream, self.pdf_path, 60, None, None, self.temp_dir))
+        worker.start()
+        chunks = list(stream)
+        worker.join()
+        self.assertEqual([(chunk.start_page, chunk.end_page) for chunk in chunks],
+                         [(i, i) for i in range(1, 6)])
+
+    def test_error_is_raised_by_consumer(self):
+        """测试提取出错时异常在迭代时抛出"""
+        stream = ChunkStream(self.manager)
+        stream_pdf_chunks(stream, os.path.join(self.temp_dir, "missing.pdf"), 60)
+        with self.assertRaises(Exception):
+            list(stream)
+
+    def test_close_stops_extraction(self):
+        """测试关闭后提取在下一个块之前停止，等待中的请求方抛出AnalysisCancelled"""
+        stream = ChunkStream(self.manager, buffer_size=1)
+        stream.put(TextChunk("text", 1, 1))
+        stream.close()
+        self.assertFalse(stream.put(TextChunk("more", 2, 2)))
+        self.assertEqual(stream_pdf_chunks(stream, self.pdf_path, 60, cache_directory=self.temp_dir), 0)
+        iterator = iter(stream)
+        self.assertEqual(next(iterator).text, "text")
+        with self.assertRaises(AnalysisCancelled):
+            next(iterator)
+
+    def test_pipeline_cancel_while_waiting_for_chunks(self):
+        """测试流水线等待提取进程产出文本块时取消，立即结束而不是一直等待"""
+        stream = ChunkStream(self.manager)
+        pipeline = AnalysisPipeline(FakeService(), "分析指令")
+        threading.Timer(0.1, pipeline.cancel).start()
+        started = time.monotonic()
+        with self.assertRaises(AnalysisCancelled):
+            pipeline.map_chunks(self.pdf_path, stream)
+        self.assertLess(time.monotonic() - started, 2)
+        self.assertTrue(stream.closed.is_set())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,168 @@
+import unittest
+import asyncio
+import contextlib
+import io
+import logging
+import os
+import shutil
+import tempfile
+from unittest.mock import patch
+from services.message_types import Message
+from utils.pdf_text_cache import PdfTextCache
+from utils.file_index_manager import create_file_index_manager
+from core.result_writer import read_analysis_result
+from cli.batch import main
+
+
+class StubService:
+    """按文件记录请求的异步AI服务，请求内容属于fail_on文件时返回错误，属于interrupt_on文件时模拟Ctrl-C"""
+    service_name = "grok"
+    provider_name = "stub"
+    default_model = "stub-model"
+
+    def __init__(self, fail_on=None, interrupt_on=None, delay=0.05):
+        self.fail_on = fail_on
+        self.interrupt_on = interrupt_on
+        self.delay = delay
+        self.requested = []
+        self.active_files = []
+        self.max_active_files = 0
+
+    async def send_message_async(self, messages):
+        content = messages[-1].content
+        name = content.split("文件:", 1)[1].split()[0]
+        self.requested.append(name)
+        self.active_files.append(name)
+        self.max_active_files = max(self.max_active_files, len(set(self.active_files)))
+        try:
+            await asyncio.sleep(self.delay)
+            if name == self.interrupt_on:
+                raise KeyboardInterrupt
+            if name == self.fail_on:
+                raise Exception("API请求失败: 400")
+        finally:
+            self.active_files.remove(name)
+        return Message(role="assistant", content=f"文件:{name} 的分析结果")
+
+
+class TestBatchCli(unittest.TestCase):
+    def setUp(self):
+        """创建包含3个PDF的目录，逐页文本预先写入缓存，分析时不需要解析PDF"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.directory = os.path.join(self.temp_dir, "papers")
+        os.makedirs(self.directory)
+        text_cache = PdfTextCache(self.directory)
+        for name in ["a", "b", "c"]:
+            pdf_path = os.path.join(self.directory, f"{name}.pdf")
+            with open(pdf_path, 'wb') as f:
+                f.write(f"%PDF {name}".encode())
+            text_cache.put(pdf_path, [f"文件:{name} 正文"])
+        self.instruction_file = os.path.join(self.temp_dir, "instruction.txt")
+        with open(self.instruction_file, 'w', encoding='utf-8') as f:
+            f.write("分析指令")
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def _main(self, service, *args):
+        """以给定服务运行命令行，返回(退出码, 标准输出)"""
+        argv = [self.directory, "--service", "grok", "--instruction-file", self.instruction_file,
+                "--no-summary", *args]
+        stdout, stderr = io.StringIO(), io.StringIO()
+        with patch("cli.batch.create_routed_service", return_value=service), \
+                contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+            with self.assertRaises(SystemExit) as cm:
+                main(argv)
+        return cm.exception.code, stdout.getvalue()
+
+    def _write_results(self, *names):
+        for name in names:
+            with open(os.path.join(self.directory, f"{name}_analysis.txt"), 'w', encoding='utf-8') as f:
+                f.write(f"文件:{name} 已有结果")
+
+    def test_all_succeeded(self):
+        """测试全部成功时退出码为0并写入分析结果"""
+        service = StubService()
+        code, output = self._main(service)
+        self.assertEqual(code, 0)
+        self.assertEqual(sorted(service.requested), ["a", "b", "c"])
+        self.assertIn("分析完成: 成功 3 个，失败 0 个", output)
+        self.assertTrue(os.path.exists(os.path.join(self.directory, "a_analysis.txt")))
+
+    def test_duplicate_shares_result(self):
+        """测试内容相同的文件不单独请求，写入规范文件的分析结果并更新分析状态"""
+        shutil.copyfile(os.path.join(self.directory, "a.pdf"), os.path.join(self.directory, "d.pdf"))
+        service = StubService()
+        code, output = self._main(service)
+        self.assertEqual(code, 0)
+        self.assertEqual(sorted(service.requested), ["a", "b", "c"])
+        self.assertIn("跳过 1 个内容重复的文件", output)
+        self.assertEqual(read_analysis_result(os.path.join(self.directory, "d.pdf")),
+                         read_analysis_result(os.path.join(self.directory, "a.pdf")))
+
+        file_index_manager = create_file_index_manager(logging.getLogger("test_cli_batch"))
+        try:
+            files = file_index_manager.load_index(self.directory)["files"]
+        finally:
+            file_index_manager.close()
+        self.assertEqual(files["d.pdf"]["duplicate_of"], "a.pdf")
+        self.assertIsNotNone(files["d.pdf"].get("last_analyzed"))
+
+    def test_failed_file_and_resume(self):
+        """测试有文件失败时退出码为1，再次运行时从任务日志恢复已完成的文件，--resume直接使用已有结果"""
+        code, output = self._main(StubService(fail_on="b"))
+        self.assertEqual(code, 1)
+        self.assertIn("失败 b.pdf: API请求失败: 400", output)
+
+        service = StubService()
+        code, _ = self._main(service)
+        self.assertEqual(code, 0)
+        self.assertEqual(service.requested, ["b"])
+
+        service = StubService()
+        code, output = self._main(service, "--resume")
+        self.assertEqual(code, 0)
+        self.assertEqual(service.requested, [])
+        self.assertIn("使用已有分析结果: 3 个文件", output)
+
+    def test_resume_without_analysis(self):
+        """测试--resume时全部文件已有结果则不发送请求"""
+        self._write_results("a", "b", "c")
+        service = StubService()
+        code, output = self._main(service, "--resume")
+        self.assertEqual(code, 0)
+        self.assertEqual(service.requested, [])
+        self.assertIn("使用已有分析结果: 3 个文件", output)
+
+    def test_max_files(self):
+        """测试--max-files限制同时处理的文件数"""
+        service = StubService()
+        code, _ = self._main(service, "--max-files", "1")
+        self.assertEqual(code, 0)
+        self.assertEqual(service.max_active_files, 1)
+
+        service = StubService()
+        code, _ = self._main(service, "--no-journal")
+        self.assertEqual(code, 0)
+        self.assertEqual(service.max_active_files, 3)
+
+    def test_invalid_arguments(self):
+        """测试目录不存在或分析指令为空时退出码为2"""
+        with contextlib.redirect_stderr(io.StringIO()):
+            with self.assertRaises(SystemExit) as cm:
+                main([os.path.join(self.temp_dir, "missing"), "--instruction-file", self.instruction_file])
+        self.assertEqual(cm.exception.code, 2)
+
+        with open(self.instruction_file, 'w', encoding='utf-8') as f:
+            f.write("  \n")
+        code, _ = self._main(StubService())
+        self.assertEqual(code, 2)
+
+    def test_keyboard_interrupt(self):
+        """测试按Ctrl-C取消时退出码为130"""
+        code, _ = self._main(StubService(interrupt_on="a"))
+        self.assertEqual(code, 130)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import unittest
+import os
+import shutil
+import tempfile
+from utils.content_hash import (quick_hash, needs_quick_hash, resolve_duplicates, link_duplicates,
+                                expand_duplicate_results, QUICK_HASH_SAMPLE_SIZE)
+
+
+class TestContentHash(unittest.TestCase):
+    def setUp(self):
+        """创建临时目录"""
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """删除临时目录"""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def _write(self, name: str, content: bytes) -> str:
+        path = os.path.join(self.temp_dir, name)
+        with open(path, 'wb') as f:
+            f.write(content)
+        return path
+
+    def _files(self, contents):
+        """写入文件并构建带快速哈希的索引"""
+        files = {}
+        for index, (name, content) in enumerate(contents, start=1):
+            files[name] = {"index": index, "content_hash": quick_hash(self._write(name, content))}
+        return files
+
+    def test_quick_hash(self):
+        """测试快速哈希包含文件大小，内容相同时结果相同"""
+        a = quick_hash(self._write("a.pdf", b"%PDF-1"))
+        self.assertEqual(a, quick_hash(self._write("b.pdf", b"%PDF-1")))
+        self.assertNotEqual(a, quick_hash(self._write("c.pdf", b"%PDF-2")))
+        self.assertIn(":6:", a)
+        self.assertFalse(needs_quick_hash({"content_hash": a}))
+        self.assertTrue(needs_quick_hash({"content_hash": "other:6:00"}))
+        self.assertTrue(needs_quick_hash({}))
+
+    def test_resolve_duplicates(self):
+        """测试重复文件指向序号最小的文件"""
+        files = self._files([("b.pdf", b"%PDF same"), ("a.pdf", b"%PDF same"), ("c.pdf", b"%PDF other")])
+        updates = resolve_duplicates(self.temp_dir, files)
+        self.assertEqual(updates["a.pdf"]["duplicate_of"], "b.pdf")
+        self.assertIn("sha256", updates["b.pdf"])
+        self.assertNotIn("c.pdf", updates)
+
+    def test_middle_difference_is_confirmed_by_full_hash(self):
+        """测试首尾相同、中间不同的文件不会被视为重复"""
+        head = b"h" * QUICK_HASH_SAMPLE_SIZE
+        tail = b"t" * QUICK_HASH_SAMPLE_SIZE
+        files = self._files([("a.pdf", head + b"1" + tail), ("b.pdf", head + b"2" + tail)])
+        self.assertEqual(files["a.pdf"]["content_hash"], files["b.pdf"]["content_hash"])
+
+        updates = resolve_duplicates(self.temp_dir, files)
+        self.assertNotIn("duplicate_of", updates.get("b.pdf", {}))
+
+    def test_stale_link_is_removed(self):
+        """测试内容不再相同时删除duplicate_of"""
+        files = self._files([("a.pdf", b"%PDF 1"), ("b.pdf", b"%PDF 2")])
+        files["b.pdf"]["duplicate_of"] = "a.pdf"
+        updates = resolve_duplicates(self.temp_dir, files)
+        self.assertEqual(updates, {"b.pdf": {"duplicate_of": None}})
+
+    def test_link_duplicates(self):
+        """测试重复文件替换为规范文件，其结果关联到重复文件"""
+        files = {"a.pdf": {"index": 1}, "b.pdf": {"index": 2, "duplicate_of": "a.pdf"}, "c.pdf": {"index": 3}}
+        paths = [os.path.join(self.temp_dir, name) for name in ["b.pdf", "c.pdf"]]
+        unique_paths, links = link_duplicates(self.temp_dir, files, paths)
+        a_path, b_path, c_path = (os.path.join(self.temp_dir, name) for name in ["a.pdf", "b.pdf", "c.pdf"])
+        self.assertEqual(unique_paths, [a_path, c_path])
+        self.assertEqual(links, {a_path: [b_path]})
+
+        results = expand_duplicate_results({a_path: "结果a", c_path: "结果c"}, links)
+        self.assertEqual(list(results.items()), [(a_path, "结果a"), (b_path, "结果a"), (c_path, "结果c")])
+
+
+if __name__ == '__main__':
+    unittest.main()
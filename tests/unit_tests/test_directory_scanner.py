@@ -0,0 +1,93 @@
+import unittest
+import os
+import shutil
+import tempfile
+import time
+from utils.directory_scanner import DirectoryScanner
+
+
+class TestDirectoryScanner(unittest.TestCase):
+    def setUp(self):
+        """创建包含子目录的临时目录"""
+        self.temp_dir = tempfile.mkdtemp()
+        self._write("a.pdf")
+        self._write("._a.pdf")
+        self._write("notes.txt")
+        self._write(os.path.join("2024", "b.pdf"))
+        self._write(os.path.join("2024", "deep", "c.PDF"))
+        self._write(os.path.join(".pdf_text_cache", "ignored.pdf"))
+        self._age_dirs()
+
+    def tearDown(self):
+        """删除临时目录"""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def _write(self, relpath: str, content: bytes = b"%PDF"):
+        path = os.path.join(self.temp_dir, relpath)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(content)
+
+    def _age_dirs(self):
+        """把所有目录的修改时间设为一分钟前，避免落入时间戳精度窗口"""
+        past = time.time() - 60
+        for dirpath, _, _ in os.walk(self.temp_dir):
+            os.utime(dirpath, (past, past))
+
+    def test_recursive_scan(self):
+        """测试递归扫描，跳过._文件、非PDF文件和以.开头的目录"""
+        results = DirectoryScanner(self.temp_dir).scan()
+        self.assertEqual(sorted(results), ["2024/b.pdf", "2024/deep/c.PDF", "a.pdf"])
+        self.assertEqual(results["a.pdf"]["size"], 4)
+        self.assertAlmostEqual(
+            results["a.pdf"]["mtime"], os.path.getmtime(os.path.join(self.temp_dir, "a.pdf")), places=3
+        )
+
+    def test_unchanged_rescan_reuses_cache(self):
+        """测试子目录未变化时不再重新列出，根目录每次都重新列出"""
+        DirectoryScanner(self.temp_dir).scan()
+
+        scanner = DirectoryScanner(self.temp_dir)
+        results = scanner.scan()
+        self.assertEqual(len(results), 3)
+        self.assertEqual(scanner.scanned_dirs, 1)
+        self.assertEqual(scanner.reused_dirs, 2)
+
+    def test_rescan_only_changed_dir(self):
+        """测试只重新列出发生变化的目录"""
+        DirectoryScanner(self.temp_dir).scan()
+        self._write(os.path.join("2024", "new.pdf"))
+
+        scanner = DirectoryScanner(self.temp_dir)
+        results = scanner.scan()
+        self.assertIn("2024/new.pdf", results)
+        self.assertEqual(scanner.scanned_dirs, 2)
+        self.assertEqual(scanner.reused_dirs, 1)
+
+    def test_recently_modified_dir_is_rescanned(self):
+        """测试刚修改过的目录不使用缓存的修改时间"""
+        now = time.time()
+        os.utime(os.path.join(self.temp_dir, "2024"), (now, now))
+        DirectoryScanner(self.temp_dir).scan()
+
+        scanner = DirectoryScanner(self.temp_dir)
+        scanner.scan()
+        self.assertEqual(scanner.scanned_dirs, 2)
+        self.assertEqual(scanner.reused_dirs, 1)
+
+    def test_in_place_edit_detected_in_cached_dir(self):
+        """测试原地修改文件不改变目录修改时间时，复用目录缓存仍能发现文件变化"""
+        DirectoryScanner(self.temp_dir).scan()
+        dir_path = os.path.join(self.temp_dir, "2024")
+        dir_stat = os.stat(dir_path)
+        self._write(os.path.join("2024", "b.pdf"), b"%PDF-1.4 edited")
+        os.utime(dir_path, ns=(dir_stat.st_atime_ns, dir_stat.st_mtime_ns))
+
+        scanner = DirectoryScanner(self.temp_dir)
+        results = scanner.scan()
+        self.assertEqual(scanner.reused_dirs, 2)
+        self.assertEqual(results["2024/b.pdf"]["size"], 15)
+
+
+if __name__ == '__main__':
+    unittest.main()
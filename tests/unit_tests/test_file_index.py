@@ -0,0 +1,154 @@
+import unittest
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+from utils.file_index_manager import FileIndexManager
+from utils.sqlite_file_index import SqliteFileIndexManager
+
+
+class TestSqliteFileIndex(unittest.TestCase):
+    def setUp(self):
+        """创建包含PDF文件的临时目录"""
+        self.temp_dir = tempfile.mkdtemp()
+        for name in ["b.pdf", "a.pdf", "._a.pdf", "notes.txt"]:
+            with open(os.path.join(self.temp_dir, name), 'wb') as f:
+                f.write(b"%PDF")
+        self.logger = logging.getLogger("test_file_index")
+        self.manager = SqliteFileIndexManager(self.logger)
+
+    def tearDown(self):
+        """关闭数据库并删除临时目录"""
+        self.manager.close()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_generate_index(self):
+        """测试生成索引，新文件追加序号"""
+        index = self.manager.generate_index(self.temp_dir)
+        self.assertEqual(index["metadata"]["total_files"], 2)
+        self.assertEqual(index["files"]["a.pdf"]["index"], 1)
+        self.assertEqual(index["files"]["b.pdf"]["index"], 2)
+
+        with open(os.path.join(self.temp_dir, "0.pdf"), 'wb') as f:
+            f.write(b"%PDF")
+        index = self.manager.generate_index(self.temp_dir)
+        self.assertEqual(index["files"]["0.pdf"]["index"], 3)
+        self.assertEqual(self.manager.get_file_by_index(self.temp_dir, 3), "0.pdf")
+
+    def test_update_status(self):
+        """测试更新分析状态和汇总状态"""
+        self.manager.generate_index(self.temp_dir)
+        self.manager.update_analysis_status(self.temp_dir, "a.pdf")
+        self.manager.update_analysis_status(self.temp_dir, "a.pdf")
+        self.manager.update_summary_status(self.temp_dir, ["a.pdf", "missing.pdf"], "s1")
+        self.manager.update_summary_status(self.temp_dir, ["a.pdf"], "s1")
+
+        info = self.manager.get_file(self.temp_dir, "a.pdf")
+        self.assertEqual(info["analysis_count"], 2)
+        self.assertIsNotNone(info["last_analyzed"])
+        self.assertEqual(info["included_in_summaries"], ["s1"])
+        self.assertIsNone(self.manager.get_file(self.temp_dir, "missing.pdf"))
+
+    def test_duplicates(self):
+        """测试内容相同的文件指向序号最小的文件，内容变化后取消标记"""
+        index = self.manager.generate_index(self.temp_dir)
+        self.assertEqual(index["files"]["b.pdf"]["duplicate_of"], "a.pdf")
+        self.assertNotIn("duplicate_of", index["files"]["a.pdf"])
+        self.assertIn("sha256", index["files"]["b.pdf"])
+
+        with open(os.path.join(self.temp_dir, "b.pdf"), 'wb') as f:
+            f.write(b"%PDF-1.7 other")
+        index = self.manager.generate_index(self.temp_dir)
+        self.assertNotIn("duplicate_of", index["files"]["b.pdf"])
+
+    def test_migrate_from_json(self):
+        """测试从已有的file_index.json迁移"""
+        json_manager = FileIndexManager(self.logger)
+        json_manager.generate_index(self.temp_dir)
+        json_manager.update_analysis_status(self.temp_dir, "b.pdf")
+        json_manager.update_summary_status(self.temp_dir, ["b.pdf"], "s0")
+        json_manager.close()
+        with open(os.path.join(self.temp_dir, "file_index.json"), 'r', encoding='utf-8') as f:
+            expected = json.load(f)
+
+        index = self.manager.generate_index(self.temp_dir)
+        self.assertEqual(index["files"], expected["files"])
+        self.assertEqual(index["metadata"]["created_at"], expected["metadata"]["created_at"])
+
+
+class TestJsonFileIndex(unittest.TestCase):
+    def setUp(self):
+        """创建包含PDF文件的临时目录"""
+        self.temp_dir = tempfile.mkdtemp()
+        for name in ["a.pdf", "b.pdf"]:
+            with open(os.path.join(self.temp_dir, name), 'wb') as f:
+                f.write(b"%PDF")
+        self.index_path = os.path.join(self.temp_dir, "file_index.json")
+
+    def tearDown(self):
+        """删除临时目录"""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def _read_count(self, filename):
+        with open(self.index_path, 'r', encoding='utf-8') as f:
+            return json.load(f)["files"][filename]["analysis_count"]
+
+    def test_updates_are_coalesced(self):
+        """测试更新先保存在内存中，合并后写入文件"""
+        manager = FileIndexManager(logging.getLogger("test_file_index"),
+                                   flush_interval_ms=60000, flush_max_changes=1000)
+        manager.generate_index(self.temp_dir)
+        for _ in range(3):
+            manager.update_analysis_status(self.temp_dir, "a.pdf")
+        self.assertEqual(manager.get_file(self.temp_dir, "a.pdf")["analysis_count"], 3)
+        self.assertEqual(self._read_count("a.pdf"), 0)
+
+        manager.close()
+        self.assertEqual(self._read_count("a.pdf"), 3)
+        # 原子替换后不应留下临时文件
+        self.assertEqual(sorted(os.listdir(self.temp_dir)), [".scan_cache.json", "a.pdf", "b.pdf", "file_index.json"])
+
+    def test_duplicates(self):
+        """测试内容相同的文件指向序号最小的文件"""
+        manager = FileIndexManager(logging.getLogger("test_file_index"))
+        index = manager.generate_index(self.temp_dir)
+        manager.close()
+        self.assertEqual(index["files"]["b.pdf"]["duplicate_of"], "a.pdf")
+        self.assertNotIn("duplicate_of", index["files"]["a.pdf"])
+
+    def test_returned_index_is_a_copy(self):
+        """测试修改返回的索引不影响内存中的索引和写入的文件"""
+        manager = FileIndexManager(logging.getLogger("test_file_index"))
+        index = manager.generate_index(self.temp_dir)
+        index["files"]["a.pdf"]["size_mb"] = 0.01
+        manager.load_index(self.temp_dir)["files"]["a.pdf"]["file_path"] = "/abs/a.pdf"
+        manager.get_file(self.temp_dir, "a.pdf")["analysis_count"] = 99
+        manager.update_analysis_status(self.temp_dir, "b.pdf")
+        manager.close()
+
+        info = manager.get_file(self.temp_dir, "a.pdf")
+        self.assertNotIn("size_mb", info)
+        self.assertNotIn("file_path", info)
+        self.assertEqual(info["analysis_count"], 0)
+        with open(self.index_path, 'r', encoding='utf-8') as f:
+            self.assertNotIn("size_mb", json.load(f)["files"]["a.pdf"])
+
+    def test_flush_after_max_changes(self):
+        """测试累计修改达到上限后由后台线程立即写入"""
+        manager = FileIndexManager(logging.getLogger("test_file_index"),
+                                   flush_interval_ms=60000, flush_max_changes=2)
+        manager.generate_index(self.temp_dir)
+        manager.update_analysis_status(self.temp_dir, "b.pdf")
+        manager.update_analysis_status(self.temp_dir, "b.pdf")
+        for _ in range(100):
+            if self._read_count("b.pdf") == 2:
+                break
+            time.sleep(0.01)
+        self.assertEqual(self._read_count("b.pdf"), 2)
+        manager.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
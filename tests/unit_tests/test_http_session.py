@@ -0,0 +1,36 @@
+import unittest
+import importlib.util
+from services import http_session
+
+
+@unittest.skipUnless(importlib.util.find_spec("requests") and importlib.util.find_spec("httpx"),
+                     "需要安装requests和httpx")
+class TestHttpSession(unittest.TestCase):
+    def tearDown(self):
+        http_session.close_http_sessions()
+
+    def test_session_shared_per_base_url(self):
+        """测试同一base_url的提供商共享会话，不同base_url各自独立"""
+        from services.providers.deepseek_provider import DeepseekProvider
+        first = DeepseekProvider("key-1", "https://api.example.com/v1")
+        second = DeepseekProvider("key-2", "https://api.example.com/v1")
+        other = DeepseekProvider("key-1", "https://other.example.com/v1")
+        self.assertIs(first._get_session(), second._get_session())
+        self.assertIsNot(first._get_session(), other._get_session())
+
+    def test_pool_size_and_hooks(self):
+        """测试连接池大小来自配置，并挂载限流器的响应钩子"""
+        session = http_session.get_http_session("https://api.example.com/v1")
+        adapter = session.get_adapter("https://api.example.com/v1")
+        self.assertEqual(adapter._pool_maxsize, http_session._pool_config()["pool_size"])
+        self.assertIn(http_session.observe_response, session.hooks["response"])
+
+    def test_close_releases_sessions(self):
+        """测试关闭后重新创建会话"""
+        session = http_session.get_http_session("https://api.example.com/v1")
+        http_session.close_http_sessions()
+        self.assertIsNot(session, http_session.get_http_session("https://api.example.com/v1"))
+
+
+if __name__ == '__main__':
+    unittest.main()
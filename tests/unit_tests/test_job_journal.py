@@ -0,0 +1,66 @@
+import unittest
+import os
+import shutil
+import tempfile
+from utils.job_journal import JobJournal
+
+
+class TestJobJournal(unittest.TestCase):
+    def setUp(self):
+        """创建包含一个PDF的临时目录"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.pdf_path = os.path.join(self.temp_dir, "sub", "paper.pdf")
+        os.makedirs(os.path.dirname(self.pdf_path))
+        with open(self.pdf_path, 'wb') as f:
+            f.write(b"%PDF")
+
+    def tearDown(self):
+        """删除临时目录"""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_chunks_survive_reopen(self):
+        """测试文本块记录在重新打开日志后仍可读取，块内容或任务键变化时不复用"""
+        journal = JobJournal(self.temp_dir)
+        journal.record_chunk(self.pdf_path, "job1", 1, "第一部分", "结果1", model="m")
+
+        reopened = JobJournal(self.temp_dir)
+        self.assertEqual(reopened.get_chunk(self.pdf_path, "job1", 1, "第一部分"), "结果1")
+        self.assertIsNone(reopened.get_chunk(self.pdf_path, "job1", 1, "已修改"))
+        self.assertIsNone(reopened.get_chunk(self.pdf_path, "job2", 1, "第一部分"))
+        self.assertIsNone(reopened.get_chunk(self.pdf_path, "job1", 2, "第二部分"))
+
+    def test_file_record_invalidated_by_change(self):
+        """测试文件完成记录在文件修改后失效"""
+        journal = JobJournal(self.temp_dir)
+        journal.record_file(self.pdf_path, "job1", "最终结果")
+        self.assertEqual(JobJournal(self.temp_dir).get_file(self.pdf_path, "job1"), "最终结果")
+
+        with open(self.pdf_path, 'ab') as f:
+            f.write(b"more")
+        self.assertIsNone(JobJournal(self.temp_dir).get_file(self.pdf_path, "job1"))
+
+    def test_truncated_last_line_is_ignored(self):
+        """测试中断时写了一半的最后一行被忽略"""
+        journal = JobJournal(self.temp_dir)
+        journal.record_chunk(self.pdf_path, "job1", 1, "第一部分", "结果1")
+        with open(journal.path, 'a', encoding='utf-8') as f:
+            f.write('{"type": "chunk", "file": "sub/pap')
+
+        reopened = JobJournal(self.temp_dir)
+        self.assertEqual(reopened.get_chunk(self.pdf_path, "job1", 1, "第一部分"), "结果1")
+
+    def test_compact(self):
+        """测试文件完成后压缩日志，只保留有效记录"""
+        journal = JobJournal(self.temp_dir)
+        for i in range(1, 4):
+            journal.record_chunk(self.pdf_path, "job1", i, f"第{i}部分", f"结果{i}")
+        journal.record_file(self.pdf_path, "job1", "最终结果")
+        journal.compact()
+
+        with open(journal.path, 'r', encoding='utf-8') as f:
+            self.assertEqual(len(f.readlines()), 1)
+        self.assertEqual(JobJournal(self.temp_dir).get_file(self.pdf_path, "job1"), "最终结果")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+import unittest
+from core.job_queue import AnalysisJobQueue
+
+
+class FakeService:
+    """只提供提供商键所需属性的AI服务"""
+    service_name = "fake"
+
+    def __init__(self, provider_name):
+        self.provider_name = provider_name
+
+
+class InlineExtraction:
+    """记录开始提取的文件，返回只有文件路径的文本块列表"""
+
+    def __init__(self):
+        self.started = []
+
+    def __call__(self, file_path, ai_service):
+        self.started.append(file_path)
+        return [file_path]
+
+
+class TestAnalysisJobQueue(unittest.TestCase):
+    def _drain(self, queue):
+        """依次取出可以开始的任务并立即归还名额，返回文件路径"""
+        files = []
+        while True:
+            next_job = queue.next_job()
+            if next_job is None:
+                return files
+            provider_key, job = next_job
+            files.append(job[2])
+            queue.release(provider_key)
+
+    def test_global_index_order(self):
+        """测试按global_index出队，与提交顺序无关，序号相同时按提交顺序"""
+        queue = AnalysisJobQueue(max_concurrent=1)
+        service = FakeService("a")
+        for global_index, name in [(5, "e"), (3, "c"), (1, "a"), (3, "d"), (2, "b")]:
+            queue.submit(name, global_index, service, "分析指令")
+        extraction = InlineExtraction()
+        queue.start_extractions(extraction)
+        self.assertEqual(extraction.started, ["a", "b", "c", "d", "e"])
+        self.assertEqual(self._drain(queue), ["a", "b", "c", "d", "e"])
+        self.assertEqual(queue.pending_count, 0)
+
+    def test_provider_limit(self):
+        """测试达到上限的提供商的任务继续等待，其他提供商的任务可以先开始"""
+        queue = AnalysisJobQueue(max_concurrent=3, provider_limits={"fake.a": 1})
+        limited, free = FakeService("a"), FakeService("b")
+        for global_index, name in enumerate(["a1", "a2", "a3"]):
+            queue.submit(name, global_index, limited, "分析指令")
+        queue.submit("b1", 3, free, "分析指令")
+        queue.start_extractions(InlineExtraction())
+
+        first_key, first_job = queue.next_job()
+        self.assertEqual((first_key, first_job[2]), ("fake.a", "a1"))
+        second_key, second_job = queue.next_job()
+        self.assertEqual((second_key, second_job[2]), ("fake.b", "b1"))
+        self.assertIsNone(queue.next_job())
+        self.assertEqual(queue.running_count("fake.a"), 1)
+
+        queue.release(first_key)
+        self.assertEqual(queue.next_job()[1][2], "a2")
+
+    def test_provider_limit_by_service_name(self):
+        """测试"service.provider"未配置时使用"service"的上限，都未配置时使用max_concurrent"""
+        queue = AnalysisJobQueue(max_concurrent=5, provider_limits={"fake": 2, "fake.b": 1})
+        self.assertEqual(queue.provider_limit("fake.a"), 2)
+        self.assertEqual(queue.provider_limit("fake.b"), 1)
+        self.assertEqual(queue.provider_limit("other.a"), 5)
+        self.assertEqual(AnalysisJobQueue.provider_key(FakeService("a")), "fake.a")
+        self.assertEqual(AnalysisJobQueue.provider_key(FakeService(None)), "fake")
+
+    def test_extraction_buffer(self):
+        """测试已开始提取、等待请求的任务数不超过extraction_queue_size"""
+        queue = AnalysisJobQueue(max_concurrent=1, extraction_queue_size=2)
+        service = FakeService("a")
+        for global_index in range(4):
+            queue.submit(f"f{global_index}", global_index, service, "分析指令")
+        extraction = InlineExtraction()
+        queue.start_extractions(extraction)
+        self.assertEqual(extraction.started, ["f0", "f1"])
+        self.assertEqual((queue.ready_count, queue.pending_count), (2, 4))
+
+        provider_key, job = queue.next_job()
+        self.assertEqual(job[-1], ["f0"])
+        queue.start_extractions(extraction)
+        self.assertEqual(extraction.started, ["f0", "f1", "f2"])
+
+    def test_clear(self):
+        """测试clear()返回已开始提取的任务，并清空等待队列和并发名额"""
+        queue = AnalysisJobQueue(max_concurrent=1, extraction_queue_size=2)
+        service = FakeService("a")
+        for global_index in range(4):
+            queue.submit(f"f{global_index}", global_index, service, "分析指令")
+        queue.start_extractions(InlineExtraction())
+        queue.next_job()
+
+        ready_jobs = queue.clear()
+        self.assertEqual([job[2] for job in ready_jobs], ["f1"])
+        self.assertEqual(queue.pending_count, 0)
+        self.assertEqual(queue.running_count("fake.a"), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,158 @@
+import unittest
+import asyncio
+import random
+import time
+from collections import Counter
+from unittest.mock import patch
+from services.message_types import Message
+from services.load_balancer import LoadBalancer, create_load_balancer
+from utils.config_manager import ConfigManager
+from services.rate_limiter import get_rate_limiter
+from services.routing_context import answering_service
+
+
+class HTTPStatusError(Exception):
+    """模拟带状态码的HTTP错误"""
+
+    def __init__(self, status_code):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+
+
+def failed_request(error):
+    """与服务层一样把原始异常包装成Exception"""
+    try:
+        raise error
+    except Exception as e:
+        try:
+            raise Exception(f"API请求失败: {str(e)}") from e
+        except Exception as outer:
+            return outer
+
+
+class FakeService:
+    """按设定的耗时返回提供商名的AI服务，设置了error时抛出该错误"""
+    service_name = "fake_balanced"
+
+    def __init__(self, provider, delay=0.0, error=None):
+        self.provider_name = provider
+        self.default_model = "fake-model"
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+
+    def send_message(self, messages):
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.error is not None:
+            raise failed_request(self.error)
+        return Message(role="assistant", content=self.provider_name)
+
+    async def send_message_async(self, messages):
+        return self.send_message(messages)
+
+    def stream_message(self, messages):
+        self.calls += 1
+        if self.error is not None:
+            raise failed_request(self.error)
+        yield self.provider_name
+
+
+class FakeProviderConfig:
+    """两个已启用提供商、模型相同的配置"""
+
+    def get_enabled_providers(self, service_name):
+        return ["first", "second"]
+
+    def get_provider_config(self, service_name, provider):
+        return {"api_key": "key", "models": {"fake-model": {}}}
+
+
+class FakeProviderService(FakeService):
+    """与DeepseekService一样，切换提供商只更新current_provider"""
+
+    def __init__(self, config_manager=None, provider_name="first"):
+        super().__init__(provider_name)
+        self.config = config_manager
+        self.current_provider = provider_name
+
+    def set_provider(self, provider_name):
+        self.current_provider = provider_name
+
+
+class TestLoadBalancer(unittest.TestCase):
+    def setUp(self):
+        random.seed(1)
+
+    def test_distributes_by_latency(self):
+        """测试请求分发到所有后端，延迟EWMA较低的后端分到更多请求"""
+        fast, slow = FakeService("fast", delay=0.001), FakeService("slow", delay=0.01)
+        balancer = LoadBalancer([fast, slow], alpha=0.5)
+        counts = Counter(balancer.send_message([Message("user", "hi")]).content for _ in range(60))
+        self.assertGreater(counts["fast"], counts["slow"])
+        self.assertGreater(counts["slow"], 0)
+        stats = balancer.stats()
+        self.assertLess(stats["fake_balanced.fast.fake-model"]["latency"],
+                        stats["fake_balanced.slow.fake-model"]["latency"])
+
+    def test_failing_backend_is_skipped_and_deweighted(self):
+        """测试失败时换用其他后端，错误率升高后权重降低"""
+        broken, healthy = FakeService("broken", error=HTTPStatusError(503)), FakeService("healthy")
+        balancer = LoadBalancer([broken, healthy])
+        for _ in range(10):
+            self.assertEqual(balancer.send_message([Message("user", "hi")]).content, "healthy")
+        self.assertIs(answering_service(balancer), healthy)
+        self.assertEqual(list(balancer.stream_message([Message("user", "hi")])), ["healthy"])
+        broken_backend, healthy_backend = balancer.backends
+        self.assertGreater(broken_backend.error_rate, 0.5)
+        self.assertLess(balancer.weight(broken_backend), balancer.weight(healthy_backend))
+
+        balancer = LoadBalancer([FakeService("a", error=TimeoutError()), FakeService("b", error=TimeoutError())])
+        with self.assertRaises(Exception):
+            balancer.send_message([Message("user", "hi")])
+
+    def test_client_error_not_failed_over(self):
+        """测试4xx等不可重试的错误直接抛出，不换用其他后端"""
+        for status in (400, 401):
+            rejected, healthy = FakeService("rejected", error=HTTPStatusError(status)), FakeService("healthy")
+            balancer = LoadBalancer([rejected, healthy])
+            # 按顺序选择后端，被拒绝的后端先被选中
+            balancer.choose = lambda exclude=frozenset(): next(
+                backend for backend in balancer.backends if backend not in exclude)
+            with self.assertRaises(Exception):
+                balancer.send_message([Message("user", "hi")])
+            with self.assertRaises(Exception):
+                asyncio.run(balancer.send_message_async([Message("user", "hi")]))
+            with self.assertRaises(Exception):
+                list(balancer.stream_message([Message("user", "hi")]))
+            self.assertEqual((rejected.calls, healthy.calls), (3, 0))
+
+    def test_rate_limited_backend_gets_little_traffic(self):
+        """测试触发限流的后端剩余配额为0，权重降到下限"""
+        throttled, free = FakeService("throttled"), FakeService("free")
+        balancer = LoadBalancer([throttled, free])
+        limiter = get_rate_limiter("fake_balanced", "throttled", "fake-model")
+        limiter.update_from_headers(429, {"retry-after": "30"})
+        self.assertEqual(limiter.headroom(), 0.0)
+        throttled_backend, free_backend = balancer.backends
+        self.assertAlmostEqual(balancer.weight(throttled_backend) / balancer.weight(free_backend),
+                               LoadBalancer.MIN_FACTOR)
+
+    def test_attributes_forwarded_to_primary(self):
+        """测试未定义的属性转发给第一个后端"""
+        balancer = LoadBalancer([FakeService("primary"), FakeService("other")])
+        self.assertEqual(balancer.provider_name, "primary")
+        self.assertEqual(balancer.service_name, "fake_balanced")
+
+    def test_backends_follow_switched_provider(self):
+        """测试界面切换提供商后创建负载均衡器，所选提供商不重复，原默认提供商作为其他后端"""
+        primary = FakeProviderService(FakeProviderConfig(), "first")
+        primary.set_provider("second")
+        with patch.dict(ConfigManager()._config, {"load_balancing": {"enabled": True}}):
+            balancer = create_load_balancer(primary)
+        self.assertEqual([backend.provider for backend in balancer.backends], ["second", "first"])
+        self.assertIs(balancer.services[0], primary)
+
+
+if __name__ == '__main__':
+    unittest.main()
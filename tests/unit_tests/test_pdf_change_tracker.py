@@ -0,0 +1,72 @@
+import unittest
+import logging
+import os
+import shutil
+import tempfile
+import time
+from utils.file_index_manager import FileIndexManager
+from utils.pdf_change_tracker import PdfChangeTracker
+
+
+class TestPdfChangeTracker(unittest.TestCase):
+    def setUp(self):
+        """创建已建立索引的临时目录"""
+        self.temp_dir = tempfile.mkdtemp()
+        self._write("a.pdf")
+        self.manager = FileIndexManager(logging.getLogger("test_pdf_change_tracker"),
+                                        flush_interval_ms=60000, flush_max_changes=1000)
+        self.manager.generate_index(self.temp_dir)
+        self.tracker = PdfChangeTracker(self.temp_dir, self.manager, settle_seconds=0)
+
+    def tearDown(self):
+        """关闭索引并删除临时目录"""
+        self.manager.close()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def _write(self, relpath: str, content: bytes = b"%PDF"):
+        path = os.path.join(self.temp_dir, relpath)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(content)
+        return path
+
+    def test_new_file_is_indexed_after_settling(self):
+        """测试新文件在两次检查不变后写入索引并返回"""
+        path = self._write(os.path.join("new", "b.pdf"))
+        self.assertEqual(self.tracker.poll(), [])
+        self.assertIsNone(self.manager.get_file(self.temp_dir, "new/b.pdf"))
+
+        self.assertEqual(self.tracker.poll(), [os.path.normpath(path)])
+        self.assertEqual(self.manager.get_file(self.temp_dir, "new/b.pdf")["index"], 2)
+        self.assertEqual(self.tracker.poll(), [])
+
+    def test_growing_file_is_not_returned(self):
+        """测试仍在写入的文件不会返回"""
+        path = self._write("c.pdf")
+        self.tracker.poll()
+        with open(path, 'ab') as f:
+            f.write(b"more")
+        self.assertEqual(self.tracker.poll(), [])
+        self.assertEqual(self.tracker.poll(), [os.path.normpath(path)])
+
+    def test_notified_change(self):
+        """测试通过notify记录的已有文件的变化"""
+        path = self._write("a.pdf", b"%PDF-changed")
+        past = time.time() - 60
+        os.utime(path, (past, past))
+        self.tracker.notify([path, os.path.join(self.temp_dir, "notes.txt")])
+        self.assertEqual(self.tracker.pending_count, 1)
+
+        self.tracker.poll(full_scan=False)
+        self.assertEqual(self.tracker.poll(full_scan=False), [os.path.normpath(path)])
+        self.assertEqual(self.manager.get_file(self.temp_dir, "a.pdf")["size"], 12)
+
+    def test_unchanged_notification_is_dropped(self):
+        """测试内容未变化的通知直接丢弃"""
+        self.tracker.notify([os.path.join(self.temp_dir, "a.pdf")])
+        self.assertEqual(self.tracker.poll(full_scan=False), [])
+        self.assertEqual(self.tracker.pending_count, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import unittest
+import os
+import shutil
+import tempfile
+from utils.pdf_text_cache import PdfTextCache
+
+
+class TestPdfTextCache(unittest.TestCase):
+    def setUp(self):
+        """创建临时目录和模拟的PDF文件"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.pdf_path = os.path.join(self.temp_dir, "paper.pdf")
+        with open(self.pdf_path, 'wb') as f:
+            f.write(b"%PDF-1.4 fake content")
+        self.cache = PdfTextCache(self.temp_dir)
+
+    def tearDown(self):
+        """删除临时目录"""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_hit_when_unchanged(self):
+        """测试文件未变化时命中缓存"""
+        self.assertIsNone(self.cache.get(self.pdf_path))
+        self.cache.put(self.pdf_path, ["第一页", "第二页"])
+        self.assertEqual(self.cache.get(self.pdf_path), ["第一页", "第二页"])
+        self.assertEqual(self.cache.hits, 1)
+        self.assertEqual(self.cache.misses, 1)
+        self.assertTrue(os.path.isdir(os.path.join(self.temp_dir, PdfTextCache.CACHE_DIR_NAME)))
+
+    def test_hit_after_touch_with_same_content(self):
+        """测试只修改时间变化时通过内容哈希命中"""
+        self.cache.put(self.pdf_path, ["page"])
+        stat = os.stat(self.pdf_path)
+        os.utime(self.pdf_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        self.assertEqual(self.cache.get(self.pdf_path), ["page"])
+
+    def test_miss_after_content_change(self):
+        """测试文件内容变化后缓存失效"""
+        self.cache.put(self.pdf_path, ["page"])
+        with open(self.pdf_path, 'wb') as f:
+            f.write(b"%PDF-1.4 other content")
+        self.assertIsNone(self.cache.get(self.pdf_path))
+
+    def test_corrupted_entry_is_ignored(self):
+        """测试损坏的缓存文件被当作未命中"""
+        self.cache.put(self.pdf_path, ["page"])
+        with open(self.cache._entry_path(self.pdf_path), 'wb') as f:
+            f.write(b"not gzip")
+        self.assertIsNone(self.cache.get(self.pdf_path))
+
+    def test_writer_abort_leaves_no_entry(self):
+        """测试逐页写入中途放弃时不留下缓存和临时文件"""
+        writer = self.cache.open_writer(self.pdf_path)
+        writer.add("第一页")
+        writer.abort()
+        self.assertIsNone(self.cache.get(self.pdf_path))
+        self.assertEqual(os.listdir(os.path.join(self.temp_dir, PdfTextCache.CACHE_DIR_NAME)), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
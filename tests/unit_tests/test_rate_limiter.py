@@ -0,0 +1,117 @@
+import unittest
+import asyncio
+from unittest.mock import patch
+from services.message_types import Message
+from services.rate_limiter import (TokenBucket, RateLimiter, get_rate_limiter, observe_response,
+                                   rate_limited, _parse_duration)
+
+
+class FakeResponse:
+    """模拟HTTP响应，只包含状态码和响应头"""
+
+    def __init__(self, status_code, headers):
+        self.status_code = status_code
+        self.headers = headers
+
+
+class FakeService:
+    """模拟AI服务，发送请求时触发响应钩子"""
+    service_name = "fake_rate_limited"
+    provider_name = "official"
+    default_model = "fake-model"
+
+    def __init__(self, headers=None):
+        self.headers = headers or {}
+
+    @rate_limited
+    def send_message(self, messages, model=None, **kwargs):
+        observe_response(FakeResponse(200, self.headers))
+        return {"choices": [{"message": {"content": "ok"}}], "usage": {"total_tokens": 5}}
+
+    @rate_limited
+    async def send_message_async(self, messages, model=None, **kwargs):
+        observe_response(FakeResponse(429, {"retry-after": "2"}))
+        return {"choices": [{"message": {"content": "ok"}}]}
+
+
+class WordCounter:
+    """按空格计数的计数器，记录批量调用次数"""
+
+    def __init__(self):
+        self.batch_calls = 0
+
+    def count_batch(self, texts):
+        self.batch_calls += 1
+        return [len(text.split()) for text in texts]
+
+
+class TestRateLimiter(unittest.TestCase):
+    def test_token_bucket_spreads_requests(self):
+        """测试令牌桶在突发量用完后按速率排队，预约的等待时间依次递增"""
+        bucket = TokenBucket(60)
+        now = bucket.updated
+        self.assertEqual(bucket.capacity, 10)
+        delays = [bucket.reserve(1, now) for _ in range(12)]
+        self.assertEqual(delays[:10], [0.0] * 10)
+        self.assertAlmostEqual(delays[10], 1.0)
+        self.assertAlmostEqual(delays[11], 2.0)
+
+    def test_parse_duration(self):
+        """测试解析x-ratelimit-reset-*的时长格式"""
+        self.assertEqual(_parse_duration("20"), 20.0)
+        self.assertEqual(_parse_duration("1.5s"), 1.5)
+        self.assertAlmostEqual(_parse_duration("120ms"), 0.12)
+        self.assertEqual(_parse_duration("6m0s"), 360.0)
+        self.assertIsNone(_parse_duration("soon"))
+
+    def test_headers_adjust_limits(self):
+        """测试按服务器配额调整上限，配置了更小的上限时保留配置值"""
+        limiter = RateLimiter("test", rpm=30)
+        limiter.update_from_headers(200, {"x-ratelimit-limit-requests": "100",
+                                          "x-ratelimit-limit-tokens": "60000"})
+        self.assertEqual(limiter.stats()["rpm"], 30)
+        self.assertEqual(limiter.stats()["tpm"], 60000)
+
+    def test_retry_after_blocks_requests(self):
+        """测试429响应的Retry-After暂停后续请求"""
+        limiter = RateLimiter("test")
+        self.assertEqual(limiter.reserve(), 0.0)
+        limiter.update_from_headers(429, {"retry-after": "3"})
+        self.assertAlmostEqual(limiter.reserve(), 3.0, places=1)
+        self.assertEqual(limiter.stats()["rate_limited"], 1)
+
+    def test_exhausted_quota_waits_for_reset(self):
+        """测试剩余配额为0时等到配额重置"""
+        limiter = RateLimiter("test")
+        limiter.update_from_headers(200, {"x-ratelimit-remaining-tokens": "0",
+                                          "x-ratelimit-reset-tokens": "1.5s"})
+        self.assertAlmostEqual(limiter.reserve(), 1.5, places=1)
+
+    def test_decorator_feeds_headers_to_shared_limiter(self):
+        """测试装饰器把响应头交给该服务/提供商/模型共享的限流器"""
+        service = FakeService({"x-ratelimit-limit-requests": "120"})
+        service.send_message([Message("user", "hello")])
+        limiter = get_rate_limiter("fake_rate_limited", "official", "fake-model")
+        self.assertIs(limiter, get_rate_limiter("fake_rate_limited", "official", "fake-model"))
+        self.assertEqual(limiter.stats()["rpm"], 120)
+
+        asyncio.run(service.send_message_async([Message("user", "hello")], model="other-model"))
+        other = get_rate_limiter("fake_rate_limited", "official", "other-model")
+        self.assertEqual(other.stats()["rate_limited"], 1)
+        self.assertEqual(limiter.stats()["rate_limited"], 0)
+
+    def test_tpm_reservation_uses_service_counter(self):
+        """测试TPM预约使用与分块相同的计数器计算请求的token数"""
+        counter = WordCounter()
+        service = FakeService()
+        messages = [Message("system", "one two"), Message("user", "three four five")]
+        with patch("services.rate_limiter.chunking_for_service", return_value=(counter, 100)) as chunking, \
+                patch.object(RateLimiter, "acquire") as acquire:
+            service.send_message(messages)
+        chunking.assert_called_once_with(service)
+        acquire.assert_called_once_with(5)
+        self.assertEqual(counter.batch_calls, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+import unittest
+import os
+import shutil
+import tempfile
+from services.message_types import Message
+from services.response_cache import ResponseCache, cached_response, cached_stream
+
+
+class FakeService:
+    """模拟AI服务，记录实际的API调用次数"""
+    service_name = "fake"
+    provider_name = "official"
+    default_model = "fake-model"
+
+    def __init__(self, cache):
+        self.response_cache = cache
+        self.calls = 0
+
+    def _wrap_cached_content(self, content):
+        return {"choices": [{"message": {"role": "assistant", "content": content}}], "cached": True}
+
+    @cached_response
+    def send_message(self, messages, model=None, **kwargs):
+        self.calls += 1
+        return {"choices": [{"message": {"role": "assistant", "content": f"reply {self.calls}"}}]}
+
+    @cached_stream
+    def stream_message(self, messages, model=None, **kwargs):
+        self.calls += 1
+        yield from ("streamed ", f"reply {self.calls}")
+
+
+class TestResponseCache(unittest.TestCase):
+    def setUp(self):
+        """创建临时缓存数据库"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.cache = ResponseCache(os.path.join(self.temp_dir, "responses.sqlite"))
+
+    def tearDown(self):
+        """关闭并删除临时缓存"""
+        self.cache.close()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_key_depends_on_model_and_content(self):
+        """测试缓存键随模型和消息内容变化"""
+        messages = [Message("system", "prompt"), Message("user", "instruction\n\nchunk")]
+        key = ResponseCache.make_key("grok", "official", "grok-2", messages)
+        self.assertEqual(key, ResponseCache.make_key("grok", "official", "grok-2", messages))
+        self.assertNotEqual(key, ResponseCache.make_key("grok", "official", "grok-3", messages))
+        changed = [Message("system", "prompt"), Message("user", "instruction\n\nother chunk")]
+        self.assertNotEqual(key, ResponseCache.make_key("grok", "official", "grok-2", changed))
+
+    def test_hit_and_miss_counters(self):
+        """测试命中和未命中计数"""
+        self.assertIsNone(self.cache.get("missing"))
+        self.cache.put("key", "content")
+        self.assertEqual(self.cache.get("key"), "content")
+        stats = self.cache.stats()
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["misses"], 1)
+        self.assertEqual(stats["entries"], 1)
+
+    def test_lru_eviction(self):
+        """测试超出容量时淘汰最久未访问的条目"""
+        self.cache.max_size_bytes = 30
+        self.cache.put("old", "a" * 10)
+        self.cache.put("recent", "b" * 10)
+        # 访问old，使recent成为最久未访问的条目
+        self.cache.get("old")
+        self.cache.put("new", "c" * 15)
+        self.assertIsNone(self.cache.get("recent"))
+        self.assertEqual(self.cache.get("old"), "a" * 10)
+        self.assertEqual(self.cache.get("new"), "c" * 15)
+
+    def test_identical_request_skips_api_call(self):
+        """测试相同请求第二次直接命中缓存"""
+        service = FakeService(self.cache)
+        messages = [Message("user", "hello")]
+        first = service.send_message(messages)
+        second = service.send_message(messages)
+        self.assertEqual(service.calls, 1)
+        self.assertEqual(second["choices"][0]["message"]["content"],
+                         first["choices"][0]["message"]["content"])
+        self.assertTrue(second["cached"])
+
+    def test_stream_request_not_cached(self):
+        """测试流式请求不使用缓存"""
+        service = FakeService(self.cache)
+        messages = [Message("user", "hello")]
+        service.send_message(messages, stream=True)
+        service.send_message(messages, stream=True)
+        self.assertEqual(service.calls, 2)
+
+
+    def test_stream_shares_cache_with_send_message(self):
+        """测试流式请求完整结束后写入缓存，与普通请求共用缓存键"""
+        service = FakeService(self.cache)
+        messages = [Message("user", "hello")]
+        self.assertEqual("".join(service.stream_message(messages)), "streamed reply 1")
+        self.assertEqual(list(service.stream_message(messages)), ["streamed reply 1"])
+        cached = service.send_message(messages)
+        self.assertEqual(cached["choices"][0]["message"]["content"], "streamed reply 1")
+        self.assertEqual(service.calls, 1)
+
+        other = [Message("user", "bye")]
+        stream = service.stream_message(other)
+        next(stream)
+        stream.close()
+        self.assertEqual(list(service.stream_message(other)), ["streamed ", "reply 3"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+import unittest
+import asyncio
+import time
+from services.message_types import Message
+from services.retry_policy import RetryPolicy, is_retryable, with_retry
+from core.cancellation import AnalysisCancelled, CancellationToken, cancel_scope
+
+
+class FakeResponse:
+    """模拟HTTP响应，只包含状态码和响应头"""
+
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+class APIStatusError(Exception):
+    """模拟openai.APIStatusError"""
+
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"status {status_code}")
+        self.response = FakeResponse(status_code, headers)
+        self.status_code = status_code
+
+
+class APITimeoutError(Exception):
+    """模拟openai.APITimeoutError，按类名识别"""
+
+
+def wrapped(error):
+    """模拟服务层把原始异常包装成Exception"""
+    try:
+        raise error
+    except Exception as e:
+        try:
+            raise Exception(f"API请求失败: {str(e)}") from e
+        except Exception as outer:
+            return outer
+
+
+class FlakyService:
+    """前几次请求返回502的AI服务"""
+    service_name = "fake_retry"
+
+    def __init__(self, failures, error=None):
+        self.failures = failures
+        self.error = error
+        self.calls = 0
+        self.retry_policy = RetryPolicy(max_attempts=4, base_delay=0)
+
+    def _attempt(self):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise wrapped(self.error or APIStatusError(502))
+        return Message(role="assistant", content="ok")
+
+    @with_retry
+    def send_message(self, messages, model=None, **kwargs):
+        return self._attempt()
+
+    @with_retry
+    async def send_message_async(self, messages, model=None, **kwargs):
+        return self._attempt()
+
+
+class TestRetryPolicy(unittest.TestCase):
+    def test_classification(self):
+        """测试沿异常链识别可重试的临时错误"""
+        self.assertTrue(is_retryable(wrapped(APIStatusError(429))))
+        self.assertTrue(is_retryable(wrapped(APIStatusError(503))))
+        self.assertTrue(is_retryable(wrapped(APITimeoutError("timeout"))))
+        self.assertTrue(is_retryable(ConnectionResetError()))
+        self.assertFalse(is_retryable(wrapped(APIStatusError(400))))
+        self.assertFalse(is_retryable(wrapped(APIStatusError(401))))
+        self.assertFalse(is_retryable(ValueError("bad")))
+        self.assertFalse(is_retryable(AnalysisCancelled()))
+
+    def test_retries_transient_errors(self):
+        """测试临时错误重试后成功，同步和异步一致"""
+        service = FlakyService(2)
+        self.assertEqual(service.send_message([Message("user", "hi")]).content, "ok")
+        self.assertEqual(service.calls, 3)
+
+        service = FlakyService(2)
+        result = asyncio.run(service.send_message_async([Message("user", "hi")]))
+        self.assertEqual(result.content, "ok")
+        self.assertEqual(service.calls, 3)
+
+    def test_gives_up(self):
+        """测试达到最多尝试次数后抛出，不可重试的错误不重试"""
+        service = FlakyService(10)
+        with self.assertRaises(Exception):
+            service.send_message([Message("user", "hi")])
+        self.assertEqual(service.calls, 4)
+
+        service = FlakyService(10, APIStatusError(400))
+        with self.assertRaises(Exception):
+            service.send_message([Message("user", "hi")])
+        self.assertEqual(service.calls, 1)
+
+    def test_delay_bounds(self):
+        """测试等待时长不超过指数上限，遵守Retry-After，超过总时限时不再重试"""
+        policy = RetryPolicy(base_delay=1.0, max_delay=30.0, deadline=300.0)
+        error = wrapped(APIStatusError(503))
+        for attempt in range(1, 4):
+            delay = policy.next_delay(attempt, error, started=float("inf"))
+            self.assertLessEqual(delay, 2 ** (attempt - 1))
+        self.assertIsNone(policy.next_delay(4, error, started=float("inf")))
+
+        throttled = wrapped(APIStatusError(429, {"retry-after": "5"}))
+        self.assertGreaterEqual(policy.next_delay(1, throttled, started=float("inf")), 5.0)
+        self.assertIsNone(policy.next_delay(1, error, started=float("-inf")))
+
+    def test_cancel_stops_backoff(self):
+        """测试在取消范围内取消后，退避等待立即结束并抛出AnalysisCancelled"""
+        calls = []
+
+        def fail():
+            calls.append(1)
+            raise ConnectionResetError()
+
+        token = CancellationToken()
+        token.cancel()
+        started = time.monotonic()
+        with cancel_scope(token), self.assertRaises(AnalysisCancelled):
+            RetryPolicy(base_delay=30.0, max_delay=30.0).call(fail)
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual(len(calls), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
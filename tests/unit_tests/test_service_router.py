@@ -0,0 +1,162 @@
+import unittest
+import asyncio
+import os
+import shutil
+import tempfile
+import threading
+import time
+from services.message_types import Message
+from services.service_router import LatencyTracker, ServiceRouter
+from services.routing_context import answering_service, candidate_services
+from core.analysis_prompts import analysis_job_key
+from core.analysis_pipeline import AnalysisPipeline
+from core.cancellation import AnalysisCancelled
+from core.text_chunker import TextChunk
+from utils.job_journal import JobJournal
+
+
+class FakeService:
+    """按设定的耗时返回固定文本的AI服务，error不为None时抛出该异常"""
+
+    def __init__(self, name, delay=0.0, error=None):
+        self.service_name = name
+        self.default_model = f"{name}-model"
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def send_message(self, messages):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return Message(role="assistant", content=self.service_name)
+
+    async def send_message_async(self, messages):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return Message(role="assistant", content=self.service_name)
+
+    def stream_message(self, messages):
+        if self.error is not None:
+            raise self.error
+        yield from (self.service_name[:1], self.service_name[1:])
+
+
+def warm_up(router, seconds):
+    """填充主服务的延迟样本"""
+    for _ in range(router.hedge_min_samples):
+        router.latencies[0].record(seconds)
+
+
+class TestServiceRouter(unittest.TestCase):
+    def test_latency_percentile(self):
+        """测试延迟分位数，过短的样本不计入"""
+        tracker = LatencyTracker()
+        self.assertIsNone(tracker.percentile(95))
+        for i in range(1, 101):
+            tracker.record(i / 10)
+        tracker.record(0.001)
+        self.assertEqual(len(tracker), 100)
+        self.assertAlmostEqual(tracker.percentile(95), 9.5)
+
+    def test_failover(self):
+        """测试主服务因临时错误失败时按顺序换用备用服务，属性转发给主服务"""
+        primary = FakeService("grok", error=TimeoutError("timed out"))
+        router = ServiceRouter([primary, FakeService("openai", error=ConnectionError("reset")), FakeService("deepseek")])
+        self.assertEqual(router.send_message([Message("user", "hi")]).content, "deepseek")
+        self.assertEqual(router.stats()["failovers"], 2)
+        self.assertEqual(router.service_name, "grok")
+        self.assertEqual(router.default_model, "grok-model")
+        self.assertIs(answering_service(router), router.services[2])
+
+        router = ServiceRouter([FakeService("grok", error=TimeoutError("down")),
+                                FakeService("openai", error=TimeoutError("down"))])
+        with self.assertRaises(TimeoutError):
+            router.send_message([Message("user", "hi")])
+
+    def test_fatal_error_does_not_fail_over(self):
+        """测试认证失败等不可重试的错误直接抛出，不发送给备用服务"""
+        backup = FakeService("openai")
+        router = ServiceRouter([FakeService("grok", error=ValueError("401 invalid api key")), backup])
+        with self.assertRaises(ValueError):
+            router.send_message([Message("user", "hi")])
+        with self.assertRaises(ValueError):
+            list(router.stream_message([Message("user", "hi")]))
+        with self.assertRaises(ValueError):
+            asyncio.run(router.send_message_async([Message("user", "hi")]))
+        self.assertEqual(backup.calls, 0)
+        self.assertEqual(router.stats()["failovers"], 0)
+
+    def test_cancelled_does_not_fail_over(self):
+        """测试取消不触发故障转移"""
+        backup = FakeService("openai")
+        router = ServiceRouter([FakeService("grok", error=AnalysisCancelled()), backup])
+        with self.assertRaises(AnalysisCancelled):
+            router.send_message([Message("user", "hi")])
+        self.assertEqual(backup.calls, 0)
+
+    def test_hedge_takes_faster_response(self):
+        """测试主服务超过p95仍未返回时发送对冲请求，取先返回的结果"""
+        router = ServiceRouter([FakeService("grok", delay=1.0), FakeService("openai", delay=0.05)],
+                               hedge=True, hedge_min_samples=5, hedge_min_delay=0.1)
+        self.assertIsNone(router.hedge_delay())
+        warm_up(router, 0.1)
+        started = time.monotonic()
+        self.assertEqual(router.send_message([Message("user", "hi")]).content, "openai")
+        self.assertLess(time.monotonic() - started, 0.8)
+        self.assertEqual((router.hedges, router.hedge_wins), (1, 1))
+
+    def test_no_hedge_when_primary_is_fast(self):
+        """测试主服务在阈值内返回时不发送对冲请求"""
+        backup = FakeService("openai")
+        router = ServiceRouter([FakeService("grok"), backup], hedge=True, hedge_min_samples=5, hedge_min_delay=0.5)
+        warm_up(router, 0.1)
+        self.assertEqual(router.send_message([Message("user", "hi")]).content, "grok")
+        self.assertEqual(backup.calls, 0)
+
+    def test_async_hedge(self):
+        """测试异步请求的对冲，较慢的请求被取消"""
+        router = ServiceRouter([FakeService("grok", delay=5.0), FakeService("openai", delay=0.05)],
+                               hedge=True, hedge_min_samples=5, hedge_min_delay=0.1)
+        warm_up(router, 0.1)
+        started = time.monotonic()
+        result = asyncio.run(router.send_message_async([Message("user", "hi")]))
+        self.assertEqual(result.content, "openai")
+        self.assertLess(time.monotonic() - started, 1)
+
+    def test_stream_failover_before_first_delta(self):
+        """测试流式请求在收到第一段文本之前失败时换用备用服务"""
+        router = ServiceRouter([FakeService("grok", error=TimeoutError("down")), FakeService("openai")])
+        self.assertEqual(list(router.stream_message([Message("user", "hi")])), ["o", "penai"])
+        self.assertIs(answering_service(router), router.services[1])
+
+    def test_journal_records_answering_service(self):
+        """测试任务日志按实际返回结果的备用服务记录任务键和模型，续跑时仍能找到"""
+        temp_dir = tempfile.mkdtemp()
+        try:
+            pdf_path = os.path.join(temp_dir, "paper.pdf")
+            with open(pdf_path, 'wb') as f:
+                f.write(b"%PDF")
+            router = ServiceRouter([FakeService("grok", error=TimeoutError("down")), FakeService("openai")])
+            self.assertEqual(candidate_services(router), router.services)
+            journal = JobJournal(temp_dir)
+            pipeline = AnalysisPipeline(router, "分析指令", journal=journal)
+            self.assertEqual(pipeline.analyze_file(pdf_path, [TextChunk("正文", 1, 1)])["content"], "openai")
+
+            backup_job = analysis_job_key(router.services[1], "分析指令")
+            self.assertEqual(journal.get_file(pdf_path, backup_job), "openai")
+            self.assertIsNone(journal.get_file(pdf_path, pipeline.job_key))
+            with open(journal.path, 'r', encoding='utf-8') as f:
+                self.assertIn('"model": "openai-model"', f.read())
+            self.assertEqual(JobJournal(temp_dir).get_file(pdf_path, pipeline.job_keys), "openai")
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+import unittest
+import os
+import shutil
+import tempfile
+import threading
+import time
+from services.message_types import Message
+from core.summary_builder import SummaryBuilder
+from core.result_writer import save_analysis_result, read_analysis_result
+
+
+class FakeService:
+    """按调用顺序返回固定文本的AI服务"""
+
+    def __init__(self):
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def send_message(self, messages):
+        with self._lock:
+            self.calls.append(messages)
+            return Message(role="assistant", content=f"汇总{len(self.calls)}")
+
+
+class StreamingService(FakeService):
+    """分段返回汇总文本的AI服务"""
+
+    def stream_message(self, messages):
+        content = self.send_message(messages).content
+        yield from (content[:1], content[1:])
+
+
+class TestSummaryBuilder(unittest.TestCase):
+    def _results(self, count):
+        return [
+            {"filename": f"paper{i}.pdf", "global_index": i,
+             "analysis_result": f"- 标题：论文{i}\n- 实现类型：official\n- 代码开源：是"}
+            for i in range(1, count + 1)
+        ]
+
+    def test_single_request(self):
+        """测试文件数不超过fan_out时只发送一次请求"""
+        service = FakeService()
+        report = SummaryBuilder(service, "汇总", fan_out=5, concurrency=2).build_report(self._results(3))
+        self.assertEqual(len(service.calls), 1)
+        self.assertIn("## 1. 汇总表格", report)
+        self.assertIn("| 3 | 论文3 | official |", report)
+        self.assertIn("- 官方实现（official）：3（100.0%）", report)
+        self.assertIn("## 3. 汇总分析\n\n汇总1", report)
+
+    def test_tree_reduce(self):
+        """测试分层汇总：5个文件按2个一组，共3+2+1次请求"""
+        service = FakeService()
+        statuses = []
+        builder = SummaryBuilder(service, "汇总", fan_out=2, concurrency=2, on_status=statuses.append)
+        builder.build_report(self._results(5))
+        self.assertEqual(len(service.calls), 6)
+        self.assertTrue(statuses)
+
+    def test_streaming_report(self):
+        """测试先返回表格和统计信息，再流式返回汇总分析，拼接结果与完整报告一致"""
+        parts = []
+        builder = SummaryBuilder(StreamingService(), "汇总", fan_out=2, concurrency=2,
+                                 on_partial_text=parts.append)
+        report = builder.build_report(self._results(3))
+        self.assertIn("## 2. 统计信息", parts[0])
+        self.assertEqual(parts[1:], ["汇", "总3"])
+        self.assertEqual("".join(parts) + "\n", report)
+
+    def test_empty_results(self):
+        """测试没有有效分析结果时抛出异常"""
+        builder = SummaryBuilder(FakeService(), "汇总", fan_out=2, concurrency=1)
+        with self.assertRaises(ValueError):
+            builder.build_report([{"filename": "a.pdf", "analysis_result": ""}])
+
+
+class TestReadAnalysisResult(unittest.TestCase):
+    def setUp(self):
+        """创建临时目录"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.pdf_path = os.path.join(self.temp_dir, "a.pdf")
+        with open(self.pdf_path, 'wb') as f:
+            f.write(b"%PDF")
+
+    def tearDown(self):
+        """删除临时目录"""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_round_trip(self):
+        """测试读取已保存的分析结果，去掉文件头"""
+        self.assertIsNone(read_analysis_result(self.pdf_path))
+        save_analysis_result(self.pdf_path, "分析结果")
+        self.assertEqual(read_analysis_result(self.pdf_path), "分析结果")
+
+    def test_stale_result(self):
+        """测试分析结果早于PDF时视为无效"""
+        result_path = save_analysis_result(self.pdf_path, "分析结果")
+        past = time.time() - 60
+        os.utime(result_path, (past, past))
+        self.assertIsNone(read_analysis_result(self.pdf_path))
+
+
+if __name__ == '__main__':
+    unittest.main()
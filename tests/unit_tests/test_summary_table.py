@@ -0,0 +1,52 @@
+import unittest
+from core.summary_table import (extract_analysis_fields, build_summary_table,
+                                compute_statistics, format_statistics)
+
+OFFICIAL_ANALYSIS = """1. 基本信息
+- 标题：Attention Is All You Need
+- 作者：Vaswani
+
+2. 实现情况分析
+- **实现类型**：official
+- 判断依据：论文中给出了作者维护的代码仓库
+- 代码开源：是
+- 代码链接：https://github.com/tensorflow/tensor2tensor
+"""
+
+
+class TestSummaryTable(unittest.TestCase):
+    def test_extract_fields(self):
+        """测试从分析报告中提取结构化字段"""
+        fields = extract_analysis_fields(OFFICIAL_ANALYSIS, 3, "paper")
+        self.assertEqual(fields.title, "Attention Is All You Need")
+        self.assertEqual(fields.implementation_type, "official")
+        self.assertEqual(fields.evidence, "论文中给出了作者维护的代码仓库")
+        self.assertTrue(fields.open_source)
+        self.assertEqual(fields.code_link, "https://github.com/tensorflow/tensor2tensor")
+
+    def test_missing_fields_use_defaults(self):
+        """测试缺失字段时使用默认值"""
+        fields = extract_analysis_fields("无法判断", 5, "paper")
+        self.assertEqual(fields.title, "paper")
+        self.assertEqual(fields.implementation_type, "未知")
+        self.assertFalse(fields.open_source)
+        self.assertIsNone(fields.code_link)
+
+    def test_table_and_statistics(self):
+        """测试表格按序号排序且统计正确"""
+        records = [
+            extract_analysis_fields("实现类型：[unofficial]\n代码开源：否", 10, "b"),
+            extract_analysis_fields(OFFICIAL_ANALYSIS, 2, "a"),
+        ]
+        rows = build_summary_table(records).split("\n")[2:]
+        self.assertEqual(len(rows), 2)
+        self.assertTrue(rows[0].startswith("| 2 |"))
+        self.assertTrue(rows[1].startswith("| 10 |"))
+
+        stats = compute_statistics(records)
+        self.assertEqual(stats, {"total": 2, "official": 1, "unofficial": 1, "未知": 0, "open_source": 1})
+        self.assertIn("官方实现（official）：1（50.0%）", format_statistics(stats))
+
+
+if __name__ == '__main__':
+    unittest.main()
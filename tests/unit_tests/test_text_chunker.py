@@ -0,0 +1,40 @@
+import unittest
+from core.text_chunker import iter_page_chunks
+
+
+def word_count(text):
+    return len(text.split())
+
+
+class TestTextChunker(unittest.TestCase):
+    def test_chunks_carry_page_range(self):
+        """测试文本块记录所在的页码范围"""
+        pages = ["a b\n\nc d", "e f", "g h i j"]
+        chunks = list(iter_page_chunks(pages, 6, word_count))
+        self.assertEqual([chunk.text for chunk in chunks], ["a b\n\nc d\n\ne f", "g h i j"])
+        self.assertEqual([(chunk.start_page, chunk.end_page) for chunk in chunks], [(1, 2), (3, 3)])
+        self.assertEqual(chunks[0].page_range, "1-2")
+        self.assertEqual(chunks[1].page_range, "3")
+
+    def test_pages_are_consumed_lazily(self):
+        """测试第一个块填满后立即产出，不等待读取后续页面"""
+        read_pages = []
+
+        def pages():
+            for i in range(1, 4):
+                read_pages.append(i)
+                yield "one two three"
+
+        chunks = iter_page_chunks(pages(), 3, word_count)
+        first = next(chunks)
+        self.assertEqual(first.start_page, 1)
+        self.assertEqual(read_pages, [1, 2])
+
+    def test_long_paragraph_split_by_sentence(self):
+        """测试超长段落按句子分割"""
+        chunks = iter_page_chunks(["a b. c d. e f"], 4, word_count)
+        self.assertEqual([chunk.text for chunk in chunks], ["a b. c d.", "e f."])
+
+
+if __name__ == '__main__':
+    unittest.main()
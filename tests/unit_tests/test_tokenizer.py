@@ -0,0 +1,44 @@
+import unittest
+from core.text_chunker import iter_page_chunks
+from core.tokenizer import max_chunk_tokens_for, get_token_counter, DEFAULT_MAX_CHUNK_TOKENS
+
+
+class WordCounter:
+    """按空格计数的计数器，记录批量调用次数"""
+
+    def __init__(self):
+        self.batch_calls = 0
+
+    def __call__(self, text):
+        return len(text.split())
+
+    def count_batch(self, texts):
+        self.batch_calls += 1
+        return [len(text.split()) for text in texts]
+
+
+class TestTokenizer(unittest.TestCase):
+    def test_max_chunk_tokens_from_context_window(self):
+        """测试根据上下文窗口计算分块大小"""
+        self.assertEqual(max_chunk_tokens_for({}), DEFAULT_MAX_CHUNK_TOKENS)
+        self.assertEqual(max_chunk_tokens_for({"context_window": 16385, "max_tokens": 4000}), 11385)
+        # 响应预留过大时至少保留上下文窗口的1/4
+        self.assertEqual(max_chunk_tokens_for({"context_window": 8192, "max_tokens": 8000}), 2048)
+
+    def test_counter_is_cached_per_model(self):
+        """测试相同模型共享计数器"""
+        self.assertIs(get_token_counter("gpt-4"), get_token_counter("gpt-4"))
+        self.assertIsNot(get_token_counter("gpt-4"), get_token_counter("gpt-3.5-turbo"))
+        self.assertGreater(get_token_counter("gpt-4").count("hello world"), 0)
+
+    def test_split_uses_batch_counter(self):
+        """测试分块时每页批量计算一次段落token数"""
+        counter = WordCounter()
+        page = "\n\n".join(["one two three"] * 4)
+        chunks = iter_page_chunks([page], 6, counter)
+        self.assertEqual([chunk.text for chunk in chunks], ["one two three\n\none two three"] * 2)
+        self.assertEqual(counter.batch_calls, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
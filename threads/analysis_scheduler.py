@@ -0,0 +1,209 @@
+from PyQt6.QtCore import QObject, pyqtSignal
+from utils.logger import Logger
+from utils.config_manager import ConfigManager
+from threads.analysis_thread import AnalysisThread
+from core.analysis_pipeline import AnalysisPipeline
+from core.pdf_reader import stream_pdf_chunks, create_extraction_pool
+from core.chunk_stream import ChunkStream, create_stream_manager
+from core.tokenizer import chunking_for_service
+from core.job_queue import AnalysisJobQueue
+from typing import Dict, Iterable, Set
+import os
+
+"""
+分析任务调度器
+"""
+class AnalysisScheduler(QObject):
+    """分析任务调度器
+
+    通过AnalysisJobQueue维护按文件全局序号(global_index)排序的队列，
+    限制同时运行的AnalysisThread数量，并对每个提供商单独限流。
+
+    任务分两个阶段执行：
+    1. 提取阶段：在进程池中边解析PDF文本边分块（CPU密集），每个块通过ChunkStream传给请求阶段
+    2. 请求阶段：AnalysisThread从流中逐块取出并发送分析请求（I/O密集），
+       第一个块分好后即开始请求，不等整个文件读完
+    已提交提取但尚未开始请求的文件数不超过extraction_queue_size
+    """
+    analysis_completed = pyqtSignal(str, str)  # 文件名, 分析结果
+    error_occurred = pyqtSignal(str, str)  # 文件名, 错误信息
+    status_updated = pyqtSignal(str)  # 状态更新信号
+    partial_result = pyqtSignal(str, str)  # 文件名, 最终分析的增量文本
+    all_finished = pyqtSignal()  # 队列中的任务全部完成
+
+    # 默认最大并发文件数
+    DEFAULT_MAX_CONCURRENT = 4
+    # 默认提取缓冲区大小（已提交提取、等待请求的文件数上限）
+    DEFAULT_EXTRACTION_QUEUE_SIZE = AnalysisJobQueue.DEFAULT_EXTRACTION_QUEUE_SIZE
+
+    def __init__(self, max_concurrent: int = None, provider_limits: Dict[str, int] = None, parent=None):
+        """初始化调度器
+
+        Args:
+            max_concurrent: 最大并发文件数，为None时读取配置analysis.max_concurrent_files
+            provider_limits: 提供商并发上限，键为"service"或"service.provider"，
+                为None时读取配置analysis.provider_concurrency
+            parent: 父对象
+        """
+        super().__init__(parent)
+        self.logger = Logger.create_logger('analysis_scheduler')
+
+        analysis_config = ConfigManager().get_config().get("analysis", {})
+        if max_concurrent is None:
+            max_concurrent = analysis_config.get("max_concurrent_files", self.DEFAULT_MAX_CONCURRENT)
+        if provider_limits is None:
+            provider_limits = analysis_config.get("provider_concurrency", {})
+        self.max_concurrent = max(1, int(max_concurrent))
+        # 提取进程数，为None时使用CPU核数
+        self.extraction_workers = analysis_config.get("extraction_workers")
+        self.queue = AnalysisJobQueue(
+            self.max_concurrent,
+            provider_limits,
+            analysis_config.get("extraction_queue_size", self.DEFAULT_EXTRACTION_QUEUE_SIZE)
+        )
+        # 传递给分析线程的PDF文本缓存（由调用方按目录设置）
+        self.text_cache = None
+        # 传递给分析线程的任务日志（由调用方按目录设置），为None时不续跑
+        self.journal = None
+
+        self._extraction_pool = None
+        # 传递文本块流的管理器进程，首次提取时启动，stop()后继续复用
+        self._stream_manager = None
+        self._running: Dict[AnalysisThread, str] = {}
+        # 已取消、仍在结束当前请求的线程，保留引用直到线程结束
+        self._stopping: Set[AnalysisThread] = set()
+
+    @property
+    def pending_count(self) -> int:
+        """等待中的任务数（包括等待提取和已开始提取、等待请求的任务）"""
+        return self.queue.pending_count
+
+    @property
+    def running_count(self) -> int:
+        """运行中的任务数"""
+        return len(self._running)
+
+    def is_idle(self) -> bool:
+        """是否没有等待或运行中的任务"""
+        return not self._running and self.pending_count == 0
+
+    def submit(self, file_path: str, global_index: int, ai_service, instruction: str):
+        """提交一个分析任务
+
+        Args:
+            file_path: PDF文件路径
+            global_index: 文件在file_index中的全局序号，决定出队顺序
+            ai_service: 使用的AI服务实例
+            instruction: 分析指令
+        """
+        self.queue.submit(file_path, global_index, ai_service, instruction)
+        self._dispatch()
+
+    def stop(self) -> int:
+        """清空等待队列并取消运行中的线程，立即返回
+
+        Returns:
+            int: 被取消的等待任务数
+        """
+        cancelled = self.pending_count
+        # 关闭等待请求的任务的文本块流，提取进程在下一个块之前停止
+        for job in self.queue.clear():
+            close = getattr(job[-1], "close", None)
+            if close is not None:
+                close()
+        if self._extraction_pool is not None:
+            self._extraction_pool.shutdown(wait=False, cancel_futures=True)
+            self._extraction_pool = None
+
+        # 协作式取消：线程在当前文本块之后自行结束，不等待在途请求，也不再转发其结果；
+        # 取消时流水线关闭线程正在读取的文本块流
+        for thread in list(self._running):
+            self.logger.info(f"正在取消线程: {thread.file_path}")
+            thread.analysis_completed.disconnect(self.analysis_completed)
+            thread.error_occurred.disconnect(self.error_occurred)
+            thread.status_updated.disconnect(self.status_updated)
+            thread.partial_result.disconnect(self.partial_result)
+            thread.cancel()
+            self._stopping.add(thread)
+        self._running.clear()
+
+        self.logger.info(f"调度器已停止，取消了 {cancelled} 个等待中的任务")
+        return cancelled
+
+    def _dispatch(self):
+        """开始提取等待中的任务，并在并发上限内启动请求线程"""
+        self._dispatch_extraction()
+        while len(self._running) < self.max_concurrent:
+            next_job = self.queue.next_job()
+            if next_job is None:
+                break
+
+            provider_key, (global_index, _, file_path, ai_service, instruction, pdf_chunks) = next_job
+            thread = AnalysisThread(file_path, ai_service, instruction,
+                                    text_cache=self.text_cache, pdf_chunks=pdf_chunks,
+                                    journal=self.journal)
+            thread.analysis_completed.connect(self.analysis_completed)
+            thread.error_occurred.connect(self.error_occurred)
+            thread.status_updated.connect(self.status_updated)
+            thread.partial_result.connect(self.partial_result)
+            thread.finished.connect(lambda t=thread: self._on_thread_finished(t))
+
+            self._running[thread] = provider_key
+            self.logger.info(
+                f"启动分析任务 #{global_index}: {os.path.basename(file_path)} "
+                f"(运行中 {len(self._running)}/{self.max_concurrent}, 等待 {self.pending_count})"
+            )
+            thread.start()
+
+        # 补充启动线程后空出的提取缓冲区
+        self._dispatch_extraction()
+
+    def _dispatch_extraction(self):
+        """在缓冲区上限内开始提取等待中的任务，提取开始后任务即可被请求线程取走"""
+        self.queue.start_extractions(self._start_extraction)
+
+    def _start_extraction(self, file_path: str, ai_service) -> Iterable:
+        """把PDF提交到进程池边读取边分块
+
+        Returns:
+            ChunkStream: 提取进程逐块产出的文本块流，提取出错时在请求线程迭代时抛出
+        """
+        if self._extraction_pool is None:
+            self._extraction_pool = create_extraction_pool(self.extraction_workers)
+        if self._stream_manager is None:
+            self._stream_manager = create_stream_manager()
+        stream = ChunkStream(self._stream_manager)
+        cache_directory = self.text_cache.directory if self.text_cache is not None else None
+        # 按该任务所用模型的分词器和分块大小在子进程中分块
+        counter, max_chunk_tokens = chunking_for_service(ai_service, AnalysisPipeline.MAX_CHUNK_TOKENS)
+        future = self._extraction_pool.submit(
+            stream_pdf_chunks, stream, file_path, max_chunk_tokens,
+            counter.model, counter.encoding_name, cache_directory
+        )
+        future.add_done_callback(lambda f: self._on_extraction_done(stream, f))
+        return stream
+
+    def _on_extraction_done(self, stream: ChunkStream, future):
+        """进程池回调线程中执行，提取进程未能正常运行时结束文本块流，避免请求线程一直等待"""
+        if future.cancelled():
+            stream.close()
+            return
+        error = future.exception()
+        if error is not None:
+            self.logger.error(f"提取进程异常退出: {str(error)}")
+            stream.put(error)
+
+    def _on_thread_finished(self, thread: AnalysisThread):
+        """线程结束后释放并发名额并调度下一个任务"""
+        if thread in self._stopping:
+            self._stopping.discard(thread)
+            thread.deleteLater()
+            return
+        provider_key = self._running.pop(thread, None)
+        if provider_key is not None:
+            self.queue.release(provider_key)
+        thread.deleteLater()
+
+        self._dispatch()
+        if self.is_idle():
+            self.all_finished.emit()
@@ -0,0 +1,66 @@
+from PyQt6.QtCore import QThread, pyqtSignal
+from utils.logger import Logger
+from core.async_engine import AsyncAnalysisEngine
+from core.cancellation import CancellationToken
+from typing import Dict, List
+import asyncio
+
+"""
+异步分析线程
+"""
+class AsyncAnalysisThread(QThread):
+    """在单个QThread中运行AsyncAnalysisEngine的事件循环，并把引擎事件转换为Qt信号
+
+    信号与AnalysisThread保持一致，ArticleForm可以使用相同的处理函数
+    """
+    analysis_completed = pyqtSignal(str, str)  # 文件名, 分析结果
+    error_occurred = pyqtSignal(str, str)  # 文件名, 错误信息
+    status_updated = pyqtSignal(str)  # 状态更新信号
+    partial_result = pyqtSignal(str, str)  # 文件名, 最终分析的增量文本
+
+    def __init__(self, file_paths: List[str], ai_service, instruction: str,
+                 max_in_flight: int = None, chunk_concurrency: int = None, text_cache=None,
+                 extraction_workers: int = None, journal=None):
+        super().__init__()
+        self.file_paths = list(file_paths)
+        self.ai_service = ai_service
+        self.instruction = instruction
+        self.max_in_flight = max_in_flight
+        self.chunk_concurrency = chunk_concurrency
+        self.text_cache = text_cache
+        self.extraction_workers = extraction_workers
+        self.journal = journal
+        self.cancel_token = CancellationToken()
+        self.logger = Logger.create_logger('async_analysis_thread')
+
+    def cancel(self):
+        """取消分析，立即返回，在途请求由事件循环中止后线程自行结束"""
+        self.cancel_token.cancel()
+
+    def _on_completed(self, file_path: str, record: Dict):
+        self.analysis_completed.emit(file_path, record["content"])
+
+    def _on_error(self, file_path: str, message: str):
+        self.error_occurred.emit(file_path, message)
+
+    def run(self):
+        try:
+            engine = AsyncAnalysisEngine(
+                self.ai_service,
+                self.instruction,
+                max_in_flight=self.max_in_flight,
+                chunk_concurrency=self.chunk_concurrency,
+                text_cache=self.text_cache,
+                extraction_workers=self.extraction_workers,
+                journal=self.journal,
+                cancel_token=self.cancel_token,
+                on_status=self.status_updated.emit,
+                on_completed=self._on_completed,
+                on_error=self._on_error,
+                on_partial_text=self.partial_result.emit
+            )
+            asyncio.run(engine.analyze_files(self.file_paths))
+            self.logger.info(f"异步分析完成，共 {len(self.file_paths)} 个文件")
+        except Exception as e:
+            self.logger.error(f"异步分析引擎运行失败: {str(e)}")
+            self.status_updated.emit(f"异步分析引擎运行失败: {str(e)}")
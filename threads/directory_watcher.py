@@ -0,0 +1,139 @@
+from PyQt6.QtCore import QObject, QTimer, pyqtSignal
+from utils.logger import Logger
+from utils.config_manager import ConfigManager
+from utils.pdf_change_tracker import PdfChangeTracker
+from typing import Optional
+
+"""
+目录监视器
+"""
+class DirectoryWatcher(QObject):
+    """目录监视器
+
+    安装了watchdog时使用文件系统事件（Linux下为inotify）得到变化的文件，
+    定时器只负责检查这些候选文件是否已写入完成；否则每次定时器触发时扫描目录。
+    新增或变化的PDF写入完成后通过files_ready发出，由调用方提交到分析调度器。
+    """
+    files_ready = pyqtSignal(list)  # 新增或变化的PDF文件路径
+    # watchdog在自己的线程中回调，通过信号转到监视器所在线程处理
+    _path_changed = pyqtSignal(str, bool)  # 路径, 是否为目录
+
+    # 默认检查间隔（毫秒）
+    DEFAULT_POLL_INTERVAL_MS = 2000
+
+    def __init__(self, file_index_manager, poll_interval_ms: int = None, settle_ms: int = None,
+                 use_watchdog: bool = None, parent=None):
+        """初始化监视器
+
+        Args:
+            file_index_manager: 文件索引管理器
+            poll_interval_ms: 检查间隔，为None时读取配置watch.poll_interval_ms
+            settle_ms: 文件停止变化多久后视为写入完成，为None时读取配置watch.settle_ms
+            use_watchdog: 是否使用watchdog，为None时读取配置watch.use_watchdog
+            parent: 父对象
+        """
+        super().__init__(parent)
+        self.logger = Logger.create_logger('directory_watcher')
+        self.file_index_manager = file_index_manager
+
+        watch_config = ConfigManager().get_config().get("watch", {})
+        if poll_interval_ms is None:
+            poll_interval_ms = watch_config.get("poll_interval_ms", self.DEFAULT_POLL_INTERVAL_MS)
+        if settle_ms is None:
+            settle_ms = watch_config.get("settle_ms", PdfChangeTracker.DEFAULT_SETTLE_SECONDS * 1000)
+        if use_watchdog is None:
+            use_watchdog = watch_config.get("use_watchdog", True)
+        self.settle_seconds = max(0, int(settle_ms)) / 1000
+        self.use_watchdog = use_watchdog
+
+        self.directory: Optional[str] = None
+        self._tracker: Optional[PdfChangeTracker] = None
+        self._observer = None
+        # 收到目录事件（如移入整个文件夹）后需要扫描一次
+        self._needs_scan = False
+
+        self._timer = QTimer(self)
+        self._timer.setInterval(max(100, int(poll_interval_ms)))
+        self._timer.timeout.connect(self._poll)
+        self._path_changed.connect(self._on_path_changed)
+
+    def is_watching(self) -> bool:
+        """是否正在监视"""
+        return self._tracker is not None
+
+    def start(self, directory: str) -> None:
+        """开始监视目录，已在监视其他目录时先停止"""
+        self.stop()
+        self.directory = directory
+        self._tracker = PdfChangeTracker(directory, self.file_index_manager, self.settle_seconds, self.logger)
+        self._observer = self._start_observer(directory) if self.use_watchdog else None
+        # 开始监视前可能已有新文件，先完整扫描一次
+        self._needs_scan = True
+        self._timer.start()
+        mode = "文件系统事件" if self._observer is not None else "定时扫描"
+        self.logger.info(f"开始监视目录: {directory}（{mode}）")
+
+    def stop(self) -> None:
+        """停止监视"""
+        self._timer.stop()
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join(timeout=2)
+            self._observer = None
+        if self._tracker is not None:
+            self.logger.info(f"停止监视目录: {self.directory}")
+        self._tracker = None
+
+    def _start_observer(self, directory: str):
+        """启动watchdog观察者，未安装watchdog时返回None"""
+        try:
+            from watchdog.observers import Observer
+            from watchdog.events import FileSystemEventHandler
+        except ImportError:
+            self.logger.info("未安装watchdog，使用定时扫描监视目录")
+            return None
+
+        path_changed = self._path_changed
+
+        class _Handler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                if event.is_directory:
+                    # 目录的修改事件由其中文件的变化引起，只有新建或移入的目录需要扫描
+                    if event.event_type not in ("created", "moved"):
+                        return
+                elif event.event_type in ("opened", "closed_no_write", "deleted"):
+                    return
+                for path in (event.src_path, getattr(event, "dest_path", "")):
+                    if path:
+                        path_changed.emit(str(path), event.is_directory)
+
+        observer = Observer()
+        observer.schedule(_Handler(), directory, recursive=True)
+        observer.daemon = True
+        try:
+            observer.start()
+        except Exception as e:
+            self.logger.warning(f"启动文件系统监视失败，使用定时扫描: {str(e)}")
+            return None
+        return observer
+
+    def _on_path_changed(self, path: str, is_directory: bool) -> None:
+        if self._tracker is None:
+            return
+        if is_directory:
+            self._needs_scan = True
+        else:
+            self._tracker.notify([path])
+
+    def _poll(self) -> None:
+        """定时检查变化"""
+        if self._tracker is None:
+            return
+        try:
+            full_scan = self._observer is None or self._needs_scan
+            self._needs_scan = False
+            ready = self._tracker.poll(full_scan=full_scan)
+            if ready:
+                self.files_ready.emit(ready)
+        except Exception as e:
+            self.logger.error(f"检查目录变化时发生错误: {str(e)}")
@@ -0,0 +1,135 @@
+"""
+内容哈希
+用文件大小和首尾各1MB的快速哈希找出可能重复的PDF，再用完整的SHA-256确认
+"""
+import hashlib
+import os
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+from utils.pdf_text_cache import hash_file
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+# 快速哈希读取的首尾字节数
+QUICK_HASH_SAMPLE_SIZE = 1024 * 1024
+# 快速哈希的前缀，区分使用的算法，算法不同时需要重新计算
+QUICK_HASH_PREFIX = "xxh3:" if xxhash is not None else "b2:"
+
+
+def _new_digest():
+    if xxhash is not None:
+        return xxhash.xxh3_64()
+    return hashlib.blake2b(digest_size=16)
+
+
+def quick_hash(file_path: str, sample_size: int = QUICK_HASH_SAMPLE_SIZE) -> str:
+    """计算文件的快速哈希：文件大小 + 首尾各sample_size字节
+
+    安装了xxhash时使用xxh3，否则使用blake2b。结果只用于找出可能重复的文件，
+    相同的快速哈希还需要通过完整哈希确认。
+    """
+    size = os.path.getsize(file_path)
+    digest = _new_digest()
+    with open(file_path, 'rb') as f:
+        digest.update(f.read(sample_size))
+        if size > sample_size:
+            f.seek(max(sample_size, size - sample_size))
+            digest.update(f.read(sample_size))
+    return f"{QUICK_HASH_PREFIX}{size}:{digest.hexdigest()}"
+
+
+def needs_quick_hash(info: dict) -> bool:
+    """索引中的文件是否需要(重新)计算快速哈希"""
+    return not str(info.get("content_hash") or "").startswith(QUICK_HASH_PREFIX)
+
+
+def resolve_duplicates(directory: str, files: Dict[str, dict]) -> Dict[str, dict]:
+    """根据内容哈希确定重复文件
+
+    快速哈希相同的文件计算完整的SHA-256（已有的直接复用），
+    内容完全相同的一组文件中序号最小的作为规范文件，其余文件的duplicate_of指向它。
+
+    Args:
+        directory: 索引目录
+        files: 索引中的文件，相对路径 -> 文件信息（index、content_hash、sha256、duplicate_of）
+
+    Returns:
+        Dict[str, dict]: 需要更新的文件 -> 要更新的字段，值为None表示删除该字段
+    """
+    groups: Dict[str, List[str]] = defaultdict(list)
+    for key, info in files.items():
+        if info.get("content_hash"):
+            groups[info["content_hash"]].append(key)
+
+    updates: Dict[str, dict] = defaultdict(dict)
+    duplicate_of: Dict[str, Optional[str]] = {}
+    for keys in groups.values():
+        if len(keys) < 2:
+            continue
+        by_full_hash: Dict[str, List[str]] = defaultdict(list)
+        for key in keys:
+            sha256 = files[key].get("sha256")
+            if not sha256:
+                try:
+                    sha256 = hash_file(os.path.join(directory, key))
+                except OSError:
+                    continue
+                updates[key]["sha256"] = sha256
+            by_full_hash[sha256].append(key)
+        for members in by_full_hash.values():
+            canonical = min(members, key=lambda k: int(files[k]["index"]))
+            for key in members:
+                if key != canonical:
+                    duplicate_of[key] = canonical
+
+    for key, info in files.items():
+        if info.get("duplicate_of") != duplicate_of.get(key):
+            updates[key]["duplicate_of"] = duplicate_of.get(key)
+    return dict(updates)
+
+
+def link_duplicates(directory: str, files: Dict[str, dict],
+                    file_paths: List[str]) -> Tuple[List[str], Dict[str, List[str]]]:
+    """把待分析文件中内容重复的文件替换为规范文件
+
+    Args:
+        directory: 索引目录
+        files: 索引中的文件，相对路径 -> 文件信息
+        file_paths: 待分析的文件路径
+
+    Returns:
+        tuple: (去重后的文件路径列表, 规范文件路径 -> 重复文件路径列表)
+    """
+    unique_paths = []
+    links: Dict[str, List[str]] = {}
+    for file_path in file_paths:
+        key = os.path.relpath(file_path, directory).replace(os.sep, '/')
+        canonical_key = files.get(key, {}).get("duplicate_of")
+        canonical_path = file_path
+        if canonical_key:
+            canonical_path = os.path.normpath(os.path.join(directory, canonical_key))
+            links.setdefault(canonical_path, []).append(file_path)
+        if canonical_path not in unique_paths:
+            unique_paths.append(canonical_path)
+    return unique_paths, links
+
+
+def expand_duplicate_results(results: Dict[str, str], links: Dict[str, List[str]]) -> Dict[str, str]:
+    """把规范文件的分析结果关联到内容相同的文件，供汇总时每个文件都有条目
+
+    Args:
+        results: 文件路径 -> 分析结果
+        links: link_duplicates返回的规范文件路径 -> 重复文件路径列表
+
+    Returns:
+        Dict[str, str]: 加入重复文件后的分析结果，重复文件排在其规范文件之后
+    """
+    expanded = {}
+    for file_path, content in results.items():
+        expanded[file_path] = content
+        for linked_path in links.get(file_path, []):
+            expanded.setdefault(linked_path, content)
+    return expanded
@@ -0,0 +1,144 @@
+"""
+目录扫描
+基于os.scandir递归查找PDF文件，缓存每个目录的修改时间和目录内容，
+再次扫描时只重新列出修改时间发生变化的目录
+"""
+import json
+import os
+import tempfile
+import time
+from typing import Dict, Optional
+
+
+def is_pdf_file(name: str) -> bool:
+    """是否为需要索引的PDF文件（排除macOS生成的._文件）"""
+    return name.lower().endswith('.pdf') and not name.startswith('._')
+
+
+class DirectoryScanner:
+    """递归目录扫描器
+
+    扫描缓存保存在根目录下的.scan_cache.json中，每个目录记录：
+    - mtime_ns: 目录的修改时间（增删、重命名文件时变化）
+    - subdirs: 子目录名
+    - files: PDF文件名
+    目录修改时间未变化时直接复用缓存的目录内容，不再列出目录。
+    原地修改文件不会改变所在目录的修改时间，因此文件的大小和修改时间不缓存，每次扫描都重新stat。
+    文件系统的时间戳精度有限，刚修改过的目录在同一时间刻度内再次变化时修改时间可能不变，
+    因此修改时间距扫描不足RACY_WINDOW_NS的目录不写入缓存的修改时间，下次扫描时会重新列出。
+    以.开头的目录（如.pdf_text_cache）不会被扫描。
+    根目录会因写入索引和扫描缓存而频繁变化，因此每次都重新列出，只对子目录使用缓存。
+    """
+
+    CACHE_FILE_NAME = ".scan_cache.json"
+    # 修改时间距扫描时刻小于该值（纳秒）的目录，下次扫描时仍重新列出
+    RACY_WINDOW_NS = 2_000_000_000
+
+    def __init__(self, root: str, logger=None):
+        """初始化扫描器
+
+        Args:
+            root: 根目录
+            logger: 日志记录器
+        """
+        self.root = root
+        self.cache_path = os.path.join(root, self.CACHE_FILE_NAME)
+        self.logger = logger
+        # 最近一次扫描中重新列出和复用缓存的目录数
+        self.scanned_dirs = 0
+        self.reused_dirs = 0
+
+    def _load_cache(self) -> Dict[str, dict]:
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                return json.load(f).get("dirs", {})
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            if self.logger:
+                self.logger.warning(f"扫描缓存损坏，将完整扫描目录: {str(e)}")
+            return {}
+
+    def _save_cache(self, dirs: Dict[str, dict]) -> None:
+        """先写临时文件再替换，避免留下不完整的缓存"""
+        fd, temp_path = tempfile.mkstemp(dir=self.root, prefix=".scan_cache.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({"dirs": dirs}, f, ensure_ascii=False)
+            os.replace(temp_path, self.cache_path)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def _list_dir(self, abs_dir: str, dir_mtime_ns: Optional[int]) -> dict:
+        """列出目录内容，os.scandir返回的目录项自带文件类型，无需额外调用stat判断"""
+        subdirs = []
+        files = []
+        with os.scandir(abs_dir) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    if not entry.name.startswith('.'):
+                        subdirs.append(entry.name)
+                elif is_pdf_file(entry.name) and entry.is_file():
+                    files.append(entry.name)
+        if dir_mtime_ns is not None and time.time_ns() - dir_mtime_ns < self.RACY_WINDOW_NS:
+            dir_mtime_ns = None
+        return {"mtime_ns": dir_mtime_ns, "subdirs": sorted(subdirs), "files": sorted(files)}
+
+    def scan(self) -> Dict[str, dict]:
+        """递归扫描根目录
+
+        Returns:
+            Dict[str, dict]: 相对根目录的路径（以/分隔） -> {"size": 字节数, "mtime": 修改时间(秒)}
+        """
+        old_dirs = self._load_cache()
+        new_dirs: Dict[str, dict] = {}
+        results: Dict[str, dict] = {}
+        self.scanned_dirs = 0
+        self.reused_dirs = 0
+
+        # (绝对路径, 相对路径) 的待扫描栈
+        stack = [(self.root, "")]
+        while stack:
+            abs_dir, rel_dir = stack.pop()
+            try:
+                dir_mtime_ns = os.stat(abs_dir).st_mtime_ns
+            except FileNotFoundError:
+                continue
+
+            cached: Optional[dict] = old_dirs.get(rel_dir)
+            # 旧版本的缓存按文件名记录了大小和修改时间，不再复用
+            if (rel_dir and cached is not None and cached["mtime_ns"] == dir_mtime_ns
+                    and isinstance(cached["files"], list)):
+                listing = cached
+                self.reused_dirs += 1
+            else:
+                listing = self._list_dir(abs_dir, dir_mtime_ns if rel_dir else None)
+                self.scanned_dirs += 1
+            new_dirs[rel_dir] = listing
+
+            prefix = f"{rel_dir}/" if rel_dir else ""
+            for name in listing["files"]:
+                try:
+                    stat = os.stat(os.path.join(abs_dir, name))
+                except FileNotFoundError:
+                    continue
+                results[prefix + name] = {"size": stat.st_size, "mtime": stat.st_mtime_ns / 1e9}
+            for name in listing["subdirs"]:
+                stack.append((os.path.join(abs_dir, name), prefix + name))
+
+        # 目录内容没有变化时不重写缓存，避免根目录的修改时间无谓地变化
+        if new_dirs != old_dirs:
+            try:
+                self._save_cache(new_dirs)
+            except OSError as e:
+                if self.logger:
+                    self.logger.warning(f"保存扫描缓存失败: {str(e)}")
+
+        if self.logger:
+            self.logger.info(
+                f"目录扫描完成: {self.root}，共 {len(results)} 个PDF文件，"
+                f"重新列出 {self.scanned_dirs} 个目录，复用缓存 {self.reused_dirs} 个目录"
+            )
+        return results
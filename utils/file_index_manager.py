@@ -1,137 +1,356 @@
 import os
+import copy
 import json
-from typing import Dict, List, Optional
+import atexit
+import tempfile
+import threading
+from typing import Dict, List, Optional, Set
 from datetime import datetime
+from utils.config_manager import ConfigManager
+from utils.directory_scanner import DirectoryScanner
+from utils.content_hash import quick_hash, needs_quick_hash, resolve_duplicates
 
 class FileIndexManager:
-    """文件索引管理器，用于维护目录下所有PDF文件的唯一序号"""
-    
-    def __init__(self, logger):
+    """文件索引管理器，用于维护目录下所有PDF文件的唯一序号
+
+    索引保存在内存中，状态更新只修改内存并标记目录为待写入，
+    由后台线程每flush_interval_ms毫秒或累计flush_max_changes次修改后
+    合并写入file_index.json。写入时先写临时文件再替换，中途崩溃不会留下不完整的索引。
+    """
+
+    # 默认的合并写入间隔（毫秒）
+    DEFAULT_FLUSH_INTERVAL_MS = 500
+    # 默认累计多少次修改后立即写入
+    DEFAULT_FLUSH_MAX_CHANGES = 50
+
+    def __init__(self, logger, flush_interval_ms: int = None, flush_max_changes: int = None):
+        """初始化索引管理器
+
+        Args:
+            logger: 日志记录器
+            flush_interval_ms: 合并写入间隔，为None时读取配置file_index.flush_interval_ms
+            flush_max_changes: 触发立即写入的修改次数，为None时读取配置file_index.flush_max_changes
+        """
         self.logger = logger
         self.index_file_name = "file_index.json"
-        
+
+        index_config = ConfigManager().get_config().get("file_index", {})
+        if flush_interval_ms is None:
+            flush_interval_ms = index_config.get("flush_interval_ms", self.DEFAULT_FLUSH_INTERVAL_MS)
+        if flush_max_changes is None:
+            flush_max_changes = index_config.get("flush_max_changes", self.DEFAULT_FLUSH_MAX_CHANGES)
+        self.flush_interval = max(1, int(flush_interval_ms)) / 1000
+        self.flush_max_changes = max(1, int(flush_max_changes))
+
+        # 目录路径 -> 内存中的索引
+        self._indexes: Dict[str, dict] = {}
+        # 有未写入修改的目录
+        self._dirty: Set[str] = set()
+        self._pending_changes = 0
+        self._lock = threading.Lock()
+        self._flush_event = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+        self._closed = False
+
     def generate_index(self, directory: str) -> Dict[str, dict]:
-        """为目录下的所有PDF文件生成索引
-        
+        """为目录及其子目录下的所有PDF文件生成索引
+
+        索引的键为相对目录的路径（以/分隔，根目录下的文件即为文件名），
+        每个文件记录扫描得到的大小(size)、修改时间(mtime)和内容哈希(content_hash)，
+        内容与序号更小的文件相同时记录duplicate_of
+
         Args:
             directory: 目录路径
-            
+
         Returns:
-            Dict: 包含文件索引信息的字典
+            Dict: 包含文件索引信息的字典（副本，修改不影响内存中的索引）
         """
         try:
             index_file_path = os.path.join(directory, self.index_file_name)
-            
-            # 如果索引文件已存在，加载它
-            if os.path.exists(index_file_path):
-                with open(index_file_path, 'r', encoding='utf-8') as f:
-                    existing_index = json.load(f)
-            else:
-                existing_index = {
-                    "metadata": {
-                        "created_at": datetime.now().isoformat(),
-                        "last_updated": datetime.now().isoformat(),
-                        "directory": directory,
-                        "total_files": 0
-                    },
-                    "files": {}
-                }
-            
-            # 获取目录下所有PDF文件
-            pdf_files = sorted([
-                f for f in os.listdir(directory)
-                if f.lower().endswith('.pdf') and not f.startswith('._')
-            ])
-            
-            # 更新索引
-            files_dict = existing_index["files"]
-            current_max_index = max([int(info["index"]) for info in files_dict.values()] + [0])
-            
-            # 为新文件添加索引
-            for file in pdf_files:
-                if file not in files_dict:
-                    current_max_index += 1
-                    files_dict[file] = {
-                        "index": current_max_index,
-                        "added_at": datetime.now().isoformat(),
-                        "last_analyzed": None,
-                        "analysis_count": 0,
-                        "included_in_summaries": []
-                    }
-            
-            # 更新元数据
-            existing_index["metadata"].update({
-                "last_updated": datetime.now().isoformat(),
-                "total_files": len(files_dict)
-            })
-            
-            # 保存索引文件
-            with open(index_file_path, 'w', encoding='utf-8') as f:
-                json.dump(existing_index, f, ensure_ascii=False, indent=2)
-            
+
+            # 递归获取目录下所有PDF文件，未变化的子目录直接使用扫描缓存
+            scanned = DirectoryScanner(directory, self.logger).scan()
+
+            with self._lock:
+                existing_index = self._get_index_locked(directory, create=True)
+                self._apply_scan_locked(existing_index, scanned)
+
+                # 更新元数据
+                existing_index["metadata"].update({
+                    "last_updated": datetime.now().isoformat(),
+                    "total_files": len(existing_index["files"])
+                })
+
+            # 计算内容哈希并标记重复文件
+            self._update_content_hashes(directory)
+
+            with self._lock:
+                # 打开目录时直接保存索引文件
+                self._write_locked(directory)
+                snapshot = copy.deepcopy(self._get_index_locked(directory))
+
             self.logger.info(f"文件索引已更新: {index_file_path}")
-            return existing_index
-            
+            return snapshot
+
         except Exception as e:
             self.logger.error(f"生成文件索引时发生错误: {str(e)}")
             raise
-    
+
+    @staticmethod
+    def _apply_scan_locked(index_data: dict, scanned: Dict[str, dict]) -> List[str]:
+        """把扫描结果合并到索引中：新文件追加序号，已有文件更新大小和修改时间
+
+        Returns:
+            List[str]: 新增或大小、修改时间发生变化的文件
+        """
+        files_dict = index_data["files"]
+        current_max_index = max([int(info["index"]) for info in files_dict.values()] + [0])
+        changed = []
+        for file in sorted(scanned):
+            stat = scanned[file]
+            info = files_dict.get(file)
+            if info is None:
+                current_max_index += 1
+                files_dict[file] = {
+                    "index": current_max_index,
+                    "added_at": datetime.now().isoformat(),
+                    "last_analyzed": None,
+                    "analysis_count": 0,
+                    "included_in_summaries": [],
+                    **stat
+                }
+                changed.append(file)
+            elif (info.get("size"), info.get("mtime")) != (stat["size"], stat["mtime"]):
+                info.update(stat)
+                # 内容可能已变化，需要重新计算哈希
+                info.pop("content_hash", None)
+                info.pop("sha256", None)
+                changed.append(file)
+        return changed
+
+    def _update_content_hashes(self, directory: str) -> None:
+        """为缺少内容哈希的文件计算快速哈希，并更新重复文件的标记
+
+        读取文件时不持有锁，不阻塞状态更新
+        """
+        with self._lock:
+            files_dict = self._get_index_locked(directory)["files"]
+            to_hash = [key for key, info in files_dict.items() if needs_quick_hash(info)]
+
+        hashes = {}
+        for key in to_hash:
+            try:
+                hashes[key] = quick_hash(os.path.join(directory, key))
+            except OSError as e:
+                self.logger.warning(f"计算文件哈希失败: {key}, {str(e)}")
+
+        with self._lock:
+            files_dict = self._get_index_locked(directory)["files"]
+            for key, content_hash in hashes.items():
+                files_dict[key]["content_hash"] = content_hash
+            snapshot = {key: dict(info) for key, info in files_dict.items()}
+
+        updates = resolve_duplicates(directory, snapshot)
+
+        with self._lock:
+            files_dict = self._get_index_locked(directory)["files"]
+            for key, fields in updates.items():
+                for field, value in fields.items():
+                    if value is None:
+                        files_dict[key].pop(field, None)
+                    else:
+                        files_dict[key][field] = value
+            if hashes or updates:
+                self._mark_dirty_locked(directory)
+            duplicates = sum(1 for info in files_dict.values() if info.get("duplicate_of"))
+        if duplicates:
+            self.logger.info(f"发现 {duplicates} 个与其他文件内容相同的PDF")
+
+    def apply_scan(self, directory: str, scanned: Dict[str, dict]) -> List[str]:
+        """增量更新索引（只修改内存，由后台线程写入文件）
+
+        Args:
+            directory: 目录路径
+            scanned: 相对路径 -> {"size", "mtime"}，只需包含要更新的文件
+
+        Returns:
+            List[str]: 新增或发生变化的文件
+        """
+        with self._lock:
+            index_data = self._get_index_locked(directory, create=True)
+            changed = self._apply_scan_locked(index_data, scanned)
+            if changed:
+                index_data["metadata"].update({
+                    "last_updated": datetime.now().isoformat(),
+                    "total_files": len(index_data["files"])
+                })
+                self._mark_dirty_locked(directory)
+        if changed:
+            self._update_content_hashes(directory)
+        return changed
+
+    def load_index(self, directory: str) -> Dict[str, dict]:
+        """读取完整索引
+
+        返回内存中索引的副本：后台线程写入文件时会遍历内存中的索引，
+        所有修改都必须在持有锁的方法中进行
+        """
+        with self._lock:
+            return copy.deepcopy(self._get_index_locked(directory))
+
+    def _key(self, directory: str) -> str:
+        return os.path.abspath(directory)
+
+    def _get_index_locked(self, directory: str, create: bool = False) -> dict:
+        """获取内存中的索引，首次访问时从文件加载"""
+        key = self._key(directory)
+        index_data = self._indexes.get(key)
+        if index_data is not None:
+            return index_data
+
+        index_file_path = os.path.join(directory, self.index_file_name)
+        if os.path.exists(index_file_path):
+            with open(index_file_path, 'r', encoding='utf-8') as f:
+                index_data = json.load(f)
+        elif create:
+            index_data = {
+                "metadata": {
+                    "created_at": datetime.now().isoformat(),
+                    "last_updated": datetime.now().isoformat(),
+                    "directory": directory,
+                    "total_files": 0
+                },
+                "files": {}
+            }
+        else:
+            raise FileNotFoundError(f"索引文件不存在: {index_file_path}")
+
+        self._indexes[key] = index_data
+        return index_data
+
+    def _write_locked(self, directory: str) -> None:
+        """把内存中的索引写入文件：先写同目录下的临时文件，再原子替换"""
+        key = self._key(directory)
+        content = json.dumps(self._indexes[key], ensure_ascii=False, indent=2)
+        fd, temp_path = tempfile.mkstemp(dir=key, prefix=".file_index.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(content)
+            os.replace(temp_path, os.path.join(key, self.index_file_name))
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        self._dirty.discard(key)
+
+    def _mark_dirty_locked(self, directory: str) -> None:
+        """标记目录有未写入的修改，累计修改达到上限时唤醒后台线程立即写入"""
+        self._dirty.add(self._key(directory))
+        self._pending_changes += 1
+        if self._flusher is None:
+            self._flusher = threading.Thread(target=self._flush_loop, name="file-index-flusher", daemon=True)
+            self._flusher.start()
+            atexit.register(self.close)
+        if self._pending_changes >= self.flush_max_changes:
+            self._flush_event.set()
+
+    def _flush_loop(self) -> None:
+        """后台写入线程"""
+        while not self._closed:
+            self._flush_event.wait(self.flush_interval)
+            self._flush_event.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                self.logger.error(f"写入文件索引时发生错误: {str(e)}")
+
+    def flush(self) -> None:
+        """立即写入所有未保存的修改"""
+        with self._lock:
+            for key in list(self._dirty):
+                self._write_locked(key)
+            self._pending_changes = 0
+
+    def close(self) -> None:
+        """写入未保存的修改并停止后台线程"""
+        self._closed = True
+        self._flush_event.set()
+        if self._flusher is not None and self._flusher is not threading.current_thread():
+            self._flusher.join()
+        self.flush()
+
+    def get_file(self, directory: str, filename: str) -> Optional[dict]:
+        """按文件名查询索引信息（副本），不存在时返回None"""
+        with self._lock:
+            return copy.deepcopy(self._get_index_locked(directory)["files"].get(filename))
+
+    def get_file_by_index(self, directory: str, index: int) -> Optional[str]:
+        """按序号查询文件名，不存在时返回None"""
+        with self._lock:
+            for filename, info in self._get_index_locked(directory)["files"].items():
+                if int(info["index"]) == int(index):
+                    return filename
+        return None
+
     def update_analysis_status(self, directory: str, filename: str) -> None:
-        """更新文件的分析状态
-        
+        """更新文件的分析状态（只修改内存，由后台线程写入文件）
+
         Args:
             directory: 目录路径
             filename: 文件名
         """
         try:
-            index_file_path = os.path.join(directory, self.index_file_name)
-            if not os.path.exists(index_file_path):
-                raise FileNotFoundError(f"索引文件不存在: {index_file_path}")
-            
-            with open(index_file_path, 'r', encoding='utf-8') as f:
-                index_data = json.load(f)
-            
-            if filename in index_data["files"]:
-                index_data["files"][filename].update({
-                    "last_analyzed": datetime.now().isoformat(),
-                    "analysis_count": index_data["files"][filename]["analysis_count"] + 1
-                })
-                
-                with open(index_file_path, 'w', encoding='utf-8') as f:
-                    json.dump(index_data, f, ensure_ascii=False, indent=2)
-                    
+            with self._lock:
+                index_data = self._get_index_locked(directory)
+                if filename in index_data["files"]:
+                    index_data["files"][filename].update({
+                        "last_analyzed": datetime.now().isoformat(),
+                        "analysis_count": index_data["files"][filename]["analysis_count"] + 1
+                    })
+                    self._mark_dirty_locked(directory)
+
             self.logger.info(f"已更新文件分析状态: {filename}")
-            
+
         except Exception as e:
             self.logger.error(f"更新文件分析状态时发生错误: {str(e)}")
             raise
-    
+
     def update_summary_status(self, directory: str, filenames: List[str], summary_id: str) -> None:
-        """更新文件的汇总状态
-        
+        """更新文件的汇总状态（只修改内存，由后台线程写入文件）
+
         Args:
             directory: 目录路径
             filenames: 文件名列表
             summary_id: 汇总ID
         """
         try:
-            index_file_path = os.path.join(directory, self.index_file_name)
-            if not os.path.exists(index_file_path):
-                raise FileNotFoundError(f"索引文件不存在: {index_file_path}")
-            
-            with open(index_file_path, 'r', encoding='utf-8') as f:
-                index_data = json.load(f)
-            
-            for filename in filenames:
-                if filename in index_data["files"]:
-                    if summary_id not in index_data["files"][filename]["included_in_summaries"]:
-                        index_data["files"][filename]["included_in_summaries"].append(summary_id)
-            
-            with open(index_file_path, 'w', encoding='utf-8') as f:
-                json.dump(index_data, f, ensure_ascii=False, indent=2)
-                
+            with self._lock:
+                index_data = self._get_index_locked(directory)
+                for filename in filenames:
+                    if filename in index_data["files"]:
+                        if summary_id not in index_data["files"][filename]["included_in_summaries"]:
+                            index_data["files"][filename]["included_in_summaries"].append(summary_id)
+                self._mark_dirty_locked(directory)
+
             self.logger.info(f"已更新文件汇总状态: {summary_id}")
-            
+
         except Exception as e:
             self.logger.error(f"更新文件汇总状态时发生错误: {str(e)}")
             raise
+
+
+def create_file_index_manager(logger, backend: str = None):
+    """创建文件索引管理器
+
+    Args:
+        logger: 日志记录器
+        backend: "json"或"sqlite"，为None时读取配置file_index.backend
+    """
+    if backend is None:
+        backend = ConfigManager().get_config().get("file_index", {}).get("backend", "json")
+    if backend == "sqlite":
+        from utils.sqlite_file_index import SqliteFileIndexManager
+        return SqliteFileIndexManager(logger)
+    if backend != "json":
+        logger.warning(f"未知的文件索引后端: {backend}，使用json")
+    return FileIndexManager(logger)
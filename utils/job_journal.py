@@ -0,0 +1,175 @@
+"""
+分析任务日志
+以追加方式记录每个文件、每个文本块的完成情况，程序崩溃或停止后重新开始时
+跳过已完成的文件，部分完成的文件从未完成的文本块继续
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from typing import Dict, Iterable, Optional, Tuple, Union
+
+
+def text_hash(text: str) -> str:
+    """计算文本的SHA-256"""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def job_key(service_name: str, model: str, instruction: str, *prompts: str) -> str:
+    """根据服务、模型和提示词计算任务键，任一项变化时已有记录不再复用"""
+    return text_hash("\0".join([service_name or "", model or "", instruction, *prompts]))[:16]
+
+
+class JobJournal:
+    """分析任务日志
+
+    日志保存在 <目录>/.analysis_journal.jsonl，与file_index.json同级，每行一条JSON记录：
+    - chunk：文件的一个文本块已分析，记录块序号、块文本哈希和分析结果
+    - file：文件已完成分析，记录文件大小、修改时间和最终结果
+    记录只追加不修改，每条记录写入后立即落盘；中断时写了一半的最后一行在加载时忽略。
+    同一文件、同一任务键的后写记录覆盖先写记录，文件完成后其文本块记录不再需要，
+    过期记录较多时在打开日志时压缩。
+    """
+
+    FILE_NAME = ".analysis_journal.jsonl"
+    # 过期记录数超过有效记录数的该倍数时压缩日志
+    COMPACT_RATIO = 2
+
+    def __init__(self, directory: str, logger=None):
+        """打开任务日志
+
+        Args:
+            directory: 索引目录（file_index.json所在目录）
+            logger: 日志记录器
+        """
+        self.directory = directory
+        self.path = os.path.join(directory, self.FILE_NAME)
+        self.logger = logger
+        self._lock = threading.Lock()
+        # (文件键, 任务键) -> 文件完成记录
+        self._files: Dict[Tuple[str, str], dict] = {}
+        # (文件键, 任务键) -> {块序号: 块记录}
+        self._chunks: Dict[Tuple[str, str], Dict[int, dict]] = {}
+        self._line_count = 0
+        self._load()
+        if self._line_count > (self.COMPACT_RATIO + 1) * max(1, self._live_count()):
+            self.compact()
+
+    def _file_key(self, file_path: str) -> str:
+        """获取文件相对于索引目录的路径，作为记录中的文件键"""
+        relative_path = os.path.relpath(os.path.abspath(file_path), os.path.abspath(self.directory))
+        return relative_path.replace(os.sep, '/')
+
+    def _apply(self, record: dict):
+        key = (record["file"], record["job"])
+        if record["type"] == "file":
+            self._files[key] = record
+            self._chunks.pop(key, None)
+        elif record["type"] == "chunk":
+            self._chunks.setdefault(key, {})[int(record["chunk"])] = record
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    self._line_count += 1
+                    try:
+                        self._apply(json.loads(line))
+                    except (ValueError, KeyError, TypeError):
+                        if self.logger:
+                            self.logger.warning(f"忽略任务日志中不完整的记录: {self.path} 第{self._line_count}行")
+        except FileNotFoundError:
+            pass
+
+    def _live_records(self):
+        yield from self._files.values()
+        for chunks in self._chunks.values():
+            yield from chunks.values()
+
+    def _live_count(self) -> int:
+        return len(self._files) + sum(len(chunks) for chunks in self._chunks.values())
+
+    def _append(self, record: dict):
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+            self._apply(record)
+            self._line_count += 1
+
+    def compact(self):
+        """只保留有效记录重写日志，先写临时文件再替换"""
+        with self._lock:
+            fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    for record in self._live_records():
+                        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                os.replace(temp_path, self.path)
+            except Exception:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                raise
+            self._line_count = self._live_count()
+
+    @staticmethod
+    def _jobs(job: Union[str, Iterable[str]]) -> Iterable[str]:
+        return [job] if isinstance(job, str) else job
+
+    def get_file(self, file_path: str, job: Union[str, Iterable[str]]) -> Optional[str]:
+        """获取已完成文件的最终结果，未完成或文件在完成后被修改时返回None
+
+        job可以是多个任务键，按顺序使用第一条有效的记录
+        """
+        file_key = self._file_key(file_path)
+        records = [self._files[(file_key, key)] for key in self._jobs(job) if (file_key, key) in self._files]
+        if not records:
+            return None
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return None
+        for record in records:
+            if record["size"] == stat.st_size and record["mtime_ns"] == stat.st_mtime_ns:
+                return record["content"]
+        return None
+
+    def get_chunk(self, file_path: str, job: Union[str, Iterable[str]], chunk_number: int,
+                  chunk_text: str) -> Optional[str]:
+        """获取已分析文本块的结果，块内容变化时返回None；job可以是多个任务键"""
+        file_key = self._file_key(file_path)
+        chunk_hash = text_hash(chunk_text)
+        for key in self._jobs(job):
+            record = self._chunks.get((file_key, key), {}).get(chunk_number)
+            if record is not None and record["hash"] == chunk_hash:
+                return record["content"]
+        return None
+
+    def record_chunk(self, file_path: str, job: str, chunk_number: int, chunk_text: str,
+                     content: str, model: str = None):
+        """记录一个文本块的分析结果"""
+        self._append({
+            "type": "chunk",
+            "file": self._file_key(file_path),
+            "job": job,
+            "model": model,
+            "chunk": chunk_number,
+            "hash": text_hash(chunk_text),
+            "content": content
+        })
+
+    def record_file(self, file_path: str, job: str, content: str, model: str = None):
+        """记录文件的最终分析结果"""
+        stat = os.stat(file_path)
+        self._append({
+            "type": "file",
+            "file": self._file_key(file_path),
+            "job": job,
+            "model": model,
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "content": content
+        })
@@ -0,0 +1,110 @@
+"""
+PDF变化跟踪
+找出目录中新增或发生变化、且已写入完成的PDF文件，并增量更新文件索引
+"""
+import os
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+from utils.directory_scanner import DirectoryScanner, is_pdf_file
+
+
+class PdfChangeTracker:
+    """PDF变化跟踪器
+
+    变化的来源有两种：
+    - poll(full_scan=True)时用DirectoryScanner扫描目录（只重新列出发生变化的子目录）
+    - notify()传入的文件路径（如文件系统事件）
+    发现变化的文件先作为候选，只有连续两次检查的大小和修改时间相同，
+    且修改时间已超过settle_seconds时才视为写入完成，此时更新索引并返回，
+    避免分析正在下载或复制中的文件。
+    """
+
+    DEFAULT_SETTLE_SECONDS = 3.0
+
+    def __init__(self, directory: str, file_index_manager, settle_seconds: float = None, logger=None):
+        """初始化跟踪器
+
+        Args:
+            directory: 监视的目录
+            file_index_manager: 文件索引管理器（FileIndexManager或SqliteFileIndexManager）
+            settle_seconds: 文件停止变化多少秒后视为写入完成
+            logger: 日志记录器
+        """
+        self.directory = directory
+        self.file_index_manager = file_index_manager
+        self.settle_seconds = self.DEFAULT_SETTLE_SECONDS if settle_seconds is None else max(0.0, settle_seconds)
+        self.logger = logger
+
+        # 索引中已记录的文件：相对路径 -> (大小, 修改时间)
+        index = file_index_manager.load_index(directory)
+        self._known: Dict[str, Tuple] = {
+            key: (info.get("size"), info.get("mtime")) for key, info in index["files"].items()
+        }
+        # 候选文件：相对路径 -> 上次检查时的(大小, 修改时间)，尚未检查过为None
+        self._candidates: Dict[str, Optional[Tuple]] = {}
+
+    @property
+    def pending_count(self) -> int:
+        """等待写入完成的候选文件数"""
+        return len(self._candidates)
+
+    def _key(self, path: str) -> Optional[str]:
+        """文件在索引中的键，不在监视目录下或不是PDF时返回None"""
+        relpath = os.path.relpath(os.path.abspath(path), os.path.abspath(self.directory))
+        if relpath.startswith(os.pardir) or not is_pdf_file(os.path.basename(relpath)):
+            return None
+        parts = relpath.split(os.sep)
+        # 与DirectoryScanner一致，跳过以.开头的目录
+        if any(part.startswith('.') for part in parts[:-1]):
+            return None
+        return '/'.join(parts)
+
+    def notify(self, paths: Iterable[str]) -> None:
+        """记录可能发生变化的文件"""
+        for path in paths:
+            key = self._key(path)
+            if key is not None:
+                self._candidates.setdefault(key, None)
+
+    def poll(self, full_scan: bool = True) -> List[str]:
+        """检查变化
+
+        Args:
+            full_scan: 是否扫描目录查找变化，为False时只检查已记录的候选文件
+
+        Returns:
+            List[str]: 新增或发生变化且已写入完成的PDF文件路径
+        """
+        if full_scan:
+            for key, stat in DirectoryScanner(self.directory, self.logger).scan().items():
+                if self._known.get(key) != (stat["size"], stat["mtime"]):
+                    self._candidates.setdefault(key, None)
+
+        now = time.time()
+        settled: Dict[str, dict] = {}
+        for key, last_seen in list(self._candidates.items()):
+            try:
+                stat = os.stat(os.path.join(self.directory, key))
+            except FileNotFoundError:
+                del self._candidates[key]
+                continue
+
+            current = (stat.st_size, stat.st_mtime_ns / 1e9)
+            if current == self._known.get(key):
+                # 事件触发但内容未变化
+                del self._candidates[key]
+            elif current == last_seen and now - current[1] >= self.settle_seconds:
+                del self._candidates[key]
+                settled[key] = {"size": current[0], "mtime": current[1]}
+            else:
+                self._candidates[key] = current
+
+        if not settled:
+            return []
+
+        self.file_index_manager.apply_scan(self.directory, settled)
+        for key, stat in settled.items():
+            self._known[key] = (stat["size"], stat["mtime"])
+        if self.logger:
+            self.logger.info(f"发现 {len(settled)} 个新增或变化的PDF文件: {', '.join(sorted(settled))}")
+        return [os.path.normpath(os.path.join(self.directory, key)) for key in sorted(settled)]
@@ -0,0 +1,166 @@
+"""
+PDF文本提取缓存
+把每个PDF按页提取的文本压缩保存在索引目录下，文件未变化时跳过PDF解析
+"""
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+from typing import List, Optional
+
+
+def hash_file(file_path: str, block_size: int = 1024 * 1024) -> str:
+    """计算文件内容的SHA-256"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class PdfTextCache:
+    """PDF文本缓存
+
+    缓存保存在 <目录>/.pdf_text_cache/ 下，与file_index.json同级。
+    每个PDF对应一个gzip压缩的JSON文件，记录文件大小、修改时间、内容哈希和逐页文本：
+    - 大小和修改时间都未变化时直接命中
+    - 修改时间变化但内容哈希相同（如文件被复制或touch）时仍然命中，并更新记录
+    """
+
+    CACHE_DIR_NAME = ".pdf_text_cache"
+
+    def __init__(self, directory: str, logger=None):
+        """初始化缓存
+
+        Args:
+            directory: 索引目录（file_index.json所在目录）
+            logger: 日志记录器
+        """
+        self.directory = directory
+        self.cache_dir = os.path.join(directory, self.CACHE_DIR_NAME)
+        self.logger = logger
+        self.hits = 0
+        self.misses = 0
+
+    def _entry_path(self, file_path: str) -> str:
+        """获取PDF对应的缓存文件路径"""
+        relative_path = os.path.relpath(os.path.abspath(file_path), os.path.abspath(self.directory))
+        name = hashlib.sha1(relative_path.replace(os.sep, '/').encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, f"{name}.json.gz")
+
+    def _load_entry(self, entry_path: str) -> Optional[dict]:
+        try:
+            with gzip.open(entry_path, 'rt', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            if self.logger:
+                self.logger.warning(f"PDF文本缓存损坏，将重新提取: {entry_path}, {str(e)}")
+            return None
+
+    def _write_entry(self, entry_path: str, entry: dict) -> None:
+        """先写临时文件再替换，避免并发或中断时留下不完整的缓存"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as raw, gzip.open(raw, 'wt', encoding='utf-8') as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.replace(temp_path, entry_path)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def get(self, file_path: str) -> Optional[List[str]]:
+        """获取缓存的逐页文本，文件已变化或未缓存时返回None"""
+        entry_path = self._entry_path(file_path)
+        entry = self._load_entry(entry_path)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        stat = os.stat(file_path)
+        if entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+            self.hits += 1
+            return entry["pages"]
+
+        # 大小相同时用内容哈希确认文件是否真的变化
+        if entry["size"] == stat.st_size and entry["sha256"] == hash_file(file_path):
+            entry["mtime_ns"] = stat.st_mtime_ns
+            self._write_entry(entry_path, entry)
+            self.hits += 1
+            return entry["pages"]
+
+        self.misses += 1
+        return None
+
+    def put(self, file_path: str, pages: List[str]) -> None:
+        """保存PDF的逐页文本"""
+        writer = self.open_writer(file_path)
+        try:
+            for page_text in pages:
+                writer.add(page_text)
+        except BaseException:
+            writer.abort()
+            raise
+        writer.commit()
+
+    def open_writer(self, file_path: str) -> "PdfTextCacheWriter":
+        """开始逐页写入PDF的缓存，边提取边写入，不在内存中保留已提取的页面"""
+        return PdfTextCacheWriter(self, file_path)
+
+
+class PdfTextCacheWriter:
+    """逐页写入一个PDF的缓存
+
+    页面压缩写入临时文件，commit()时补上文件大小、修改时间和内容哈希后原子替换；
+    abort()或提取中断时删除临时文件，不会留下不完整的缓存
+    """
+
+    def __init__(self, cache: PdfTextCache, file_path: str):
+        self.file_path = file_path
+        self.entry_path = cache._entry_path(file_path)
+        # 记录开始提取时的大小和修改时间，提取期间文件被修改时下次读取不会命中
+        self.stat = os.stat(file_path)
+        os.makedirs(cache.cache_dir, exist_ok=True)
+        fd, self.temp_path = tempfile.mkstemp(dir=cache.cache_dir, suffix='.tmp')
+        self._raw = os.fdopen(fd, 'wb')
+        self._file = gzip.open(self._raw, 'wt', encoding='utf-8')
+        self._file.write('{"pages": [')
+        self._page_count = 0
+
+    def add(self, page_text: str) -> None:
+        """写入下一页的文本"""
+        if self._page_count:
+            self._file.write(', ')
+        self._file.write(json.dumps(page_text, ensure_ascii=False))
+        self._page_count += 1
+
+    def _close(self) -> None:
+        self._file.close()
+        self._raw.close()
+
+    def commit(self) -> None:
+        """写入文件信息并替换缓存文件"""
+        try:
+            info = {
+                "file": os.path.basename(self.file_path),
+                "size": self.stat.st_size,
+                "mtime_ns": self.stat.st_mtime_ns,
+                "sha256": hash_file(self.file_path)
+            }
+            # 与页面列表拼成一个JSON对象
+            self._file.write('], ' + json.dumps(info, ensure_ascii=False)[1:])
+            self._close()
+            os.replace(self.temp_path, self.entry_path)
+        except BaseException:
+            self.abort()
+            raise
+
+    def abort(self) -> None:
+        """放弃写入并删除临时文件"""
+        self._close()
+        if os.path.exists(self.temp_path):
+            os.remove(self.temp_path)
@@ -0,0 +1,344 @@
+import os
+import json
+import sqlite3
+import threading
+from typing import Dict, List, Optional
+from datetime import datetime
+from utils.directory_scanner import DirectoryScanner
+from utils.content_hash import quick_hash, needs_quick_hash, resolve_duplicates
+
+class SqliteFileIndexManager:
+    """基于SQLite的文件索引管理器
+
+    与FileIndexManager接口相同，索引保存在目录下的file_index.sqlite中（WAL模式）。
+    每次状态更新只修改对应的行，按文件名和序号的查询都走索引，
+    不再随文件数量增长而变慢。首次打开已有file_index.json的目录时自动迁移。
+    """
+
+    # 建表之后增加的列
+    _ADDED_COLUMNS = (("size", "INTEGER"), ("mtime", "REAL"), ("content_hash", "TEXT"),
+                      ("sha256", "TEXT"), ("duplicate_of", "TEXT"))
+    # 可选字段，值为NULL时不出现在文件信息中
+    _OPTIONAL_FIELDS = ("size", "mtime", "content_hash", "sha256", "duplicate_of")
+
+    def __init__(self, logger):
+        self.logger = logger
+        self.index_file_name = "file_index.sqlite"
+        self.json_index_file_name = "file_index.json"
+        self._connections: Dict[str, sqlite3.Connection] = {}
+        self._lock = threading.RLock()
+
+    def _connect(self, directory: str) -> sqlite3.Connection:
+        """获取目录对应的数据库连接，首次连接时建表并迁移JSON索引"""
+        key = os.path.abspath(directory)
+        with self._lock:
+            conn = self._connections.get(key)
+            if conn is not None:
+                return conn
+
+            db_path = os.path.join(directory, self.index_file_name)
+            is_new = not os.path.exists(db_path)
+            conn = sqlite3.connect(db_path, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            with conn:
+                conn.execute("CREATE TABLE IF NOT EXISTS metadata (key TEXT PRIMARY KEY, value TEXT)")
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS files ("
+                    " filename TEXT PRIMARY KEY,"
+                    " file_index INTEGER NOT NULL UNIQUE,"
+                    " added_at TEXT NOT NULL,"
+                    " last_analyzed TEXT,"
+                    " analysis_count INTEGER NOT NULL DEFAULT 0,"
+                    " size INTEGER,"
+                    " mtime REAL,"
+                    " content_hash TEXT,"
+                    " sha256 TEXT,"
+                    " duplicate_of TEXT)"
+                )
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS summaries ("
+                    " filename TEXT NOT NULL,"
+                    " summary_id TEXT NOT NULL,"
+                    " PRIMARY KEY (filename, summary_id))"
+                )
+                # 旧版本创建的数据库缺少后来增加的列
+                columns = {row["name"] for row in conn.execute("PRAGMA table_info(files)")}
+                for column, column_type in self._ADDED_COLUMNS:
+                    if column not in columns:
+                        conn.execute(f"ALTER TABLE files ADD COLUMN {column} {column_type}")
+                conn.execute("CREATE INDEX IF NOT EXISTS files_content_hash ON files (content_hash)")
+            if is_new:
+                self._migrate_json(conn, directory)
+            self._connections[key] = conn
+            return conn
+
+    def _migrate_json(self, conn: sqlite3.Connection, directory: str) -> None:
+        """把已有的file_index.json导入数据库，原JSON文件保留不动"""
+        json_path = os.path.join(directory, self.json_index_file_name)
+        if not os.path.exists(json_path):
+            return
+
+        with open(json_path, 'r', encoding='utf-8') as f:
+            index_data = json.load(f)
+
+        files = index_data.get("files", {})
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO metadata (key, value) VALUES (?, ?)",
+                [(key, json.dumps(value, ensure_ascii=False))
+                 for key, value in index_data.get("metadata", {}).items()]
+            )
+            conn.executemany(
+                "INSERT OR IGNORE INTO files (filename, file_index, added_at, last_analyzed, analysis_count, "
+                + ", ".join(self._OPTIONAL_FIELDS) + ") VALUES (?, ?, ?, ?, ?"
+                + ", ?" * len(self._OPTIONAL_FIELDS) + ")",
+                [(filename, int(info["index"]), info.get("added_at") or datetime.now().isoformat(),
+                  info.get("last_analyzed"), info.get("analysis_count", 0),
+                  *(info.get(field) for field in self._OPTIONAL_FIELDS))
+                 for filename, info in files.items()]
+            )
+            conn.executemany(
+                "INSERT OR IGNORE INTO summaries (filename, summary_id) VALUES (?, ?)",
+                [(filename, summary_id)
+                 for filename, info in files.items()
+                 for summary_id in info.get("included_in_summaries", [])]
+            )
+        self.logger.info(f"已从JSON迁移文件索引: {json_path}，共 {len(files)} 个文件")
+
+    def _set_metadata(self, conn: sqlite3.Connection, **values) -> None:
+        conn.executemany(
+            "INSERT OR REPLACE INTO metadata (key, value) VALUES (?, ?)",
+            [(key, json.dumps(value, ensure_ascii=False)) for key, value in values.items()]
+        )
+
+    def _file_info(self, conn: sqlite3.Connection, row: sqlite3.Row) -> dict:
+        """把数据库行转换为与JSON索引相同结构的字典"""
+        summaries = [r[0] for r in conn.execute(
+            "SELECT summary_id FROM summaries WHERE filename = ? ORDER BY rowid", (row["filename"],)
+        )]
+        return self._row_to_info(row, summaries)
+
+    @classmethod
+    def _row_to_info(cls, row: sqlite3.Row, summaries: List[str]) -> dict:
+        info = {
+            "index": row["file_index"],
+            "added_at": row["added_at"],
+            "last_analyzed": row["last_analyzed"],
+            "analysis_count": row["analysis_count"],
+            "included_in_summaries": summaries
+        }
+        for field in cls._OPTIONAL_FIELDS:
+            if row[field] is not None:
+                info[field] = row[field]
+        return info
+
+    def load_index(self, directory: str) -> Dict[str, dict]:
+        """读取完整索引，结构与file_index.json相同"""
+        conn = self._connect(directory)
+        with self._lock:
+            metadata = {row["key"]: json.loads(row["value"])
+                        for row in conn.execute("SELECT key, value FROM metadata")}
+            summaries: Dict[str, List[str]] = {}
+            for row in conn.execute("SELECT filename, summary_id FROM summaries ORDER BY rowid"):
+                summaries.setdefault(row["filename"], []).append(row["summary_id"])
+            files = {
+                row["filename"]: self._row_to_info(row, summaries.get(row["filename"], []))
+                for row in conn.execute("SELECT * FROM files ORDER BY file_index")
+            }
+        return {"metadata": metadata, "files": files}
+
+    def generate_index(self, directory: str) -> Dict[str, dict]:
+        """为目录及其子目录下的所有PDF文件生成索引
+
+        索引的键为相对目录的路径（以/分隔），只更新大小或修改时间变化的行
+
+        Args:
+            directory: 目录路径
+
+        Returns:
+            Dict: 包含文件索引信息的字典
+        """
+        try:
+            conn = self._connect(directory)
+
+            # 递归获取目录下所有PDF文件，未变化的子目录直接使用扫描缓存
+            scanned = DirectoryScanner(directory, self.logger).scan()
+
+            with self._lock, conn:
+                self._apply_scan_locked(conn, scanned)
+                now = datetime.now().isoformat()
+
+                # 更新元数据
+                total_files = conn.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+                if conn.execute("SELECT 1 FROM metadata WHERE key = 'created_at'").fetchone() is None:
+                    self._set_metadata(conn, created_at=now, directory=directory)
+                self._set_metadata(conn, last_updated=now, total_files=total_files)
+
+            # 计算内容哈希并标记重复文件
+            self._update_content_hashes(directory)
+
+            self.logger.info(f"文件索引已更新: {os.path.join(directory, self.index_file_name)}")
+            return self.load_index(directory)
+
+        except Exception as e:
+            self.logger.error(f"生成文件索引时发生错误: {str(e)}")
+            raise
+
+    @staticmethod
+    def _apply_scan_locked(conn: sqlite3.Connection, scanned: Dict[str, dict]) -> List[str]:
+        """把扫描结果合并到数据库：新文件追加序号，已有文件只在大小或修改时间变化时更新
+
+        Returns:
+            List[str]: 新增或大小、修改时间发生变化的文件
+        """
+        existing = {row[0]: (row[1], row[2])
+                    for row in conn.execute("SELECT filename, size, mtime FROM files")}
+        current_max_index = conn.execute("SELECT COALESCE(MAX(file_index), 0) FROM files").fetchone()[0]
+
+        now = datetime.now().isoformat()
+        new_rows = []
+        changed_rows = []
+        for file in sorted(scanned):
+            stat = scanned[file]
+            if file not in existing:
+                current_max_index += 1
+                new_rows.append((file, current_max_index, now, stat["size"], stat["mtime"]))
+            elif existing[file] != (stat["size"], stat["mtime"]):
+                changed_rows.append((stat["size"], stat["mtime"], file))
+        conn.executemany(
+            "INSERT INTO files (filename, file_index, added_at, size, mtime) VALUES (?, ?, ?, ?, ?)",
+            new_rows
+        )
+        # 内容可能已变化，需要重新计算哈希
+        conn.executemany(
+            "UPDATE files SET size = ?, mtime = ?, content_hash = NULL, sha256 = NULL WHERE filename = ?",
+            changed_rows
+        )
+        return [row[0] for row in new_rows] + [row[2] for row in changed_rows]
+
+    def apply_scan(self, directory: str, scanned: Dict[str, dict]) -> List[str]:
+        """增量更新索引
+
+        Args:
+            directory: 目录路径
+            scanned: 相对路径 -> {"size", "mtime"}，只需包含要更新的文件
+
+        Returns:
+            List[str]: 新增或发生变化的文件
+        """
+        conn = self._connect(directory)
+        with self._lock, conn:
+            changed = self._apply_scan_locked(conn, scanned)
+            if changed:
+                total_files = conn.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+                self._set_metadata(conn, last_updated=datetime.now().isoformat(), total_files=total_files)
+        if changed:
+            self._update_content_hashes(directory)
+        return changed
+
+    def _update_content_hashes(self, directory: str) -> None:
+        """为缺少内容哈希的文件计算快速哈希，并更新重复文件的标记
+
+        读取文件时不持有锁，不阻塞状态更新
+        """
+        conn = self._connect(directory)
+        with self._lock:
+            to_hash = [row["filename"] for row in conn.execute("SELECT filename, content_hash FROM files")
+                       if needs_quick_hash(dict(row))]
+
+        hashes = []
+        for key in to_hash:
+            try:
+                hashes.append((quick_hash(os.path.join(directory, key)), key))
+            except OSError as e:
+                self.logger.warning(f"计算文件哈希失败: {key}, {str(e)}")
+
+        with self._lock, conn:
+            conn.executemany("UPDATE files SET content_hash = ? WHERE filename = ?", hashes)
+            # 只有快速哈希相同的文件才可能重复
+            snapshot = {
+                row["filename"]: dict(row) | {"index": row["file_index"]}
+                for row in conn.execute(
+                    "SELECT filename, file_index, content_hash, sha256, duplicate_of FROM files"
+                    " WHERE duplicate_of IS NOT NULL OR content_hash IN"
+                    " (SELECT content_hash FROM files GROUP BY content_hash HAVING COUNT(*) > 1)"
+                )
+            }
+
+        updates = resolve_duplicates(directory, snapshot)
+
+        with self._lock, conn:
+            for key, fields in updates.items():
+                for field, value in fields.items():
+                    conn.execute(f"UPDATE files SET {field} = ? WHERE filename = ?", (value, key))
+            duplicates = conn.execute("SELECT COUNT(*) FROM files WHERE duplicate_of IS NOT NULL").fetchone()[0]
+        if duplicates:
+            self.logger.info(f"发现 {duplicates} 个与其他文件内容相同的PDF")
+
+    def get_file(self, directory: str, filename: str) -> Optional[dict]:
+        """按文件名查询索引信息，不存在时返回None"""
+        conn = self._connect(directory)
+        with self._lock:
+            row = conn.execute("SELECT * FROM files WHERE filename = ?", (filename,)).fetchone()
+            return self._file_info(conn, row) if row else None
+
+    def get_file_by_index(self, directory: str, index: int) -> Optional[str]:
+        """按序号查询文件名，不存在时返回None"""
+        conn = self._connect(directory)
+        with self._lock:
+            row = conn.execute("SELECT filename FROM files WHERE file_index = ?", (int(index),)).fetchone()
+            return row[0] if row else None
+
+    def update_analysis_status(self, directory: str, filename: str) -> None:
+        """更新文件的分析状态
+
+        Args:
+            directory: 目录路径
+            filename: 文件名
+        """
+        try:
+            conn = self._connect(directory)
+            with self._lock, conn:
+                conn.execute(
+                    "UPDATE files SET last_analyzed = ?, analysis_count = analysis_count + 1 WHERE filename = ?",
+                    (datetime.now().isoformat(), filename)
+                )
+            self.logger.info(f"已更新文件分析状态: {filename}")
+
+        except Exception as e:
+            self.logger.error(f"更新文件分析状态时发生错误: {str(e)}")
+            raise
+
+    def update_summary_status(self, directory: str, filenames: List[str], summary_id: str) -> None:
+        """更新文件的汇总状态
+
+        Args:
+            directory: 目录路径
+            filenames: 文件名列表
+            summary_id: 汇总ID
+        """
+        try:
+            conn = self._connect(directory)
+            with self._lock, conn:
+                conn.executemany(
+                    "INSERT OR IGNORE INTO summaries (filename, summary_id) "
+                    "SELECT filename, ? FROM files WHERE filename = ?",
+                    [(summary_id, filename) for filename in filenames]
+                )
+            self.logger.info(f"已更新文件汇总状态: {summary_id}")
+
+        except Exception as e:
+            self.logger.error(f"更新文件汇总状态时发生错误: {str(e)}")
+            raise
+
+    def flush(self) -> None:
+        """每次更新都已提交到数据库，无需额外写入"""
+
+    def close(self) -> None:
+        """关闭所有数据库连接"""
+        with self._lock:
+            for conn in self._connections.values():
+                conn.close()
+            self._connections.clear()
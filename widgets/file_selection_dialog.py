@@ -232,7 +232,7 @@ class FileSelectionDialog(QDialog):
             
             item = QListWidgetItem(display_text)
             # 存储完整文件路径作为item的数据
-            full_path = os.path.join(self.directory, filename)
+            full_path = os.path.normpath(os.path.join(self.directory, filename))
             item.setData(Qt.ItemDataRole.UserRole, full_path)
             self.list_widget.addItem(item)
             